@@ -1,44 +1,304 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
-from models import Student, Course, Task, Progress, FYPProject, ChatSession, StudentRoadmap
+from pymongo import monitoring
+from models import Student, Course, Task, TaskVariant, Progress, FYPProject, ChatSession, ChatMessageBucket, StudentRoadmap, GradingResult, GradingCacheEntry, Job, StudyPlan, Notification, TokenUsage
+from typing import Dict, Optional
 import os
+import threading
 import certifi
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+# Connection pool settings (see https://pymongo.readthedocs.io/en/stable/faq.html#how-does-connection-pooling-work-in-pymongo)
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# Diagnostic only: accepts any certificate. Never enable in production.
+TLS_ALLOW_INVALID_CERTS = os.getenv("MONGO_TLS_ALLOW_INVALID_CERTS", "false").lower() == "true"
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool statistics from PyMongo's CMAP events.
+    Callbacks fire on driver threads, so all counters are guarded by a lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.total_checkouts = 0
+            self.failed_checkouts = 0
+            self.failure_reasons: Dict[str, int] = {}
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.open_connections = 0
+            self.pool_clears = 0
+
+    def _record_wait(self, event):
+        # `duration` (seconds) was added to checkout events in PyMongo 4.7
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            wait_ms = duration * 1000
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.total_checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failed_checkouts += 1
+            reason = str(event.reason)
+            self.failure_reasons[reason] = self.failure_reasons.get(reason, 0) + 1
+            self._record_wait(event)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_check_out_started(self, event): pass
+    def connection_ready(self, event): pass
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            attempts = self.total_checkouts + self.failed_checkouts
+            return {
+                "max_pool_size": MAX_POOL_SIZE,
+                "min_pool_size": MIN_POOL_SIZE,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "open_connections": self.open_connections,
+                "total_checkouts": self.total_checkouts,
+                "failed_checkouts": self.failed_checkouts,
+                "failure_reasons": dict(self.failure_reasons),
+                "avg_wait_ms": round(self.total_wait_ms / attempts, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "pool_clears": self.pool_clears,
+                # Close to 1.0 means requests are queueing for connections
+                "utilization": round(self.checked_out / MAX_POOL_SIZE, 3) if MAX_POOL_SIZE else None,
+            }
+
+
+pool_stats = PoolStatsListener()
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    if _client is None:
+        raise RuntimeError("Database client is not initialised. Call init_db() first.")
+    return _client
+
+
+def get_pool_stats() -> Dict:
+    return pool_stats.snapshot()
+
+
+DOCUMENT_MODELS = [
+    Student,
+    Course,
+    Task,
+    TaskVariant,
+    Progress,
+    ChatSession,
+    ChatMessageBucket,
+    FYPProject,
+    StudentRoadmap,
+    GradingResult,
+    GradingCacheEntry,
+    Job,
+    StudyPlan,
+    Notification,
+    TokenUsage
+]
+
+# Unique indexes added to collections that already held data: (collection, index name, key fields,
+# order that puts the copy to keep first). Older databases can contain duplicates of these keys,
+# and index creation fails until they are removed.
+UNIQUE_KEY_DEDUPES = [
+    # The oldest registration keeps the roll number; it is also the one login used to find
+    ("students", "roll_number_unique", ["roll_number"], {"_id": 1}),
+    # The row with the most completed tasks; scripts/migrate_progress_sums.py recomputes it from the tasks
+    ("progress", "student_course", ["student_id", "course_id"], {"tasks_completed": -1, "_id": 1}),
+]
+
+# Rows that belong to a student through `student_id` (str of the student _id). When a duplicate
+# student is dropped they are re-pointed to the kept one: (collection, fields unique together with
+# student_id, update that lifts a clash with a row the kept student already has). A clash with no
+# such update moves the row to `<collection>_duplicates`.
+STUDENT_REFERENCES = [
+    # Clearing the topic keeps the work; tasks without a topic are not constrained
+    ("tasks", ["course_id", "topic"], {"$unset": {"topic": ""}}),
+    # scripts/migrate_progress_sums.py recomputes the kept row from the re-pointed tasks
+    ("progress", ["course_id"], None),
+    ("study_plans", [], None),
+    ("token_usage", ["day"], None),
+    ("chat_sessions", ["is_default"], {"$set": {"is_default": False}}),
+    ("chat_message_buckets", None, None),
+    ("student_roadmaps", None, None),
+    ("notifications", None, None),
+]
+
+
+async def _repoint_student_rows(db, keep_id, extra_ids, dry_run: bool) -> Dict[str, int]:
+    """
+    Moves the rows of the dropped students `extra_ids` to the kept student `keep_id`.
+    Returns the number of rows archived (or that would be) per collection because they clashed.
+    """
+    from pymongo import ReplaceOne
+
+    keep = str(keep_id)
+    extra = [str(i) for i in extra_ids]
+    archived: Dict[str, int] = {}
+    for name, unique_fields, resolve in STUDENT_REFERENCES:
+        collection = db[name]
+        if unique_fields is None:
+            if dry_run:
+                moved = await collection.count_documents({"student_id": {"$in": extra}})
+            else:
+                moved = (await collection.update_many({"student_id": {"$in": extra}}, {"$set": {"student_id": keep}})).modified_count
+            if moved:
+                print(f"DEBUG: {name}: {'would re-point' if dry_run else 're-pointed'} {moved} rows to student {keep}")
+            continue
+
+        # One row at a time: each re-pointed row can clash with the next one
+        moved = 0
+        async for row in collection.find({"student_id": {"$in": extra}}):
+            clash = await collection.find_one({"student_id": keep, **{f: row.get(f) for f in unique_fields}})
+            if clash and resolve is None:
+                archived[name] = archived.get(name, 0) + 1
+                if not dry_run:
+                    await db[f"{name}_duplicates"].bulk_write([ReplaceOne({"_id": row["_id"]}, row, upsert=True)])
+                    await collection.delete_one({"_id": row["_id"]})
+                continue
+            moved += 1
+            if not dry_run:
+                update = {"$set": {"student_id": keep}}
+                for op, fields in (resolve if clash else {}).items():
+                    update.setdefault(op, {}).update(fields)
+                await collection.update_one({"_id": row["_id"]}, update)
+        if moved or archived.get(name):
+            print(f"DEBUG: {name}: {'would re-point' if dry_run else 're-pointed'} {moved} rows to student {keep}, "
+                  f"{'would archive' if dry_run else 'archived'} {archived.get(name, 0)} that clashed")
+    return archived
+
+
+async def dedupe_unique_keys(db, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Removes duplicates of the keys in UNIQUE_KEY_DEDUPES so their unique indexes can be built.
+    Dropped documents are moved to `<collection>_duplicates`, not deleted; the rows of a dropped
+    student are re-pointed to the kept one (see STUDENT_REFERENCES). Collections whose index
+    already exists are skipped, so this costs one listIndexes per collection once migrated.
+    Returns the number of documents dropped (or that would be dropped) per collection.
+    """
+    from pymongo import ReplaceOne
+
+    dropped: Dict[str, int] = {}
+    for name, index_name, fields, keep_order in UNIQUE_KEY_DEDUPES:
+        collection = db[name]
+        if index_name in await collection.index_information():
+            continue
+        groups = collection.aggregate([
+            {"$sort": keep_order},
+            {"$group": {"_id": {f: f"${f}" for f in fields}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}}
+        ], allowDiskUse=True)
+        dropped[name] = dropped.get(name, 0)
+        async for group in groups:
+            extra = group["ids"][1:]
+            key = ", ".join(f"{f}={group['_id'].get(f)!r}" for f in fields)
+            print(f"DEBUG: {name}: {key} has {group['n']} documents, keeping {group['ids'][0]}, dropping {len(extra)}")
+            dropped[name] += len(extra)
+            if name == "students":
+                # Before the students go, so an interrupted run never leaves rows without an owner
+                for ref, count in (await _repoint_student_rows(db, group["ids"][0], extra, dry_run)).items():
+                    dropped[ref] = dropped.get(ref, 0) + count
+            if dry_run:
+                continue
+            # Upserts keep a re-run after an interruption from failing on already archived copies
+            docs = await collection.find({"_id": {"$in": extra}}).to_list(None)
+            await db[f"{name}_duplicates"].bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs])
+            await collection.delete_many({"_id": {"$in": extra}})
+        if dropped[name]:
+            print(f"DEBUG: {name}: {'would drop' if dry_run else 'moved'} {dropped[name]} duplicate documents"
+                  f"{'' if dry_run else f' to {name}_duplicates'} before building {index_name}")
+    return dropped
+
+
 async def init_db():
+    global _client
+    if _client is not None:
+        return _client
+
     # Retrieve the connection string from environment variable or use default local
     uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
     print(f"DEBUG: Connecting to MongoDB with URI starting with: {uri[:20]}...")
-    
-    # Try connecting with relaxed SSL for diagnostics
-    # Also added serverSelectionTimeoutMS to fail faster if there's a network issue
+    print(f"DEBUG: Pool config maxPoolSize={MAX_POOL_SIZE} minPoolSize={MIN_POOL_SIZE} "
+          f"maxIdleTimeMS={MAX_IDLE_TIME_MS} waitQueueTimeoutMS={WAIT_QUEUE_TIMEOUT_MS}")
+    if TLS_ALLOW_INVALID_CERTS:
+        print("WARNING: MONGO_TLS_ALLOW_INVALID_CERTS is enabled. Certificate verification is disabled.")
+
+    # serverSelectionTimeoutMS makes startup fail fast if there's a network issue
     client = AsyncIOMotorClient(
-        uri, 
+        uri,
         tlsCAFile=certifi.where(),
-        tlsAllowInvalidCertificates=True, # Diagnostic: allows identifying if it's a cert verify issue
-        serverSelectionTimeoutMS=5000
+        tlsAllowInvalidCertificates=TLS_ALLOW_INVALID_CERTS,
+        serverSelectionTimeoutMS=5000,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        maxIdleTimeMS=MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_stats]
     )
-    
+
     try:
         # Check connection
         await client.admin.command('ping')
         print("Successfully connected to MongoDB Atlas")
-        
-        # Initialize Beanie
-        await init_beanie(database=client.ai_chatbot_db, document_models=[
-            Student,
-            Course,
-            Task,
-            Progress,
-            ChatSession,
-            FYPProject,
-            StudentRoadmap
-        ])
+
+        # Must run before init_beanie: a duplicate key makes its unique index creation fail
+        await dedupe_unique_keys(client.ai_chatbot_db)
+
+        # Initialize Beanie. This also creates the indexes declared in each model's Settings.indexes
+        await init_beanie(database=client.ai_chatbot_db, document_models=DOCUMENT_MODELS)
     except Exception as e:
+        client.close()
         print(f"Failed to connect to MongoDB: {e}")
         # If it fails, try without SRV if possible or fallback to local
         if "mongodb+srv" in uri:
             print("Troubleshooting Tip: Try using the standard connection string (mongodb://) instead of srv, or check your firewall/ISP.")
-        raise e
\ No newline at end of file
+        raise e
+
+    _client = client
+    return client
+
+
+async def close_db():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        print("MongoDB client closed.")
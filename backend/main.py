@@ -1,8 +1,14 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import init_db
-from routers import chat, student, courses, auth
+from database import init_db, close_db
+from routers import chat, student, courses, auth, health
+from utils.startup import startup_tracker
+from services.job_service import job_service
+from services.realtime_service import realtime_service
+from services.rate_limit_service import rate_limit_service
+from services.usage_service import current_student
 
 app = FastAPI(title="AI Study Guide API") # Updated title for premium feel
 
@@ -15,6 +21,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],  # Pagination cursor of the task/progress listings; rate-limit wait
 )
 
 @app.exception_handler(Exception)
@@ -31,14 +38,58 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    # Per-student limits on the model-backed endpoints; the student is also who the model usage is billed to
+    rejection, student_id = await rate_limit_service.check(request)
+    if rejection is not None:
+        return rejection
+    current_student.set(student_id)
+    return await call_next(request)
+
+@app.middleware("http")
+async def track_first_request(request: Request, call_next):
+    response = await call_next(request)
+    startup_tracker.mark_request_served()
+    return response
+
+async def warm_catalog():
+    from utils.csv_manager import csv_manager
+    if not csv_manager.get_courses() or not csv_manager.get_fyp_projects():
+        await asyncio.to_thread(csv_manager.load_all_data)
+    # Load (or build) the retrieval index off the event loop, so the first chat doesn't pay for it
+    from services.retrieval_service import retrieval_service
+    await asyncio.to_thread(retrieval_service.index)
+    # Probe the code-runner sandbox once, off the event loop
+    from services.code_runner_service import code_runner_service
+    await asyncio.to_thread(code_runner_service.available)
+    startup_tracker.set_ready("catalog", bool(csv_manager.get_courses()))
+
+async def warm_llm():
+    from services.ai_service import ai_service
+    healthy = await ai_service.check_health()
+    startup_tracker.set_ready("llm", healthy)
+    if not healthy:
+        raise RuntimeError("AI backend did not respond to warm-up request")
+
+async def seed_in_background():
+    # Auto-seed data if needed. Runs after the server is accepting traffic.
+    from seed_mongo import seed_initial_data
+    await seed_initial_data()
+
 @app.on_event("startup")
 async def on_startup():
+    # Only the DB connection is awaited; everything else is deferred to background phases
+    startup_tracker.run_in_background("catalog", warm_catalog)
+    startup_tracker.run_in_background("llm_warmup", warm_llm)
+
     try:
-        await init_db()
-        
-        # Auto-seed data if needed
-        from seed_mongo import seed_initial_data
-        await seed_initial_data()
+        async with startup_tracker.phase("db"):
+            await init_db()
+        startup_tracker.set_ready("db")
+        startup_tracker.run_in_background("seed", seed_in_background)
+        job_service.start()
+        realtime_service.start()
     except Exception as e:
         print("\n" + "="*50)
         print(f"CRITICAL ERROR: Could not connect to MongoDB.")
@@ -46,11 +97,21 @@ async def on_startup():
         print("THE SERVER IS STARTING BUT DATABASE FEATURES WILL NOT WORK.")
         print("="*50 + "\n")
 
+    startup_tracker.print_report()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await realtime_service.stop()
+    await job_service.stop()
+    await startup_tracker.cancel_background()
+    await close_db()
+
 # Include Routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(chat.router, tags=["Chat"])
 app.include_router(student.router, tags=["Student"])
 app.include_router(courses.router, tags=["Courses"])
+app.include_router(health.router, tags=["Health"])
 
 @app.get("/")
 async def root():
@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from beanie import Document, Link
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from datetime import datetime
 
 class Course(Document):
@@ -26,6 +27,9 @@ class Student(Document):
     
     class Settings:
         name = "students"
+        indexes = [
+            IndexModel([("roll_number", ASCENDING)], name="roll_number_unique", unique=True),
+        ]
 
 class Task(Document):
     title: str
@@ -41,9 +45,52 @@ class Task(Document):
     verified: Optional[bool] = None
     score: int = 0  # Percentage score (0-100)
     submission: Optional[str] = None
+    topic: Optional[str] = None  # Course topic this task was materialized from at enrollment
+    # Hidden stdin/stdout cases for coding tasks ([{"input": ..., "output": ...}]); stored but never sent to clients
+    test_cases: Optional[List[Dict[str, str]]] = Field(default=None, exclude=True)
+    variant_id: Optional[str] = None  # Shared TaskVariant the content was taken from
     
     class Settings:
         name = "tasks"
+        indexes = [
+            # Also serves (student_id) and (student_id, course_id) lookups via prefix
+            IndexModel([("student_id", ASCENDING), ("course_id", ASCENDING), ("status", ASCENDING)], name="student_course_status"),
+            IndexModel([("student_id", ASCENDING), ("course_id", ASCENDING), ("title", ASCENDING)], name="student_course_title"),
+            IndexModel([("student_id", ASCENDING), ("status", ASCENDING)], name="student_status"),
+            # Keyset pagination of /tasks/{student_id} (pages are ordered by _id)
+            IndexModel([("student_id", ASCENDING), ("_id", ASCENDING)], name="student_id_page"),
+            IndexModel([("student_id", ASCENDING), ("course_id", ASCENDING), ("_id", ASCENDING)], name="student_course_id_page"),
+            # One enrollment task per topic; older tasks without a topic are not constrained
+            IndexModel(
+                [("student_id", ASCENDING), ("course_id", ASCENDING), ("topic", ASCENDING)],
+                name="student_course_topic_unique",
+                unique=True,
+                partialFilterExpression={"topic": {"$type": "string"}}
+            ),
+        ]
+
+class TaskVariant(Document):
+    """Pre-generated task content shared by every student with the same course topic, learning style and pace."""
+    course_id: str
+    topic: str
+    learning_style: str
+    study_pace: str
+    title: str
+    description: str
+    type: str
+    test_cases: Optional[List[Dict[str, str]]] = None
+    served: int = 0  # How many tasks received this variant; the least-served one is handed out next
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "task_variants"
+        indexes = [
+            IndexModel(
+                [("course_id", ASCENDING), ("topic", ASCENDING), ("learning_style", ASCENDING),
+                 ("study_pace", ASCENDING), ("served", ASCENDING)],
+                name="pool_key_served"
+            ),
+        ]
 
 class Progress(Document):
     student_id: str
@@ -51,12 +98,124 @@ class Progress(Document):
     course_name: Optional[str] = None
     tasks_completed: int = 0
     total_tasks: int = 0
-    accuracy: float = 0.0
-    grade: Optional[float] = None  # Added for ML services (0-100)
+    score_sum: float = 0.0  # Running sum of completed task scores; grade = score_sum / tasks_completed
+    accuracy: float = 0.0  # Derived: tasks_completed / total_tasks
+    grade: Optional[float] = None  # Added for ML services (0-100). Derived from score_sum
     status: str = "ongoing" # ongoing, completed
     
     class Settings:
         name = "progress"
+        indexes = [
+            IndexModel([("student_id", ASCENDING), ("course_id", ASCENDING)], name="student_course", unique=True),
+            IndexModel([("student_id", ASCENDING), ("course_name", ASCENDING)], name="student_course_name"),
+            IndexModel([("student_id", ASCENDING), ("status", ASCENDING)], name="student_status"),
+        ]
+
+class GradingResult(Document):
+    """Stored response of a grading request, keyed by the client's idempotency key."""
+    idempotency_key: str
+    request_hash: str  # Fingerprint of the original request; a reused key with a different request is rejected
+    task_id: str
+    status: str = "pending" # pending (grading in flight), done
+    response: Optional[Dict[str, Any]] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "grading_results"
+        indexes = [
+            IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True),
+            # Keys only need to outlive client retries
+            IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+        ]
+
+class GradingCacheEntry(Document):
+    """Model verdict for a (task title, task description, submission) triple, keyed by a normalized hash."""
+    key: str
+    result: Dict[str, Any]  # verified, score, feedback as returned by the grader
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_hit_at: Optional[datetime] = None
+    expires_at: datetime
+
+    class Settings:
+        name = "grading_cache"
+        indexes = [
+            IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+            # Each entry carries its own expiry, so the TTL can be changed without rebuilding the index
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        ]
+
+class Job(Document):
+    """A durable background job, executed by services/job_service.py."""
+    kind: str
+    payload: Dict[str, Any] = {}
+    status: str = "queued" # queued, running, done, failed
+    dedupe_key: Optional[str] = None
+    active_key: Optional[str] = None  # Equals dedupe_key while queued; unique, so duplicates are rejected
+    attempts: int = 0
+    max_attempts: int = 3
+    run_at: datetime = Field(default_factory=datetime.now)
+    locked_at: Optional[datetime] = None
+    locked_by: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "jobs"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+            IndexModel(
+                [("active_key", ASCENDING)],
+                name="active_key_unique",
+                unique=True,
+                partialFilterExpression={"active_key": {"$type": "string"}}
+            ),
+            # Finished jobs are kept for a week for debugging
+            IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+        ]
+
+class Notification(Document):
+    """An event pushed to a student's open WebSocket connections (see services/realtime_service.py)."""
+    student_id: str
+    event: Dict[str, Any]
+    origin: str  # Process that published it; that process already delivered it to its own connections
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "notifications"
+        indexes = [
+            # Only relayed to other processes, so a short retention is enough
+            IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=3600),
+        ]
+
+class TokenUsage(Document):
+    """LLM tokens used per student and day, counted from the model backend's responses."""
+    student_id: str  # "_system" for work not done on behalf of a student (e.g. task pool fills)
+    day: str  # YYYY-MM-DD
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    calls: int = 0
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "token_usage"
+        indexes = [
+            IndexModel([("student_id", ASCENDING), ("day", ASCENDING)], name="student_day_unique", unique=True),
+            IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=90 * 24 * 3600),
+        ]
+
+class StudyPlan(Document):
+    """Latest generated study plan per student, refreshed in the background after grading."""
+    student_id: str
+    plan: str
+    generated_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "study_plans"
+        indexes = [
+            IndexModel([("student_id", ASCENDING)], name="student_unique", unique=True),
+        ]
 
 class FYPProject(Document):
     title: str
@@ -72,14 +231,57 @@ class FYPProject(Document):
 class ChatMessage(BaseModel):
     role: str # user, model
     content: str
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = Field(default_factory=datetime.now)
+    seq: Optional[int] = None  # Position in the session, assigned when the message is appended
 
 class ChatSession(Document):
+    """One conversation thread. A student can have any number of them (e.g. one per course)."""
     student_id: str
+    title: Optional[str] = None  # Defaults to the start of the first message
+    course_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None  # Time of the last message; threads are listed newest first
+    last_message_preview: Optional[str] = None
+    # Legacy: messages used to be embedded here. They now live in ChatMessageBucket documents and
+    # are moved there the first time an old session is used.
     messages: List[ChatMessage] = []
+    message_count: int = 0  # Messages appended so far; also hands out each message's seq
+    summary: Optional[str] = None  # Rolling summary of the messages up to summarized_through
+    summarized_through: int = -1
+    summary_updated_at: Optional[datetime] = None
+    is_default: bool = False  # Created implicitly by the first chat of a student without sessions
     
     class Settings:
         name = "chat_sessions"
+        indexes = [
+            # Serves the thread list, opening a thread by id + student, and picking the latest thread
+            IndexModel([("student_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], name="student_updated_at"),
+            # At most one implicit session per student, even when first requests race
+            IndexModel(
+                [("student_id", ASCENDING), ("is_default", ASCENDING)],
+                name="student_default_unique",
+                unique=True,
+                partialFilterExpression={"is_default": True}
+            ),
+        ]
+
+class ChatMessageBucket(Document):
+    """Fixed-size block of consecutive messages of a chat session (bucket n holds seq n*B .. n*B+B-1, B = CHAT_BUCKET_SIZE)."""
+    session_id: str
+    student_id: str
+    bucket: int
+    messages: List[ChatMessage] = []
+    size: int = 0  # Messages in the bucket; not `count`, which would shadow Document.count()
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+    class Settings:
+        name = "chat_message_buckets"
+        indexes = [
+            IndexModel([("session_id", ASCENDING), ("bucket", ASCENDING)], name="session_bucket_unique", unique=True),
+            # Archival scans for buckets that haven't been written to for a while
+            IndexModel([("last_at", ASCENDING)], name="last_at"),
+        ]
 
 class RoadmapTopic(BaseModel):
     title: str
@@ -103,4 +305,44 @@ class StudentRoadmap(Document):
     updated_at: datetime = datetime.now()
 
     class Settings:
-        name = "student_roadmaps"
\ No newline at end of file
+        name = "student_roadmaps"
+        indexes = [
+            IndexModel([("student_id", ASCENDING), ("interest", ASCENDING)], name="student_interest"),
+        ]
+
+# --- Read models ---
+# Lightweight projections used by context-building queries (see services/query_service.py).
+# Beanie fetches only the fields declared here, so large fields like submissions are never read unless needed.
+
+class StudentProfileView(BaseModel):
+    name: str
+    current_semester: int
+    interests: List[str] = []
+    weak_subjects: List[str] = []
+    study_pace: str
+    learning_style: str
+
+class TaskContextView(BaseModel):
+    """Built by QueryService.get_recent_tasks, which truncates submission and ai_feedback in the database."""
+    title: str
+    status: str
+    verified: Optional[bool] = None
+    ai_feedback: Optional[str] = None
+    submission: Optional[str] = None
+
+class TaskTitleView(BaseModel):
+    title: str
+
+class ProgressSummaryView(BaseModel):
+    course_id: str
+    course_name: Optional[str] = None
+    tasks_completed: int = 0
+    total_tasks: int = 0
+    accuracy: float = 0.0
+    grade: Optional[float] = None
+    status: str = "ongoing"
+
+class RoadmapContextView(BaseModel):
+    interest: str
+    phases: List[RoadmapPhase] = []
+    current_phase_index: int = 0
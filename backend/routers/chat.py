@@ -1,7 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from models import ChatSession, ChatMessage, Student, Task, Progress, Course, StudentRoadmap
-from services.ai_service import ai_service
-from typing import List
+import asyncio
+import json
+import time
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from models import ChatMessage, Student, Task, Progress, Course, StudentRoadmap
+from services.ai_service import ai_service, AI_UNAVAILABLE_MESSAGE
+from services.query_service import query_service
+from services.progress_service import progress_service
+from services.code_runner_service import code_runner_service
+from services.chat_history_service import chat_history_service, SessionNotFoundError, InvalidCursorError
+from services.chat_memory_service import chat_memory_service, CHAT_RECENT_MESSAGES
+from services.chat_context_service import chat_context_service, PhaseTimer
+from services.intent_service import intent_service
+from services.answer_cache_service import answer_cache_service
+from services.realtime_service import realtime_service, Connection, WS_HEARTBEAT_SECONDS
+from services.rate_limit_service import rate_limit_service
+from services.listing_service import listing_service
+from services.usage_service import current_student
+from typing import List, Optional
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -9,83 +25,101 @@ router = APIRouter()
 class ChatRequest(BaseModel):
     student_id: str
     message: str
+    session_id: Optional[str] = None  # Defaults to the student's most recently used thread
 
 @router.post("/chat")
 async def chat(request: ChatRequest):
-    student = await Student.get(request.student_id)
-    if not student:
+    timer = PhaseTimer()
+    try:
+        return await _chat(request, timer)
+    finally:
+        # Splits chat latency into DB (context/save) and model (llm) time
+        timer.log(f"/chat student={request.student_id}")
+
+async def _chat(request: ChatRequest, timer: PhaseTimer, on_token=None):
+    # Profile, course progress and roadmap come from the per-student context cache
+    async with timer.phase("db_profile"):
+        static_context = await chat_context_service.get_static(request.student_id)
+    if not static_context:
         raise HTTPException(status_code=404, detail="Student not found")
+    student = static_context["student"]
+    progress_records = static_context["progress_records"]
+    courses_context = static_context["courses_context"]
+    roadmap_context = static_context["roadmap_context"]
 
-    # Find or create session (simplified)
-    # In a real app, we might want to manage session IDs more explicitly
-    session = await ChatSession.find_one(ChatSession.student_id == request.student_id)
-    if not session:
-        session = ChatSession(student_id=request.student_id)
-        await session.insert()
+    async def load_history():
+        try:
+            session = await chat_history_service.get_session(request.student_id, request.session_id)
+        except SessionNotFoundError:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        # Only the recent turns are read; anything older is covered by the session's rolling summary
+        return session, await chat_history_service.recent(session, limit=CHAT_RECENT_MESSAGES)
+
+    # Independent lookups run concurrently
+    async with timer.phase("db_history_tasks"):
+        (session, history), tasks_context = await asyncio.gather(
+            load_history(),
+            chat_context_service.get_tasks_context(request.student_id)
+        )
     
     # Add user message
     user_msg = ChatMessage(role="user", content=request.message)
-    session.messages.append(user_msg)
-    
-    # Get student tasks for context
-    tasks = await Task.find(Task.student_id == request.student_id).to_list()
-    tasks_context = []
-    for t in tasks[-5:]: # Only recent 5 tasks for token limit
-        tasks_context.append({
-            "title": t.title,
-            "status": t.status,
-            "verified": t.verified,
-            "feedback": t.ai_feedback,
-            "submission": t.submission
-        })
-
-    # Get student courses (progress) for context
-    progress_records = await Progress.find(Progress.student_id == request.student_id).to_list()
-    courses_context = []
-    for p in progress_records:
-        courses_context.append({
-            "course_name": p.course_name,
-            "progress": f"{p.tasks_completed}/{p.total_tasks}",
-            "grade": p.grade
-        })
-
-    # Get Active Roadmap Context
-    roadmap_context = None
-    if student.interests:
-        # Try to find roadmap for primary interest
-        active_roadmap = await StudentRoadmap.find_one(
-            StudentRoadmap.student_id == request.student_id, 
-            StudentRoadmap.interest == student.interests[0]
-        )
-        if active_roadmap:
-            # Create a summary of current progress
-            current_phase = active_roadmap.phases[active_roadmap.current_phase_index]
-            pending_topics = [t.title for t in current_phase.topics if t.status != "completed"]
-            
-            roadmap_context = {
-                "interest": active_roadmap.interest,
-                "current_phase": current_phase.title,
-                "project_goal": current_phase.project,
-                "pending_topics": pending_topics,
-                "completed_phases": active_roadmap.current_phase_index
-            }
+
+    # "Give me a task on X" is recognised locally and goes straight to task generation,
+    # skipping the model call that would only produce the create_task tool command
+    intent = intent_service.detect_task_request(
+        request.message, [{"id": p.course_id, "name": p.course_name or ""} for p in progress_records]
+    ) if progress_records else None
+    if intent:
+        try:
+            async with timer.phase("llm"):
+                created = await _create_chat_task(
+                    request.student_id, student, progress_records,
+                    intent["topic"], intent["course_name"], course_id=intent["course_id"]
+                )
+        except Exception as e:
+            print(f"Task generation error: {e}")
+            created = False
+        if created:
+            ai_response_text = f"I've generated a new practice task for you on **{intent['topic']}**. You can find it in your Task Dashboard!"
+        else:
+            ai_response_text = "I tried to generate a task but something went wrong. Please try again."
+        return await _save_turn(session, user_msg, ai_response_text, timer)
+
+    # General conceptual questions may be answered from the cross-student cache (opt-in)
+    cache_query = answer_cache_service.prepare(request.message)
+    cached_answer = answer_cache_service.lookup(cache_query)
+    if cached_answer:
+        if on_token:
+            await on_token(cached_answer)
+        return await _save_turn(session, user_msg, cached_answer, timer)
 
     # Get AI response
-    context = [{"role": m.role, "content": m.content} for m in session.messages[-10:]]
+    context = [{"role": m["role"], "content": m["content"]} for m in history]
     try:
-        ai_response_text = await ai_service.get_chat_response(
-            request.message, 
-            context, 
-            student_profile=student.dict(),
-            tasks_context=tasks_context,
-            courses_context=courses_context,
-            roadmap_context=roadmap_context
-        )
+        async with timer.phase("llm"):
+            if cache_query:
+                # A shared answer must not be built from anything about this student or conversation
+                ai_response_text = await ai_service.get_chat_response(request.message, [], on_token=on_token)
+            else:
+                ai_response_text = await ai_service.get_chat_response(
+                    request.message, 
+                    context, 
+                    student_profile=student.dict(),
+                    tasks_context=tasks_context,
+                    courses_context=courses_context,
+                    roadmap_context=roadmap_context,
+                    conversation_summary=session.get("summary"),
+                    on_token=on_token
+                )
         
         if ai_response_text.startswith("Error:"):
             # Handle AI service errors without crashing
              return {"response": f"I'm sorry, I'm having trouble connecting to my brain right now. {ai_response_text}", "is_error": True}
 
+        if cache_query and ai_response_text != AI_UNAVAILABLE_MESSAGE and "create_task" not in ai_response_text:
+            answer_cache_service.store(cache_query, ai_response_text, student_name=student.name)
+
         # Check for Tool Call (JSON)
         import json
         if "```json" in ai_response_text and "create_task" in ai_response_text:
@@ -96,54 +130,7 @@ async def chat(request: ChatRequest):
                 
                 if tool_cmd.get("tool") == "create_task":
                     topic = tool_cmd.get("topic")
-                    course_name = tool_cmd.get("course")
-                    
-                    # Logic to find course ID from name (fuzzy matching or use generic)
-                    # For now, we try to find a matching course in the student's progress
-                    target_course_id = None
-                    for p in progress_records:
-                        if course_name and course_name.lower() in (p.course_name or "").lower():
-                            target_course_id = p.course_id
-                            break
-                    
-                    # Fallback to first course if not found
-                    if not target_course_id and progress_records:
-                        target_course_id = progress_records[0].course_id
-                        
-                    if target_course_id:
-                         # Generate task
-                        ai_task = await ai_service.generate_personalized_task(
-                            student.dict(), 
-                            course_name or "General", 
-                            topic
-                        )
-                        
-                        new_task = Task(
-                            student_id=request.student_id,
-                            course_id=target_course_id,
-                            title=ai_task.get("title", f"Practice {topic}"),
-                            description=ai_task.get("description", "Generated practice task."),
-                            type=ai_task.get("type", "theory"),
-                            difficulty="medium",
-                            status="pending"
-                        )
-                        await new_task.insert()
-
-                        # Update Progress: Increment total_tasks
-                        try:
-                            progress_doc = await Progress.find_one(
-                                Progress.student_id == request.student_id, 
-                                Progress.course_id == target_course_id
-                            )
-                            if progress_doc:
-                                progress_doc.total_tasks += 1
-                                # Recalculate accuracy if needed, though simpler to just update total
-                                current_completed = progress_doc.tasks_completed
-                                progress_doc.accuracy = current_completed / progress_doc.total_tasks
-                                await progress_doc.save()
-                        except Exception as prog_e:
-                            print(f"Error updating progress count: {prog_e}")
-                        
+                    if await _create_chat_task(request.student_id, student, progress_records, topic, tool_cmd.get("course")):
                         # Replace the JSON response with a natural language confirmation
                         ai_response_text = f"I've generated a new practice task for you on **{topic}**. You can find it in your Task Dashboard! (Reason: {tool_cmd.get('reason', 'Practice makes perfect')})"
             except Exception as e:
@@ -155,12 +142,172 @@ async def chat(request: ChatRequest):
         print(f"Error in chat endpoint: {e}")
         return {"response": "I encountered an unexpected error while thinking. Please try again.", "is_error": True}
     
+    return await _save_turn(session, user_msg, ai_response_text, timer)
+
+async def _save_turn(session, user_msg: ChatMessage, ai_response_text: str, timer: PhaseTimer):
     # Add AI message
     ai_msg = ChatMessage(role="model", content=ai_response_text)
-    session.messages.append(ai_msg)
-    await session.save()
+    async with timer.phase("db_save"):
+        await chat_history_service.append(session, [user_msg, ai_msg])
+        # Summarizing happens in a background job, never on this request
+        await chat_memory_service.maybe_schedule(session)
+    
+    return {"response": ai_response_text, "is_error": False, "session_id": str(session["_id"])}
+
+async def _create_chat_task(student_id: str, student: Student, progress_records, topic: str,
+                            course_name: Optional[str], course_id: Optional[str] = None) -> bool:
+    """Generates a practice task on `topic` requested from chat. Returns False if the student has no course to put it in."""
+    # Logic to find course ID from name (fuzzy matching or use generic)
+    # For now, we try to find a matching course in the student's progress
+    target_course_id = course_id
+    if not target_course_id:
+        for p in progress_records:
+            if course_name and course_name.lower() in (p.course_name or "").lower():
+                target_course_id = p.course_id
+                break
+    
+    # Fallback to first course if not found
+    if not target_course_id and progress_records:
+        target_course_id = progress_records[0].course_id
+        
+    if not target_course_id:
+        return False
+
+    # Generate task
+    ai_task = await ai_service.generate_personalized_task(
+        student.dict(), 
+        course_name or "General", 
+        topic,
+        include_tests=True
+    )
     
-    return {"response": ai_response_text, "is_error": False}
+    new_task = Task(
+        student_id=student_id,
+        course_id=target_course_id,
+        title=ai_task.get("title", f"Practice {topic}"),
+        description=ai_task.get("description", "Generated practice task."),
+        type=ai_task.get("type", "theory"),
+        difficulty="medium",
+        status="pending",
+        test_cases=code_runner_service.clean_test_cases(ai_task)
+    )
+    await new_task.insert()
+
+    # Update Progress: Increment total_tasks
+    try:
+        await progress_service.add_tasks(student_id, target_course_id)
+    except Exception as prog_e:
+        print(f"Error updating progress count: {prog_e}")
+    return True
+
+async def _ws_chat_turn(connection: Connection, student_id: str, data: dict):
+    request_id = data.get("id")
+    timer = PhaseTimer()
+
+    async def on_token(text: str):
+        # Waits while the client's send queue is full, so a slow reader slows the stream instead of growing memory
+        await connection.send({"type": "chat.token", "id": request_id, "text": text})
+
+    # Same limits as POST /chat, which the HTTP middleware can't see for socket messages
+    error = await rate_limit_service.check_student("chat", student_id, student_id)
+    if error:
+        await connection.send({"type": "error", "id": request_id, "status_code": 429, **error})
+        return
+    current_student.set(student_id)
+
+    try:
+        result = await _chat(ChatRequest(student_id=student_id, message=data.get("message", ""), session_id=data.get("session_id")), timer, on_token=on_token)
+        # The final text is authoritative: a tool command streamed as tokens is replaced by its confirmation
+        await connection.send({"type": "chat.response", "id": request_id, **result})
+    except HTTPException as e:
+        await connection.send({"type": "error", "id": request_id, "status_code": e.status_code, "detail": e.detail})
+    finally:
+        timer.log(f"/ws/chat student={student_id}")
+
+@router.websocket("/ws/chat/{student_id}")
+async def chat_socket(websocket: WebSocket, student_id: str):
+    """
+    Chat over a WebSocket, plus push notifications when the student's background jobs finish.
+
+    Client -> server: {"type": "chat", "id": <any>, "message": "...", "session_id": <optional>}, {"type": "ping"}, {"type": "pong"}
+    Server -> client: "connected", "chat.token" (streamed text), "chat.response" (final reply, same body
+    as POST /chat), "job.finished", "ping" every heartbeat (answer with "pong"), "pong", "error".
+    """
+    if not await chat_context_service.get_static(student_id):
+        await websocket.close(code=4404)
+        return
+
+    connection = await realtime_service.connect(websocket, student_id)
+    await connection.send({"type": "connected", "heartbeat_seconds": WS_HEARTBEAT_SECONDS})
+    chat_turn = None
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            connection.last_seen = time.monotonic()
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                await connection.send({"type": "error", "detail": "Messages must be JSON"})
+                continue
+
+            kind = data.get("type")
+            if kind == "ping":
+                await connection.send({"type": "pong"})
+            elif kind == "chat":
+                if chat_turn and not chat_turn.done():
+                    # One turn at a time per connection, like one request at a time over HTTP
+                    await connection.send({"type": "error", "id": data.get("id"), "status_code": 409, "detail": "A reply is still being generated"})
+                elif not str(data.get("message", "")).strip():
+                    await connection.send({"type": "error", "id": data.get("id"), "status_code": 400, "detail": "Empty message"})
+                else:
+                    chat_turn = asyncio.create_task(_ws_chat_turn(connection, student_id, data))
+            elif kind != "pong":
+                await connection.send({"type": "error", "detail": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if chat_turn and not chat_turn.done():
+            chat_turn.cancel()
+        await realtime_service.disconnect(connection)
+
+class CreateSessionRequest(BaseModel):
+    title: Optional[str] = None
+    course_id: Optional[str] = None
+
+@router.post("/chat/{student_id}/sessions")
+async def create_chat_session(student_id: str, request: CreateSessionRequest):
+    if not await chat_context_service.get_static(student_id):
+        raise HTTPException(status_code=404, detail="Student not found")
+    session = await chat_history_service.create_session(student_id, request.title, request.course_id)
+    return listing_service.to_json(session)
+
+@router.get("/chat/{student_id}/sessions")
+async def list_chat_sessions(student_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    """
+    The student's chat threads, most recently used first: title, course, counts and a preview of
+    the last message, never the messages themselves. The next page's cursor is in X-Next-Cursor.
+    """
+    try:
+        sessions, next_cursor = await chat_history_service.list_sessions(student_id, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse([listing_service.to_json(s) for s in sessions], headers=headers)
+
+@router.get("/chat/{student_id}/sessions/{session_id}/messages")
+async def get_chat_messages(student_id: str, session_id: str, before: Optional[int] = Query(None, ge=0),
+                            limit: int = Query(50, ge=1, le=200)):
+    """
+    One page of a thread's history, oldest first, ending with the newest message. Pass the
+    X-Next-Cursor value as `before` to load the page before it.
+    """
+    try:
+        session = await chat_history_service.get_session(student_id, session_id)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    messages, next_before = await chat_history_service.page(session, before, limit)
+    headers = {"X-Next-Cursor": str(next_before)} if next_before is not None else {}
+    return JSONResponse([listing_service.to_json(m) for m in messages], headers=headers)
 
 class GenerateTaskRequest(BaseModel):
     student_id: str
@@ -169,17 +316,13 @@ class GenerateTaskRequest(BaseModel):
 
 @router.post("/chat/generate-task")
 async def generate_chat_task(request: GenerateTaskRequest):
-    student = await Student.get(request.student_id)
+    student = await query_service.get_student_profile(request.student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     # course = await Course.get(request.course_id) # Old Mongo way
-    course = None
     from utils.csv_manager import csv_manager
-    for c in csv_manager.get_courses():
-        if str(c.get('id')) == str(request.course_id):
-            course = c
-            break
+    course = csv_manager.get_course_by_id(request.course_id)
 
     if not course:
         print(f"DEBUG Error: Course {request.course_id} not found in CSV for chat-task generation.")
@@ -191,7 +334,8 @@ async def generate_chat_task(request: GenerateTaskRequest):
         ai_task = await ai_service.generate_personalized_task(
             student.dict(), 
             course['name'], 
-            request.topic
+            request.topic,
+            include_tests=True
         )
         
         # Save to DB
@@ -202,9 +346,17 @@ async def generate_chat_task(request: GenerateTaskRequest):
             description=ai_task.get("description", "Generated practice task."),
             type=ai_task.get("type", "theory"),
             difficulty="medium",
-            status="pending"
+            status="pending",
+            test_cases=code_runner_service.clean_test_cases(ai_task)
         )
         await new_task.insert()
+
+        # Update Progress: Increment total_tasks (also drops the cached chat context)
+        try:
+            await progress_service.add_tasks(request.student_id, request.course_id)
+        except Exception as prog_e:
+            print(f"Error updating progress count: {prog_e}")
+            chat_context_service.invalidate(request.student_id)
         return {"status": "success", "task": new_task, "message": "New practice task generated!"}
     except Exception as e:
         print(f"DEBUG Error: Chat task generation failed: {e}")
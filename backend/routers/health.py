@@ -0,0 +1,74 @@
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from utils.startup import startup_tracker
+from database import get_pool_stats
+from services.job_service import job_service
+from services.grading_cache_service import grading_cache_service
+from services.chat_context_service import chat_context_service
+from services.retrieval_service import retrieval_service
+from services.realtime_service import realtime_service
+from services.rate_limit_service import rate_limit_service
+from services.answer_cache_service import answer_cache_service
+from services.usage_service import usage_service
+from services.json_output_service import json_output_service
+from services.ai_service import ai_service
+
+router = APIRouter()
+
+@router.get("/health/live")
+async def liveness():
+    # The process is up and the event loop is responding
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    report = startup_tracker.report()
+    status_code = 200 if report["ready"] else 503
+    report["status"] = "ready" if report["ready"] else "starting"
+    return JSONResponse(status_code=status_code, content=report)
+
+@router.get("/health/db-pool")
+async def db_pool_stats():
+    # Connection pool usage; sustained high utilization or wait times point at pool exhaustion
+    return get_pool_stats()
+
+@router.get("/health/jobs")
+async def job_stats():
+    # Background job counts per kind and status
+    return await job_service.stats()
+
+@router.get("/health/grading-cache")
+async def grading_cache_stats():
+    # Entries and hit rate of the grading result cache
+    return await grading_cache_service.stats()
+
+@router.get("/health/chat-context")
+async def chat_context_stats():
+    # Per-process chat context cache usage
+    return chat_context_service.stats()
+
+@router.get("/health/retrieval")
+async def retrieval_stats():
+    # Size of the knowledge-base index and search latency / hit counts
+    return retrieval_service.stats()
+
+@router.get("/health/realtime")
+async def realtime_stats():
+    # Open WebSocket connections of this process and notification delivery counts
+    return realtime_service.stats()
+
+@router.get("/health/usage")
+async def usage_stats(student_id: Optional[str] = None):
+    # Today's LLM token usage (all students, or one) and rate-limit rejections of this process
+    return {**await usage_service.stats(student_id), "rate_limits": rate_limit_service.stats()}
+
+@router.get("/health/answer-cache")
+async def answer_cache_stats():
+    # Hit rate, lookup time and staleness of the shared chat answer cache of this process
+    return answer_cache_service.stats()
+
+@router.get("/health/json-output")
+async def json_output_stats():
+    # Per-method outcomes of parsing the model's JSON answers (clean, repaired, failed -> fallback)
+    return json_output_service.stats(json_mode=ai_service.json_mode)
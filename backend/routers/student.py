@@ -1,11 +1,21 @@
-from fastapi import APIRouter, HTTPException
-from models import Student, Task, Progress, Course, FYPProject, StudentRoadmap, RoadmapPhase, RoadmapTopic
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from models import Student, Task, Progress, Course, FYPProject, StudentRoadmap, RoadmapPhase, RoadmapTopic, StudyPlan
 from services.ai_service import ai_service
-from services.ml_service import ml_service
+from services.query_service import query_service
+from services.enrollment_service import enrollment_service
+from services.followup_service import followup_service, ModelUnavailableError
+from services.listing_service import listing_service, InvalidListingParams
+from services.task_pool_service import task_pool_service
+from services.task_batch_service import task_batch_service, BatchTooLargeError
+from services.chat_context_service import chat_context_service
+from services.grading_service import grading_service, TaskNotFoundError, IdempotencyConflictError, GradingInProgressError
 from utils.csv_manager import csv_manager
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+from beanie import PydanticObjectId
 
 router = APIRouter()
 
@@ -35,6 +45,11 @@ class RoadmapStatusUpdate(BaseModel):
 class EnrollmentRequest(BaseModel):
     course_ids: List[str]
 
+class BulkEnrollmentRequest(BaseModel):
+    student_ids: List[str] = []
+    course_ids: List[str] = []
+    semester: Optional[int] = None  # Rollover: defaults students and courses to this semester
+
 class TaskSubmissionRequest(BaseModel):
     student_id: str
     task_id: str
@@ -43,7 +58,10 @@ class TaskSubmissionRequest(BaseModel):
 @router.post("/students")
 async def create_student(student_data: StudentCreate):
     student = Student(**student_data.dict())
-    await student.insert()
+    try:
+        await student.insert()
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A student with this roll number already exists")
     return student
 
 @router.get("/students/{student_id}")
@@ -64,6 +82,7 @@ async def update_student(student_id: str, update_data: StudentUpdate):
         setattr(student, key, value)
     
     await student.save()
+    chat_context_service.invalidate(student_id)
     return student
 
 @router.get("/courses/semester/{semester}")
@@ -77,306 +96,154 @@ async def enroll_courses(student_id: str, enrollment: EnrollmentRequest):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Initialize progress for each enrolled course
-    for course_id in enrollment.course_ids:
-        # course = await Course.get(course_id) # Old Mongo way
-        
-        # Check CSV for course
-        course = None
-        for c in csv_manager.get_courses():
-            if str(c['id']) == str(course_id):
-                course = c
-                break
-        
-        if course:
-            # Check if progress already exists
-            existing = await Progress.find_one(
-                Progress.student_id == student_id,
-                Progress.course_id == str(course_id)
-            )
-            if not existing:
-                progress = Progress(
-                    student_id=student_id,
-                    course_id=str(course_id),
-                    course_name=course['name'],
-                    total_tasks=len(course.get('topics', [])) # Use CSV topics
-                )
-                await progress.insert()
-                
-                # Generate tasks for this course
-                await generate_tasks_for_student(student_id, course_id)
-    
-    return {"status": "success", "message": "Enrolled in courses and tasks generated"}
+    # Initialize progress and tasks for each enrolled course in bulk
+    result = await enrollment_service.enroll([student_id], enrollment.course_ids)
+    await task_pool_service.schedule_fill_for_enrollment([student_id], enrollment.course_ids)
+    
+    return {"status": "success", "message": "Enrolled in courses and tasks generated", **result}
+
+@router.post("/enrollments/bulk")
+async def bulk_enroll(request: BulkEnrollmentRequest):
+    """Admin endpoint for cohort enrollment and semester rollovers."""
+    course_ids = request.course_ids
+    if not course_ids and request.semester is not None:
+        course_ids = [str(c['id']) for c in csv_manager.get_semester_courses(request.semester)]
+    if not course_ids:
+        raise HTTPException(status_code=400, detail="Provide course_ids or a semester")
+
+    if request.student_ids:
+        oids = []
+        unknown_students = []
+        for sid in dict.fromkeys(request.student_ids):
+            try:
+                oids.append(PydanticObjectId(sid))
+            except Exception:
+                unknown_students.append(sid)
+        found = await Student.get_motor_collection().find({"_id": {"$in": oids}}, {"_id": 1}).to_list(None)
+        student_ids = [str(d["_id"]) for d in found]
+        found_ids = set(student_ids)
+        unknown_students += [str(oid) for oid in oids if str(oid) not in found_ids]
+    elif request.semester is not None:
+        found = await Student.get_motor_collection().find({"current_semester": request.semester}, {"_id": 1}).to_list(None)
+        student_ids = [str(d["_id"]) for d in found]
+        unknown_students = []
+    else:
+        raise HTTPException(status_code=400, detail="Provide student_ids or a semester")
+
+    result = await enrollment_service.enroll(student_ids, course_ids)
+    # Pre-generate task contents for the cohort's learning styles in the background
+    await task_pool_service.schedule_fill_for_enrollment(student_ids, course_ids)
+    return {"status": "success", "unknown_students": unknown_students, **result}
+
+def _wants_ndjson(output: Optional[str], accept: Optional[str]) -> bool:
+    return output == "ndjson" or "application/x-ndjson" in (accept or "")
+
+async def _list_documents(model, filters: dict, cursor: Optional[str], limit: Optional[int],
+                          fields: Optional[str], stream: bool):
+    """
+    Lists documents oldest first. Without `limit` or `cursor` the JSON response is the whole list
+    (the array clients already expect); with either it is one page, and the next page's cursor is
+    sent in the X-Next-Cursor header. NDJSON streams every match.
+    """
+    try:
+        projection = listing_service.parse_fields(model, fields)
+        query = listing_service.build_query(filters, cursor)
+    except InvalidListingParams as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        return StreamingResponse(
+            listing_service.stream_ndjson(model, query, projection, limit),
+            media_type="application/x-ndjson"
+        )
+
+    docs, next_cursor = await listing_service.fetch_page(model, query, projection, listing_service.clamp_limit(limit, cursor))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(docs, headers=headers)
 
 @router.get("/progress/{student_id}")
-async def get_progress(student_id: str):
-    progress = await Progress.find(Progress.student_id == student_id).to_list()
-    return progress
+async def get_progress(student_id: str, status: Optional[str] = None, cursor: Optional[str] = None,
+                       limit: Optional[int] = Query(None, ge=1), fields: Optional[str] = None,
+                       output: Optional[str] = Query(None, alias="format"), accept: Optional[str] = Header(None)):
+    return await _list_documents(
+        Progress, {"student_id": student_id, "status": status},
+        cursor, limit, fields, _wants_ndjson(output, accept)
+    )
 
 @router.get("/tasks/{student_id}")
-async def get_tasks(student_id: str, course_id: Optional[str] = None):
-    if course_id:
-        tasks = await Task.find(Task.student_id == student_id, Task.course_id == course_id).to_list()
-    else:
-        tasks = await Task.find(Task.student_id == student_id).to_list()
-    return tasks
+async def get_tasks(student_id: str, course_id: Optional[str] = None, status: Optional[str] = None,
+                    cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1),
+                    fields: Optional[str] = None, output: Optional[str] = Query(None, alias="format"),
+                    accept: Optional[str] = Header(None)):
+    return await _list_documents(
+        Task, {"student_id": student_id, "course_id": course_id, "status": status},
+        cursor, limit, fields, _wants_ndjson(output, accept)
+    )
 
 @router.post("/tasks/submit")
-async def submit_task(submission: TaskSubmissionRequest):
-    task = await Task.get(submission.task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    # Store submission
-    task.submission = submission.submission_content
-    
-    # AI Verification
+async def submit_task(submission: TaskSubmissionRequest, idempotency_key: Optional[str] = Header(None)):
     try:
-        verification = await ai_service.verify_submission(
-            task.title,
-            task.description,
-            submission.submission_content
-        )
-    except Exception as e:
-        print(f"Error during AI verification: {e}")
-        return {
-            "status": "error",
-            "message": "AI Verification service is temporarily unavailable. Your work is saved, please try verifying again later.",
-            "verified": False,
-            "feedback": "Connectivity error."
-        }
-    
-    task.ai_feedback = verification.get("feedback", "No feedback provided.")
-    task.score = verification.get("score", 0)
-    task.verified = verification.get("verified", task.score >= 50)
-    
-    # Ensure a non-zero score if verified but AI returned 0 or missing score
-    if task.verified and task.score == 0:
-        task.score = 70
-    
-    print(f"DEBUG: Task {submission.task_id} score: {task.score}, verified: {task.verified}")
-
-    if task.verified:
-        task.status = "completed"
-        task.completed_at = datetime.now()
-        
-        # Update progress
-        try:
-            if task.course_id:
-                progress = await Progress.find_one(
-                    Progress.student_id == submission.student_id,
-                    Progress.course_id == task.course_id
-                )
-                if progress:
-                    # Get all completed tasks for this course to calculate average score
-                    completed_tasks = await Task.find(
-                        Task.student_id == submission.student_id,
-                        Task.course_id == task.course_id,
-                        Task.status == "completed"
-                    ).to_list()
-                    
-                    # Include current task if not already in the list
-                    total_scores = sum(t.score for t in completed_tasks)
-                    if not any(t.id == task.id for t in completed_tasks):
-                        total_scores += task.score
-                        count = len(completed_tasks) + 1
-                    else:
-                        count = len(completed_tasks)
-                    
-                    progress.tasks_completed = count
-                    progress.accuracy = count / progress.total_tasks if progress.total_tasks > 0 else 0
-                    progress.grade = (total_scores / count) if count > 0 else 0
-                    
-                    print(f"DEBUG: New progress: {progress.tasks_completed}/{progress.total_tasks} (Avg Score: {progress.grade}%)")
-                    
-                    if progress.tasks_completed == progress.total_tasks:
-                       progress.status = "completed"
-                    
-                    await progress.save()
-        except Exception as e:
-            print(f"Error updating progress: {e}")
-            # We don't return error here because task was already verified and saved
-    else:
-        print(f"DEBUG: Task NOT verified. Feedback: {task.ai_feedback}")
-    
-    await task.save()
-    
-    return {
-        "status": "success" if task.verified else "failed",
-        "verified": task.verified,
-        "score": task.score,
-        "feedback": task.ai_feedback,
-        "message": "Task submitted and graded by AI"
-    }
+        return await grading_service.submit(submission.task_id, submission.submission_content, idempotency_key)
+    except TaskNotFoundError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different submission")
+    except GradingInProgressError:
+        raise HTTPException(status_code=409, detail="This submission is still being graded. Please retry shortly.")
 
 class TaskSubmission(BaseModel):
     submission_content: str
 
 @router.post("/tasks/{task_id}/verify")
-async def verify_task(task_id: str, submission: TaskSubmission):
-    task = await Task.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-        
-    if task.status == "completed":
-        return {"status": "success", "verified": True, "message": "Task already completed"}
+async def verify_task(task_id: str, submission: TaskSubmission, idempotency_key: Optional[str] = Header(None)):
+    async def after_verified(task: Task):
+        # Remedial tasks and the study plan refresh run in the background; the grade is returned right away
+        await followup_service.schedule_after_verification(task.student_id)
 
-    # AI Verification
     try:
-        verification_result = await ai_service.verify_submission(
-            task.title,
-            task.description,
-            submission.submission_content
-        )
-    except Exception as e:
-        print(f"Error during AI verification: {e}")
-        return {
-            "status": "error", 
-            "verified": False, 
-            "message": "Something went wrong with AI verification. Please try again later."
-        }
-    
-    task.score = verification_result.get("score", 0)
-    task.verified = verification_result.get("verified", task.score >= 50)
-    task.ai_feedback = verification_result.get("feedback", "No feedback.")
-
-    # Ensure a non-zero score if verified but AI returned 0 or missing score
-    if task.verified and task.score == 0:
-        task.score = 70
-
-    if task.verified:
-        # Mark as completed if verified
-        task.status = "completed"
-        task.completed_at = datetime.now()
-        await task.save()
-        
-        # Update progress
-        try:
-            if task.course_id:
-                progress = await Progress.find_one(
-                    Progress.student_id == task.student_id,
-                    Progress.course_id == task.course_id
-                )
-                if progress:
-                    completed_tasks = await Task.find(
-                        Task.student_id == task.student_id,
-                        Task.course_id == task.course_id,
-                        Task.status == "completed"
-                    ).to_list()
-                    
-                    total_scores = sum(t.score for t in completed_tasks)
-                    if not any(t.id == task.id for t in completed_tasks):
-                        total_scores += task.score
-                        count = len(completed_tasks) + 1
-                    else:
-                        count = len(completed_tasks)
-                    
-                    progress.tasks_completed = count
-                    progress.accuracy = count / progress.total_tasks if progress.total_tasks > 0 else 0
-                    progress.grade = (total_scores / count) if count > 0 else 0
-                    
-                    print(f"DEBUG: New progress: {progress.tasks_completed}/{progress.total_tasks} (Avg Score: {progress.grade}%)")
-                    
-                    if progress.tasks_completed == progress.total_tasks:
-                        progress.status = "completed"
-                    
-                    await progress.save()
-        except Exception as e:
-            print(f"Error updating progress: {e}")
-        if task.verified:
-            # Check for auto-generation of new tasks if this was the last one
-            try:
-                await check_and_generate_remedial_tasks(task.student_id)
-            except Exception as e:
-                print(f"Error generating remedial tasks: {e}")
-
-            return {
-                "status": "success", 
-                "verified": True, 
-                "score": task.score,
-                "message": f"Great job! Your submission scored {task.score}%.",
-                "feedback": task.ai_feedback
-            }
-    
-    return {
-        "status": "success", 
-        "verified": False, 
-        "score": task.score,
-        "message": "Submission needs improvement.",
-        "feedback": task.ai_feedback
-    }
-
-async def check_and_generate_remedial_tasks(student_id: str):
-    """
-    Checks if the student has completed all tasks. 
-    If so, generates remedial tasks for weak areas.
-    """
-    # 1. Check for any pending tasks
-    pending_count = await Task.find(
-        Task.student_id == student_id,
-        Task.status == "pending"
-    ).count()
-    
-    if pending_count > 0:
-        return # Still has work to do
-        
-    print(f"DEBUG: Student {student_id} has 0 pending tasks. Checking for weak areas...")
-    
-    # 2. Identify weak areas (Low accuracy or failed tasks)
-    weak_areas = await ml_service.identify_weak_areas(student_id)
-    
-    if not weak_areas:
-        print("DEBUG: No weak areas found. Good job!")
-        return
-
-    # 3. Generate 1 remedial task for the top weak area
-    # We explicitly take only the first one to avoid overwhelming them
-    target = weak_areas[0] 
-    course_name = target['course_name']
-    
-    # Needs course_id for the task
-    # Find progress record to get course_id
-    progress = await Progress.find_one(
-        Progress.student_id == student_id, 
-        Progress.course_name == course_name
-    )
-    
-    if not progress:
-        return
+        return await grading_service.verify(task_id, submission.submission_content, idempotency_key, on_verified=after_verified)
+    except TaskNotFoundError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different submission")
+    except GradingInProgressError:
+        raise HTTPException(status_code=409, detail="This submission is still being graded. Please retry shortly.")
 
-    student = await Student.get(student_id)
-    
-    # Generate Task
-    print(f"DEBUG: Generating remedial task for {course_name} (Accuracy: {target['accuracy']})")
-    
-    ai_task = await ai_service.generate_personalized_task(
-        student.dict(),
-        course_name,
-        f"Remedial Practice for {course_name}" # Using course name as topic proxy for now, ideally we need granular topics
-    )
-    
-    new_task = Task(
-        student_id=student_id,
-        course_id=progress.course_id,
-        title=ai_task.get("title", f"Review {course_name}"),
-        description=ai_task.get("description", "A personalized practice task to improve your score."),
-        type=ai_task.get("type", "theory"),
-        difficulty="medium",
-        status="pending"
-    )
-    await new_task.insert()
-    
-    # Update Progress Stats
-    progress.total_tasks += 1
-    # Recalculate accuracy (denominator changed)
-    progress.accuracy = progress.tasks_completed / progress.total_tasks
-    # Reset status if it was completed, now they have more work!
-    if progress.status == "completed":
-        progress.status = "ongoing"
-        
-    await progress.save()
-    
-    print(f"DEBUG: Remedial task created: {new_task.title}. Progress updated.")
+class BatchVerificationItem(BaseModel):
+    task_id: str
+    submission_content: str
+    idempotency_key: Optional[str] = None
+
+class BatchVerificationRequest(BaseModel):
+    items: List[BatchVerificationItem]
+
+class BatchGenerationRequest(BaseModel):
+    task_ids: List[str]
+
+def _batch_summary(results: List[dict]) -> dict:
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+@router.post("/tasks/verify/batch")
+async def verify_tasks_batch(request: BatchVerificationRequest):
+    """Verifies several tasks in one request; each item reports its own status code and result."""
+    async def after_verified(task: Task):
+        await followup_service.schedule_after_verification(task.student_id)
+
+    try:
+        results = await task_batch_service.verify_many([item.dict() for item in request.items], on_verified=after_verified)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _batch_summary(results)
+
+@router.post("/tasks/ai-generate/batch")
+async def generate_tasks_content_batch(request: BatchGenerationRequest):
+    """Generates content for several placeholder tasks; each item reports its own status code."""
+    try:
+        results = await task_batch_service.generate_many(request.task_ids)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _batch_summary(results)
 
 @router.post("/tasks/{task_id}/ai-generate")
 async def generate_task_content(task_id: str):
@@ -386,7 +253,7 @@ async def generate_task_content(task_id: str):
         print(f"DEBUG Error: Task {task_id} not found in database.")
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
         
-    if task.description and "Practice:" in task.title:
+    if task_pool_service.has_content(task):
         return task
 
     student = await Student.get(task.student_id)
@@ -394,46 +261,13 @@ async def generate_task_content(task_id: str):
         print(f"DEBUG Error: Student {task.student_id} not found for task {task_id}")
         raise HTTPException(status_code=404, detail="Student not found")
 
-    # Resilience: Try to find course by ID in CSV, or fallback to Progress record
-    course_name = "Global"
-    matched_course = None
-    for c in csv_manager.get_courses():
-        if str(c.get('id')) == str(task.course_id):
-            matched_course = c
-            course_name = c['name']
-            break
-    
-    if not matched_course:
-        print(f"DEBUG Warning: Task {task_id} has course_id {task.course_id} which wasn't found in CSV. Checking Progress...")
-        # Fallback to Progress record to get the course name
-        from models import Progress
-        progress = await Progress.find_one(
-            Progress.student_id == task.student_id,
-            Progress.course_id == task.course_id
-        )
-        if progress and progress.course_name:
-            course_name = progress.course_name
-            print(f"DEBUG: Found course name '{course_name}' from Progress record.")
-        else:
-            print(f"DEBUG Error: Could not determine course name for task {task_id}.")
-            course_name = "General Academic Subject"
-
-    print(f"DEBUG: Calling AI to generate task content for topic: {task.title} in course: {course_name}")
-    # Call AI service to generate a real task
     try:
-        # Import to be safe if not at top
-        from services.ai_service import ai_service
-        ai_task = await ai_service.generate_personalized_task(
-            student.dict(), 
-            course_name, 
-            task.title
-        )
-        
-        task.title = ai_task.get("title", task.title)
-        task.description = ai_task.get("description", task.description)
-        task.type = ai_task.get("type", task.type)
-        
-        await task.save()
+        # Enrollment tasks are served from the shared variant pool; the LLM is only called when it runs dry
+        content = await task_pool_service.generate_for_task(task, student)
+
+        # $set only the generated fields, so a grading update running meanwhile is not overwritten.
+        # test_cases are replaced too: tests written for the old description must not grade the new one
+        await task.set({getattr(Task, field): value for field, value in content.items()})
         print(f"DEBUG: Task {task_id} successfully updated with AI content.")
         return task
     except Exception as e:
@@ -442,39 +276,9 @@ async def generate_task_content(task_id: str):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"AI content generation failed: {str(e)}")
 
-async def generate_tasks_for_student(student_id: str, course_id: str):
-    # course = await Course.get(course_id)
-    course = None
-    for c in csv_manager.get_courses():
-        if str(c['id']) == str(course_id):
-            course = c
-            break
-
-    if not course:
-        return
-    
-    # Create a task for each topic
-    for topic in course.get('topics', []):
-        # Check if task already exists
-        existing = await Task.find_one(
-            Task.student_id == student_id,
-            Task.course_id == course_id,
-            Task.title == topic
-        )
-        if not existing:
-            task = Task(
-                student_id=student_id,
-                course_id=course_id,
-                title=topic,
-                description=f"Learn and master the concepts of {topic} in {course['name']}.",
-                type="theory",
-                difficulty="medium"
-            )
-            await task.insert()
-
 @router.get("/fyp/suggestions/{student_id}")
 async def get_fyp_suggestions(student_id: str):
-    student = await Student.get(student_id)
+    student = await query_service.get_student_profile(student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -499,34 +303,28 @@ async def get_fyp_details(project_id: str):
     return details
 
 @router.get("/students/{student_id}/study-plan")
-async def get_study_plan(student_id: str):
-    student = await Student.get(student_id)
-    if not student:
+async def get_study_plan(student_id: str, refresh: bool = False):
+    # Plans are regenerated in the background after each verified task; serve the stored one
+    if not refresh:
+        cached = await StudyPlan.find_one(StudyPlan.student_id == student_id)
+        if cached:
+            return {"study_plan": cached.plan, "generated_at": cached.generated_at}
+
+    try:
+        plan = await followup_service.refresh_study_plan(student_id)
+    except ModelUnavailableError:
+        raise HTTPException(status_code=503, detail="The study plan can't be generated right now. Please try again in a few minutes.")
+    if plan is None:
         raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Get enrolled courses
-    progress_records = await Progress.find(Progress.student_id == student_id).to_list()
-    courses = []
-    for pr in progress_records:
-        courses.append({"id": pr.course_id, "name": pr.course_name})
-    
-    # Get completed topics from completed tasks
-    completed_tasks = await Task.find(
-        Task.student_id == student_id,
-        Task.status == "completed"
-    ).to_list()
-    completed_topics = [t.title for t in completed_tasks]
-    
-    plan = await ai_service.generate_study_plan(student.dict(), courses, completed_topics)
     return {"study_plan": plan}
 
 @router.get("/students/{student_id}/progress-summary")
 async def get_progress_summary(student_id: str):
-    student = await Student.get(student_id)
+    student = await query_service.get_student_profile(student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    progress_list = await Progress.find(Progress.student_id == student_id).to_list()
+    progress_list = await query_service.get_progress_summaries(student_id)
     
     summary = await ai_service.summarize_progress(
         student.dict(), 
@@ -589,6 +387,7 @@ async def get_student_roadmap(student_id: str, interest: Optional[str] = None):
         resources=roadmap_json.get("resources", []) # Map global resources
     )
     await new_roadmap.insert()
+    chat_context_service.invalidate(student_id)
     
     return new_roadmap.dict()
 
@@ -612,6 +411,7 @@ async def update_roadmap_progress(
         if 0 <= topic_index < len(phase.topics):
             phase.topics[topic_index].status = update_data.status
             await roadmap.save()
+            chat_context_service.invalidate(student_id)
             return {"status": "success", "message": "Topic updated"}
             
     raise HTTPException(status_code=400, detail="Invalid phase or topic index")
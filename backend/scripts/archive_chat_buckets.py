@@ -0,0 +1,34 @@
+"""
+Moves chat message buckets that haven't been written to for a while into the
+`chat_message_archive` collection, keeping the hot bucket collection small.
+
+Usage:
+    python scripts/archive_chat_buckets.py [--days 180]
+
+The two newest buckets of every session stay in place, so chat context is unaffected.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db
+from services.chat_history_service import chat_history_service
+
+
+async def main(days: int):
+    await init_db()
+    cutoff = datetime.now() - timedelta(days=days)
+    moved = await chat_history_service.archive(cutoff)
+    print(f"Archived {moved} chat buckets not written since {cutoff:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old chat message buckets")
+    parser.add_argument("--days", type=int, default=180, help="Archive buckets idle for this many days")
+    args = parser.parse_args()
+    asyncio.run(main(args.days))
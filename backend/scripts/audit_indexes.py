@@ -0,0 +1,97 @@
+"""
+Runs explain() on every query shape the API issues and flags collection scans.
+
+Usage:
+    python scripts/audit_indexes.py
+
+Exits with status 1 if any query shape is answered by a COLLSCAN, so it can gate deploys.
+"""
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from bson import ObjectId
+from database import init_db
+from models import Student, Task, TaskVariant, Progress, ChatSession, ChatMessageBucket, StudentRoadmap, Notification
+
+SAMPLE_ID = "000000000000000000000000"
+
+# (model, description, filter). Values are placeholders: the plan depends on the shape, not the data.
+QUERY_SHAPES = [
+    (Student, "login by roll number", {"roll_number": "00F-0000"}),
+    (Task, "tasks by student", {"student_id": SAMPLE_ID}),
+    (Task, "tasks by student + course", {"student_id": SAMPLE_ID, "course_id": "1"}),
+    (Task, "completed tasks by course", {"student_id": SAMPLE_ID, "course_id": "1", "status": "completed"}),
+    (Task, "tasks by student + status", {"student_id": SAMPLE_ID, "status": "pending"}),
+    (Task, "task page after cursor", {"student_id": SAMPLE_ID, "_id": {"$gt": ObjectId(SAMPLE_ID)}}),
+    (Task, "task page by course after cursor", {"student_id": SAMPLE_ID, "course_id": "1", "_id": {"$gt": ObjectId(SAMPLE_ID)}}),
+    (Task, "enrollment task by topic", {"student_id": SAMPLE_ID, "course_id": "1", "topic": "Loops"}),
+    (TaskVariant, "task pool variant by key", {"course_id": "1", "topic": "Loops", "learning_style": "Visual", "study_pace": "Moderate"}),
+    (Progress, "progress by student", {"student_id": SAMPLE_ID}),
+    (Progress, "progress by course id", {"student_id": SAMPLE_ID, "course_id": "1"}),
+    (Progress, "bulk enrollment lookup", {"student_id": {"$in": [SAMPLE_ID]}, "course_id": {"$in": ["1", "2"]}}),
+    (Progress, "progress by course name", {"student_id": SAMPLE_ID, "course_name": "Programming Fundamentals"}),
+    (Progress, "completed progress (skill matrix)", {"student_id": SAMPLE_ID, "status": "completed"}),
+    (Progress, "weak areas", {"student_id": SAMPLE_ID, "accuracy": {"$lt": 0.6}}),
+    (ChatSession, "latest chat session of student", {"student_id": SAMPLE_ID}),
+    (ChatSession, "chat sessions page after cursor", {"student_id": SAMPLE_ID, "$or": [
+        {"updated_at": {"$lt": datetime(2025, 1, 1)}}, {"updated_at": datetime(2025, 1, 1), "_id": {"$lt": ObjectId(SAMPLE_ID)}}, {"updated_at": None}
+    ]}),
+    (ChatMessageBucket, "recent chat buckets", {"session_id": SAMPLE_ID, "bucket": {"$gte": 3, "$lte": 4}}),
+    (StudentRoadmap, "roadmap by interest", {"student_id": SAMPLE_ID, "interest": "AI/ML"}),
+    (Notification, "notification relay after cursor", {"_id": {"$gt": ObjectId(SAMPLE_ID)}, "origin": {"$ne": "host:1"}, "student_id": {"$in": [SAMPLE_ID]}}),
+]
+
+
+def _stages(plan):
+    """Yields every stage name in an explain plan tree (classic and SBE formats)."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def _index_names(plan):
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            yield plan["indexName"]
+        for value in plan.values():
+            yield from _index_names(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _index_names(item)
+
+
+async def audit() -> bool:
+    await init_db()
+
+    all_ok = True
+    print(f"{'collection':<18} {'query':<36} {'plan':<28} result")
+    print("-" * 95)
+    for model, description, query in QUERY_SHAPES:
+        collection = model.get_motor_collection()
+        explain = await collection.find(query).explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_stages(winning_plan))
+        collscan = "COLLSCAN" in stages
+        index_names = sorted(set(_index_names(winning_plan)))
+        plan = "COLLSCAN" if collscan else ",".join(index_names) or "+".join(stages)
+        all_ok = all_ok and not collscan
+        print(f"{collection.name:<18} {description:<36} {plan:<28} {'FAIL' if collscan else 'ok'}")
+
+    return all_ok
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(audit())
+    if not ok:
+        print("\nCollection scans detected. Declare an index for the flagged query in models.py.")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,40 @@
+"""
+Rebuilds the retrieval index over dataset.json, courses.csv and fyp_data.csv and
+optionally runs a few queries against it.
+
+Usage:
+    python scripts/build_retrieval_index.py [--query "binary trees" --query "blockchain project"] [--k 5]
+
+The server rebuilds the index by itself when a source file changes; this is for
+pre-building it (e.g. in the Docker image) and for checking what a query retrieves.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.retrieval_service import retrieval_service, RETRIEVAL_INDEX_PATH
+
+
+def main(queries, k: int):
+    documents = retrieval_service.rebuild()
+    print(f"Indexed {documents} documents into {RETRIEVAL_INDEX_PATH} ({retrieval_service.build_ms} ms)")
+
+    for query in queries:
+        start = time.perf_counter()
+        results = retrieval_service.search(query, k=k)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"\n{query!r}: {len(results)} results in {elapsed:.2f} ms")
+        for r in results:
+            print(f"  {r['score']:>6}  [{r['source']}] {r['title']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the local retrieval index")
+    parser.add_argument("--query", action="append", default=[], help="Query to run after building (repeatable)")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+    main(args.query, args.k)
@@ -0,0 +1,52 @@
+"""
+Removes duplicate roll numbers (students) and duplicate (student_id, course_id) rows (progress)
+so the unique indexes declared on those models can be built.
+
+Usage:
+    python scripts/dedupe_unique_keys.py [--dry-run]
+
+The server runs the same migration on startup before creating its indexes; this script lets
+you review what it will drop first. Dropped documents are moved to students_duplicates and
+progress_duplicates. The tasks, progress, chat sessions and other rows of a dropped student are
+re-pointed to the kept one; a row that clashes with one the kept student already has is moved to
+<collection>_duplicates. Run scripts/migrate_progress_sums.py afterwards to recompute the progress
+that was kept from the tasks.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import certifi
+from motor.motor_asyncio import AsyncIOMotorClient
+from database import TLS_ALLOW_INVALID_CERTS, dedupe_unique_keys
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Drop duplicates of the students and progress unique keys.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the duplicates")
+    args = parser.parse_args()
+
+    # Not init_db: that would already run the migration and build the indexes
+    client = AsyncIOMotorClient(
+        os.getenv("MONGODB_URI", "mongodb://localhost:27017"),
+        tlsCAFile=certifi.where(),
+        tlsAllowInvalidCertificates=TLS_ALLOW_INVALID_CERTS,
+        serverSelectionTimeoutMS=5000
+    )
+    try:
+        dropped = await dedupe_unique_keys(client.ai_chatbot_db, dry_run=args.dry_run)
+    finally:
+        client.close()
+
+    if not dropped:
+        print("Unique indexes already exist. Nothing to do.")
+    for name, count in dropped.items():
+        print(f"{name}: {count} duplicate documents {'found' if args.dry_run else 'removed'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
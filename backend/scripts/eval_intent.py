@@ -0,0 +1,72 @@
+"""
+Measures the chat task-request detector against the labeled messages in
+data/intent_fixtures.jsonl.
+
+Usage:
+    python scripts/eval_intent.py [--fixtures data/intent_fixtures.jsonl] [--verbose]
+
+Each fixture line is {"message", "task_request", "topic", "course"}; topic and course
+are the expected extraction (course null when no enrolled course should match).
+All catalog courses count as enrolled. Exits non-zero if detection accuracy is below --min-accuracy.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.intent_service import intent_service
+from utils.csv_manager import csv_manager
+
+
+def main(fixtures_path: str, verbose: bool, min_accuracy: float) -> int:
+    with open(fixtures_path, "r", encoding="utf-8") as f:
+        fixtures = [json.loads(line) for line in f if line.strip()]
+    courses = [{"id": str(c["id"]), "name": c["name"]} for c in csv_manager.get_courses()]
+
+    tp = fp = fn = tn = topic_ok = course_ok = 0
+    start = time.perf_counter()
+    for fx in fixtures:
+        result = intent_service.detect_task_request(fx["message"], courses)
+        detected = result is not None
+        if detected and fx["task_request"]:
+            tp += 1
+            topic_right = result["topic"].lower() == (fx["topic"] or "").lower()
+            course_right = result["course_name"] == fx["course"]
+            topic_ok += topic_right
+            course_ok += course_right
+            if verbose and not (topic_right and course_right):
+                print(f"EXTRACTION  {fx['message']!r}: got {result['topic']!r}/{result['course_name']!r}, expected {fx['topic']!r}/{fx['course']!r}")
+        elif detected:
+            fp += 1
+            if verbose:
+                print(f"FALSE POS   {fx['message']!r}: got {result}")
+        elif fx["task_request"]:
+            fn += 1
+            if verbose:
+                print(f"FALSE NEG   {fx['message']!r}")
+        else:
+            tn += 1
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    accuracy = (tp + tn) / len(fixtures)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    print(f"Fixtures: {len(fixtures)} ({tp + fn} task requests)")
+    print(f"Detection accuracy: {accuracy:.3f}  precision: {precision:.3f}  recall: {recall:.3f}")
+    if tp:
+        print(f"Topic extraction: {topic_ok}/{tp}  course match: {course_ok}/{tp}")
+    print(f"Average latency: {elapsed_ms / len(fixtures):.3f} ms per message")
+    return 0 if accuracy >= min_accuracy else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the chat task-request detector")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_fixtures.jsonl"))
+    parser.add_argument("--verbose", action="store_true", help="Print every misclassified message")
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    args = parser.parse_args()
+    sys.exit(main(args.fixtures, args.verbose, args.min_accuracy))
@@ -1,10 +1,11 @@
 import csv
 import random
 import os
+import sys
 
-# Configuration
+# Configuration (student count can be overridden: python generate_large_dataset.py 1000000)
 NUM_FYP = 650
-NUM_STUDENTS = 1000
+NUM_STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("NUM_STUDENTS", "1000"))
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -64,36 +65,39 @@ def generate_fyp_data():
     print(f"[DONE] Saved to {filepath}")
 
 def generate_student_data():
-    data = []
     print(f"Generating {NUM_STUDENTS} students...")
-    for i in range(1, NUM_STUDENTS + 1):
-        semester = random.randint(1, 8)
-        
-        # Determine roll number based on semester (approx year)
-        year = 2024 - (semester // 2)
-        roll = f"{str(year)[-2:]}F-{random.randint(1000, 9999)}"
-        
-        interests = random.sample(CATEGORIES, k=random.randint(1, 3))
-        
-        row = {
-            "roll_number": roll,
-            "password": "1234", # Default password
-            "name": f"{random.choice(NAMES_FIRST)} {random.choice(NAMES_LAST)}",
-            "uni_name": random.choice(UNIVERSITIES),
-            "current_semester": semester,
-            "interests": "|".join(interests),
-            "weak_subjects": "Calculus|Programming" if random.random() > 0.7 else "",
-            "study_pace": random.choice(["Slow", "Moderate", "Fast"]),
-            "learning_style": random.choice(["Visual", "Reading", "Practice"])
-        }
-        data.append(row)
+    # Roll numbers must be unique (they are the seeding key); widen the serial for large rosters
+    serial_digits = max(4, len(str(NUM_STUDENTS)) + 1)
+    used_rolls = set()
 
-    # Write to CSV
+    # Rows are streamed to disk so large rosters don't need to fit in memory
     filepath = os.path.join(DATA_DIR, "students.csv")
     with open(filepath, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=["roll_number", "password", "name", "uni_name", "current_semester", "interests", "weak_subjects", "study_pace", "learning_style"])
         writer.writeheader()
-        writer.writerows(data)
+        for i in range(1, NUM_STUDENTS + 1):
+            semester = random.randint(1, 8)
+            
+            # Determine roll number based on semester (approx year)
+            year = 2024 - (semester // 2)
+            roll = f"{str(year)[-2:]}F-{random.randint(10 ** (serial_digits - 1), 10 ** serial_digits - 1)}"
+            while roll in used_rolls:
+                roll = f"{str(year)[-2:]}F-{random.randint(10 ** (serial_digits - 1), 10 ** serial_digits - 1)}"
+            used_rolls.add(roll)
+            
+            interests = random.sample(CATEGORIES, k=random.randint(1, 3))
+            
+            writer.writerow({
+                "roll_number": roll,
+                "password": "1234", # Default password
+                "name": f"{random.choice(NAMES_FIRST)} {random.choice(NAMES_LAST)}",
+                "uni_name": random.choice(UNIVERSITIES),
+                "current_semester": semester,
+                "interests": "|".join(interests),
+                "weak_subjects": "Calculus|Programming" if random.random() > 0.7 else "",
+                "study_pace": random.choice(["Slow", "Moderate", "Fast"]),
+                "learning_style": random.choice(["Visual", "Reading", "Practice"])
+            })
     print(f"[DONE] Saved to {filepath}")
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+Backfills Progress.score_sum / tasks_completed (and the derived grade, accuracy, status)
+from the completed tasks already in the database.
+
+Usage:
+    python scripts/migrate_progress_sums.py
+
+Safe to run more than once: every value is recomputed from the tasks, not incremented.
+"""
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+from database import init_db
+from models import Progress, Task
+from services.progress_service import ProgressService
+
+BATCH_SIZE = 1000
+
+
+async def migrate():
+    await init_db()
+    progress_col = Progress.get_motor_collection()
+    task_col = Task.get_motor_collection()
+
+    # Uses the (student_id, status) task index for the match
+    totals = task_col.aggregate([
+        {"$match": {"status": "completed", "course_id": {"$ne": None}}},
+        {"$group": {
+            "_id": {"student_id": "$student_id", "course_id": "$course_id"},
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$score"}
+        }}
+    ])
+
+    ops = []
+    updated = 0
+    async for row in totals:
+        ops.append(UpdateOne(
+            {"student_id": row["_id"]["student_id"], "course_id": row["_id"]["course_id"]},
+            [
+                {"$set": {"tasks_completed": row["count"], "score_sum": row["score_sum"]}},
+                ProgressService.derived_fields()
+            ]
+        ))
+        if len(ops) >= BATCH_SIZE:
+            result = await progress_col.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+    if ops:
+        result = await progress_col.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+
+    # Courses with no completed tasks just need the new field
+    untouched = await progress_col.update_many(
+        {"score_sum": {"$exists": False}},
+        [{"$set": {"score_sum": 0, "tasks_completed": 0}}, ProgressService.derived_fields()]
+    )
+
+    print(f"[DONE] Backfilled {updated} progress records from completed tasks; "
+          f"initialised {untouched.modified_count} records with no completed tasks.")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,112 @@
+"""
+Fires concurrent gradings at a local MongoDB and checks that Progress ends up exact.
+
+Usage:
+    python scripts/stress_progress.py [--tasks 50] [--repeats 4] [--extra-tasks 10]
+
+Every task is verified/submitted `--repeats` times at once (like a client double-tapping or
+retrying), while `--extra-tasks` remedial tasks are added to the same course. Runs against a
+scratch database (dropped afterwards) and exits with status 1 if any count drifted.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from models import Task, Progress, GradingResult, GradingCacheEntry
+from services.ai_service import ai_service
+from services.grading_service import grading_service
+from services.progress_service import progress_service
+
+STRESS_DB = "ai_chatbot_stress"
+STUDENT_ID = "stress-student"
+COURSE_ID = "stress-course"
+
+
+async def fake_verify_submission(title, description, submission_content):
+    # The grader is replaced so the run is deterministic and only exercises the database
+    await asyncio.sleep(random.uniform(0, 0.05))
+    score = int(submission_content.rsplit(":", 1)[1])
+    return {"verified": score >= 50, "score": score, "feedback": "stress"}
+
+
+async def run(tasks: int, repeats: int, extra_tasks: int) -> bool:
+    uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=5000)
+    await client.drop_database(STRESS_DB)
+    await init_beanie(database=client[STRESS_DB], document_models=[Task, Progress, GradingResult, GradingCacheEntry])
+    ai_service.verify_submission = fake_verify_submission
+
+    try:
+        await Progress(student_id=STUDENT_ID, course_id=COURSE_ID, course_name="Stress", total_tasks=tasks).insert()
+        task_docs = [
+            Task(student_id=STUDENT_ID, course_id=COURSE_ID, title=f"Task {i}", description="", type="theory", difficulty="medium")
+            for i in range(tasks)
+        ]
+        await Task.insert_many(task_docs)
+        task_ids = [str(d["_id"]) for d in await Task.get_motor_collection().find({}, {"_id": 1}).to_list(None)]
+
+        calls = []
+        for task_id in task_ids:
+            for r in range(repeats):
+                # At least one passing grade per task so every task ends up completed
+                score = 90 if r == 0 else random.choice([30, 60, 75, 100])
+                if r % 2:
+                    calls.append(grading_service.submit(task_id, f"{task_id}:{score}"))
+                else:
+                    calls.append(grading_service.verify(task_id, f"{task_id}:{score}"))
+        calls += [progress_service.add_tasks(STUDENT_ID, COURSE_ID) for _ in range(extra_tasks)]
+        random.shuffle(calls)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        elapsed = loop.time() - started
+        errors = [r for r in results if isinstance(r, Exception)]
+
+        final_tasks = await Task.get_motor_collection().find({}, {"status": 1, "score": 1}).to_list(None)
+        completed = [t for t in final_tasks if t["status"] == "completed"]
+        expected = {
+            "tasks_completed": len(completed),
+            "total_tasks": tasks + extra_tasks,
+            "score_sum": float(sum(t["score"] for t in completed)),
+        }
+        progress = await Progress.get_motor_collection().find_one({"student_id": STUDENT_ID, "course_id": COURSE_ID})
+        actual = {k: progress[k] for k in expected}
+        actual["score_sum"] = float(actual["score_sum"])
+
+        print(f"{len(calls)} concurrent operations in {elapsed:.2f}s, {len(errors)} errors")
+        for e in errors[:5]:
+            print(f"  {type(e).__name__}: {e}")
+        print(f"{'field':<16} {'expected':>10} {'actual':>10}")
+        ok = not errors and len(completed) == tasks
+        for field, value in expected.items():
+            match = actual[field] == value
+            ok = ok and match
+            print(f"{field:<16} {value:>10} {actual[field]:>10} {'' if match else '  MISMATCH'}")
+        grade = expected["score_sum"] / len(completed) if completed else None
+        if progress.get("grade") != grade:
+            ok = False
+            print(f"grade: expected {grade}, got {progress.get('grade')}  MISMATCH")
+        return ok
+    finally:
+        await client.drop_database(STRESS_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency stress test for Progress updates")
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=4, help="Concurrent gradings per task")
+    parser.add_argument("--extra-tasks", type=int, default=10, help="Concurrent remedial task additions")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.tasks, args.repeats, args.extra_tasks))
+    print("\nOK: progress is exact" if ok else "\nFAIL: progress drifted under concurrency")
+    sys.exit(0 if ok else 1)
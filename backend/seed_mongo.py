@@ -1,46 +1,142 @@
 import asyncio
+import argparse
 import sys
 import os
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set
 
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
-from models import Course, FYPProject, Student, Task, Progress, ChatSession
+from pymongo import UpdateOne
+from models import Student
 from dotenv import load_dotenv
 
 load_dotenv()
 
+SEED_CHUNK_SIZE = int(os.getenv("SEED_CHUNK_SIZE", "1000"))
+DEFAULT_STUDENTS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "students.csv")
+CHECKPOINT_COLLECTION = "seed_checkpoints"
+
+
+def _chunks(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _checkpoint_key(csv_path: str) -> str:
+    # Size + mtime identify a specific version of the file; a regenerated roster starts over
+    stat = os.stat(csv_path)
+    return f"students:{os.path.basename(csv_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _to_upsert(row: Dict) -> Optional[UpdateOne]:
+    try:
+        doc = Student(**row).model_dump(exclude={"id", "revision_id"})
+    except Exception as e:
+        print(f"Skipping invalid row {row.get('roll_number')}: {e}")
+        return None
+    # $setOnInsert keeps re-runs idempotent: existing students are never overwritten
+    return UpdateOne({"roll_number": doc["roll_number"]}, {"$setOnInsert": doc}, upsert=True)
+
+
+async def seed_students(csv_path: str = DEFAULT_STUDENTS_CSV, chunk_size: int = SEED_CHUNK_SIZE, resume: bool = True) -> Dict:
+    """
+    Streams the students CSV in chunks and bulk-upserts each chunk keyed on roll_number.
+    Progress is checkpointed per chunk so an interrupted run resumes where it stopped. Rows
+    repeating a roll number already read are dropped and counted in the progress lines and
+    the returned stats; invalid rows are skipped and reported.
+    """
+    from utils.csv_manager import csv_manager
+
+    collection = Student.get_motor_collection()
+    checkpoints = collection.database[CHECKPOINT_COLLECTION]
+    # The unique roll_number index is declared on Student and created by init_db
+
+    key = _checkpoint_key(csv_path)
+    checkpoint = await checkpoints.find_one({"_id": key}) if resume else None
+    skip_rows = checkpoint["rows_done"] if checkpoint else 0
+    if checkpoint and checkpoint.get("completed"):
+        print(f"[INFO] {csv_path} already fully seeded ({skip_rows} rows). Nothing to do.")
+        return {"rows": skip_rows, "inserted": 0, "existing": 0, "invalid": 0, "duplicates": 0, "seconds": 0.0, "rows_per_second": 0}
+    if skip_rows:
+        print(f"Resuming seeding of {csv_path} after row {skip_rows}...")
+
+    stats = {"rows": skip_rows, "inserted": 0, "existing": 0, "invalid": 0, "duplicates": 0}
+    start = time.perf_counter()
+    rows = islice(csv_manager.iter_csv(csv_path), skip_rows, None)
+    # Roll numbers read in this run
+    seen: Set[str] = set()
+
+    for chunk in _chunks(rows, chunk_size):
+        ops = []
+        for row in chunk:
+            op = _to_upsert(row)
+            if op is None:
+                stats["invalid"] += 1
+                continue
+            if row["roll_number"] in seen:
+                # Only the first row of a roll number is inserted; the unique index would reject the rest
+                stats["duplicates"] += 1
+                continue
+            seen.add(row["roll_number"])
+            ops.append(op)
+        if ops:
+            result = await collection.bulk_write(ops, ordered=False)
+            stats["inserted"] += result.upserted_count
+            stats["existing"] += len(ops) - result.upserted_count
+        stats["rows"] += len(chunk)
+
+        await checkpoints.update_one({"_id": key}, {"$set": {"rows_done": stats["rows"], "completed": False}}, upsert=True)
+
+        elapsed = time.perf_counter() - start
+        processed = stats["rows"] - skip_rows
+        print(f"Seeded {stats['rows']} rows ({stats['inserted']} new, {stats['duplicates']} duplicates dropped) "
+              f"- {processed / elapsed:.0f} rows/s")
+
+    await checkpoints.update_one({"_id": key}, {"$set": {"rows_done": stats["rows"], "completed": True}}, upsert=True)
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_second"] = round((stats["rows"] - skip_rows) / elapsed) if elapsed > 0 else 0
+    return stats
+
 
 async def seed_initial_data():
     print("Checking if data seeding is required...")
-    
-    
-    # fast check: if we have students, assume seeded to prevent startup timeout
-    if await Student.count() > 0:
+
+    if not os.path.exists(DEFAULT_STUDENTS_CSV):
+        print(f"Warning: {DEFAULT_STUDENTS_CSV} not found. Skipping student seeding.")
+        return
+
+    # Databases seeded before checkpoints existed have students but no checkpoint; leave those alone
+    collection = Student.get_motor_collection()
+    has_checkpoint = await collection.database[CHECKPOINT_COLLECTION].find_one({"_id": {"$regex": "^students:"}}) is not None
+    if not has_checkpoint and await collection.find_one({}, {"_id": 1}) is not None:
         print("[INFO] Students already exist in database. Skipping CSV seeding to speed up startup.")
-        print("To force re-seed, clear the database or run seed script manually.")
+        print("To force re-seed, run: python seed_mongo.py --no-resume")
         return
 
-    # Seed Students from CSV
-    from utils.csv_manager import csv_manager
-    students = csv_manager.get_students()
-    
-    # Batch insert would be better, but keeping loop for safety for now, just optimizing the check
-    print(f"Seeding {len(students)} students from CSV...")
-    for s_data in students:
-        # Check if student exists
-        exists = await Student.find_one(Student.roll_number == s_data["roll_number"])
-        if not exists:
-            student = Student(**s_data)
-            await student.insert()
-            print(f"Inserted: {s_data['name']}")
-        else:
-            print(f"Skipping: {s_data['name']}")
-
-    print("[DONE] Student seeding completed.")
+    stats = await seed_students(DEFAULT_STUDENTS_CSV)
+    print(f"[DONE] Student seeding completed: {stats}")
     print("[INFO] Courses and FYP Projects are now served directly from CSVs.")
 
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Bulk-load students from a CSV into MongoDB.")
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_STUDENTS_CSV)
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any checkpoint and re-scan the whole file")
+    args = parser.parse_args()
+
+    from database import init_db
+    await init_db()
+    stats = await seed_students(args.csv_path, chunk_size=args.chunk_size, resume=not args.no_resume)
+    print(f"[DONE] {stats}")
+
+
 if __name__ == "__main__":
-    asyncio.run(seed_initial_data())
+    asyncio.run(_main())
@@ -1,9 +1,100 @@
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import json
 import asyncio
 import httpx
 from services.ml_service import ml_service
+from services.retrieval_service import retrieval_service
+from services.usage_service import usage_service
+from services.json_output_service import json_output_service
+
+# Returned by _call_ollama when every attempt failed. JSON fallbacks carry "fallback": true instead
+AI_UNAVAILABLE_MESSAGE = "The AI service is currently unavailable. Please try again in a few minutes."
+# Constrain JSON-producing calls with the backend's structured output mode (Ollama "format", OpenAI "response_format")
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "true").lower() == "true"
+
+# Schemas of the JSON answers; sent to the backend in JSON mode and used to validate / repair the answer
+TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "type": {"type": "string", "enum": ["theory", "coding", "mcq"], "default": "theory"},
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"input": {"type": "string"}, "output": {"type": "string"}},
+                "required": ["input", "output"]
+            }
+        }
+    },
+    "required": ["title", "description", "type"]
+}
+VERIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        # Graders fall back to score >= 50 when "verified" is missing
+        "verified": {"type": "boolean"},
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "feedback": {"type": "string", "default": ""}
+    },
+    "required": ["score", "feedback"]
+}
+ROADMAP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "interest": {"type": "string"},
+        "phases": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "topics": {"type": "array", "items": {"type": "string"}, "default": []},
+                    "project": {"type": "string", "default": ""},
+                    "duration": {"type": "string", "default": ""}
+                },
+                "required": ["title", "topics"]
+            }
+        },
+        "resources": {"type": "array", "items": {"type": "string"}, "default": []}
+    },
+    "required": ["phases", "resources"]
+}
+PROJECT_DETAILS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "roadmap": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {"phase": {"type": "string"}, "tasks": {"type": "array", "items": {"type": "string"}}},
+                "required": ["phase", "tasks"]
+            }
+        },
+        "tech_stack": {"type": "object", "additionalProperties": {"type": "string"}, "default": {}},
+        "key_features": {"type": "array", "items": {"type": "string"}, "default": []},
+        "learning_gems": {"type": "array", "items": {"type": "string"}, "default": []}
+    },
+    "required": ["roadmap", "tech_stack", "key_features", "learning_gems"]
+}
+FYP_RATIONALE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "suggestions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "string"}, "rationale": {"type": "string"}},
+                "required": ["id", "rationale"]
+            }
+        }
+    },
+    "required": ["suggestions"]
+}
 
 class AIService:
     def __init__(self):
@@ -13,6 +104,8 @@ class AIService:
         self.model_name = os.getenv("AI_MODEL_NAME", "gpt-oss:120b-cloud") 
         self.api_url = os.getenv("OLLAMA_HOST", "http://localhost:11434/api/chat")
         self.api_key = os.getenv("AI_API_KEY")
+        # A request whose structured output parameters are rejected is retried without them
+        self.json_mode = AI_JSON_MODE
         
     def load_dataset(self):
         try:
@@ -27,7 +120,17 @@ class AIService:
             print("Warning: dataset.json not found. Using generic knowledge.")
             self.dataset = {}
 
-    async def _call_ollama(self, prompt: str, system: str = "You are a helpful academic assistant.") -> str:
+    def _json_mode_params(self, json_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not json_schema or not self.json_mode:
+            return {}
+        if "/completions" in self.api_url:
+            # OpenAI-compatible backends: JSON object mode is the widely supported subset
+            return {"response_format": {"type": "json_object"}}
+        # Ollama constrains generation to the schema itself
+        return {"format": json_schema}
+
+    async def _call_ollama(self, prompt: str, system: str = "You are a helpful academic assistant.",
+                           json_schema: Optional[Dict[str, Any]] = None) -> str:
         # Determine if we should use 'prompt' (generate) or 'messages' (chat)
         is_chat_endpoint = any(x in self.api_url for x in ["/chat", "/completions"])
         
@@ -50,6 +153,8 @@ class AIService:
                 "stream": False,
                 "temperature": 0.7
             }
+        json_params = self._json_mode_params(json_schema)
+        payload.update(json_params)
         
         headers = {
             "Content-Type": "application/json",
@@ -70,6 +175,14 @@ class AIService:
                         headers=headers
                     )
                     
+                    if response.status_code in (400, 422) and json_params:
+                        # Only this request: a 400 can as well come from the prompt or a transient error
+                        print(f"AI Service Warning: Backend rejected JSON mode ({response.status_code}); retrying without it")
+                        for key in json_params:
+                            payload.pop(key, None)
+                        json_params = {}
+                        continue
+
                     if response.status_code != 200:
                         print(f"AI Service Error: HTTP {response.status_code}: {response.text}")
                         # If it's a 429 (rate limit) or 500, we might want to retry.
@@ -77,6 +190,7 @@ class AIService:
                         continue
 
                     result = response.json()
+                    await usage_service.record(result)
                     
                     # Try different response fields (Ollama, Ollama-Chat, OpenAI/Cloud)
                     text = result.get('response') # Standard Ollama
@@ -107,38 +221,101 @@ class AIService:
                 await asyncio.sleep(2 * (attempt + 1))
         
         # --- FALLBACK MECHANISM ---
-        # If we reach here, AI service is down or unreachable.
-        print("AI Service Error: All retries failed. Attempting fallback mock response.")
-        
-        if "JSON" in system.upper() or "JSON" in prompt.upper():
-            if "roadmap" in prompt.lower():
-                # FIX: topics must be a list of STRINGS to match conversion logic
-                return json.dumps({
-                    "interest": "Computer Science", 
-                    "phases": [
-                        {
-                            "title": "Foundation", 
-                            "topics": ["Basics of the field", "Key tools and setup"], 
-                            "project": "Starter Project", 
-                            "duration": "2 weeks"
-                        },
-                        {
-                            "title": "Development", 
-                            "topics": ["Core concepts", "Intermediate techniques"], 
-                            "project": "Milestone App", 
-                            "duration": "4 weeks"
-                        }
-                    ], 
-                    "resources": ["Official Documentation", "Online Tutorials"]
-                })
-            elif "task" in prompt.lower():
-                return '{"title": "Practice Challenge", "description": "AI service is currently busy. Please review your recently covered topics and try generating a specific task later.", "type": "theory"}'
-            elif "verify" in prompt.lower() or "submission" in prompt.lower():
-                 return '{"verified": true, "score": 85, "feedback": "Auto-verified for offline mode."}'
-        
-        return "The AI service is currently unavailable. Please try again in a few minutes."
-
-    async def get_chat_response(self, message: str, context: List[Dict[str, str]], student_profile: Optional[Dict] = None, tasks_context: Optional[List[Dict]] = None, courses_context: Optional[List[Dict]] = None, roadmap_context: Optional[Dict] = None) -> str:
+        # If we reach here, AI service is down or unreachable. JSON callers (json_schema) get this
+        # message too and answer with their own method-specific fallback, marked "fallback": true.
+        print("AI Service Error: All retries failed.")
+        return AI_UNAVAILABLE_MESSAGE
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[Dict[str, Any]]:
+        """One streamed line: Ollama NDJSON ({"message": ...} / {"response": ...}) or OpenAI SSE ("data: {...}")."""
+        line = line.strip()
+        if line.startswith("data:"):
+            line = line[5:].strip()
+        if not line or line == "[DONE]":
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _stream_chunk_text(chunk: Dict[str, Any]) -> Optional[str]:
+        text = chunk.get('response') or (chunk.get('message') or {}).get('content')
+        if not text:
+            choices = chunk.get('choices') or [{}]
+            text = (choices[0].get('delta') or {}).get('content')
+        return text or None
+
+    async def _stream_ollama(self, prompt: str, system: str, on_token: Callable[[str], Awaitable]) -> str:
+        """
+        Like _call_ollama, but passes the answer to `on_token` piece by piece as the model produces it.
+        If streaming fails before the first token, falls back to _call_ollama (retries, fallback text)
+        and hands over its answer as a single piece. Returns the full text.
+        """
+        is_chat_endpoint = any(x in self.api_url for x in ["/chat", "/completions"])
+        if is_chat_endpoint:
+            payload: Dict[str, Any] = {
+                "model": self.model_name,
+                "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+                "stream": True,
+                "temperature": 0.7
+            }
+            if "/completions" in self.api_url:
+                # OpenAI-compatible backends only report token usage in a stream when asked to
+                payload["stream_options"] = {"include_usage": True}
+        else:
+            payload = {"model": self.model_name, "prompt": f"System: {system}\n\nUser: {prompt}", "stream": True, "temperature": 0.7}
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+
+        parts: List[str] = []
+        try:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                async with client.stream("POST", self.api_url, json=payload, headers=headers) as response:
+                    if response.status_code != 200:
+                        raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+                    async for line in response.aiter_lines():
+                        chunk = self._parse_stream_line(line)
+                        if chunk is None:
+                            continue
+                        # Usage arrives on the final chunk (Ollama "done", OpenAI include_usage)
+                        await usage_service.record(chunk)
+                        text = self._stream_chunk_text(chunk)
+                        if text:
+                            parts.append(text)
+                            await on_token(text)
+        except Exception as e:
+            print(f"AI Service Stream Error: {e}")
+
+        if parts:
+            # Also after a mid-stream error: the client already has this part of the answer
+            return "".join(parts)
+        text = await self._call_ollama(prompt, system=system)
+        await on_token(text)
+        return text
+
+    async def check_health(self, timeout: float = 30.0) -> bool:
+        """Sends one tiny request to the model backend (no retries, no fallback).
+        Doubles as a warm-up so the model is loaded before the first student request."""
+        is_chat_endpoint = any(x in self.api_url for x in ["/chat", "/completions"])
+        if is_chat_endpoint:
+            payload = {"model": self.model_name, "messages": [{"role": "user", "content": "ping"}], "stream": False}
+        else:
+            payload = {"model": self.model_name, "prompt": "ping", "stream": False}
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+
+        try:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response = await client.post(self.api_url, json=payload, headers=headers)
+            if response.status_code != 200:
+                print(f"AI Service Health: HTTP {response.status_code}")
+                return False
+            return True
+        except Exception as e:
+            print(f"AI Service Health: unreachable ({e})")
+            return False
+
+    async def get_chat_response(self, message: str, context: List[Dict[str, str]], student_profile: Optional[Dict] = None, tasks_context: Optional[List[Dict]] = None, courses_context: Optional[List[Dict]] = None, roadmap_context: Optional[Dict] = None, conversation_summary: Optional[str] = None, on_token: Optional[Callable[[str], Awaitable]] = None) -> str:
         system_context = """
         You are an expert AI Study Assistant for Computer Science students. 
         Your goal is to provide highly structured, academic, and encouraging responses.
@@ -173,10 +350,17 @@ class AIService:
             system_context += f"\nACTIVE ROADMAP CONTEXT:\n{json.dumps(roadmap_context, default=str)}"
             system_context += "\nThe student is actively working on this roadmap. Guide them through the 'pending_topics'. If they ask 'what to do next', refer to the first pending topic."
 
-        system_context += "\nAlways tailor your advice to their learning style and pace. If they mention a weak subject, be extra explanatory."
+        if conversation_summary:
+            system_context += f"\nSUMMARY OF THE EARLIER CONVERSATION:\n{conversation_summary}"
+            system_context += "\nUse it to stay consistent with what was already discussed; the most recent messages follow in full."
+
+        if student_profile:
+            system_context += "\nAlways tailor your advice to their learning style and pace. If they mention a weak subject, be extra explanatory."
         
-        if self.dataset:
-            system_context += f"\nRelevant Domain Knowledge: {json.dumps(self.dataset.get('study_resources', {}))}."
+        # Only the knowledge-base entries relevant to this message, not the whole dataset
+        snippets = retrieval_service.search(message)
+        if snippets:
+            system_context += f"\nRelevant Domain Knowledge:\n{retrieval_service.format_snippets(snippets)}"
 
         # Add Tool Calling Instruction
         system_context += """
@@ -198,12 +382,14 @@ class AIService:
 
         # Format conversation history for prompt
         history_str = ""
-        for msg in context[-5:]: # Last 5 messages for context
+        for msg in context: # Callers pass only the recent window; older turns arrive via the summary
             role = "User" if msg['role'] == "user" else "Assistant"
             history_str += f"{role}: {msg['content']}\n"
 
         prompt = f"{history_str}User: {message}\nAssistant:"
         
+        if on_token:
+            return await self._stream_ollama(prompt, system_context, on_token)
         return await self._call_ollama(prompt, system=system_context)
 
     async def generate_fyp_suggestions_hybrid(self, student_id: str) -> Dict:
@@ -221,32 +407,33 @@ class AIService:
         
         Task:
         Rewrite the "rationale" for each project to be encouraging and exciting for the student. 
-        IMPORTANT: Preserve all other fields (id, title, description, score, match_score, category, matching_skills) exactly as they are.
-        Return ONLY valid JSON structure: {{ "suggestions": [ ... ] }}
+        Return ONLY valid JSON structure: {{ "suggestions": [ {{ "id": "<project id>", "rationale": "..." }}, ... ] }}
         """
         
-        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.")
-        return self._clean_json(response_text, recommendations)
+        fallback = {"suggestions": recommendations}
+        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.", json_schema=FYP_RATIONALE_SCHEMA)
+        rewritten = self._parse_json("fyp_rationales", response_text, FYP_RATIONALE_SCHEMA, fallback)
+        if rewritten is fallback:
+            return fallback
+        # Only the rationales come from the model; every other field stays exactly as calculated
+        rationales = {str(s["id"]): s["rationale"] for s in rewritten["suggestions"]}
+        return {"suggestions": [{**r, "rationale": rationales.get(r["id"], r["rationale"])} for r in recommendations]}
 
-    def _clean_json(self, text: str, fallback: Any) -> Any:
-        """Helper to clean and parse JSON from AI responses."""
-        try:
-            cleaned = text.strip()
-            if "```json" in cleaned:
-                cleaned = cleaned.split("```json")[1].split("```")[0].strip()
-            elif "```" in cleaned:
-                cleaned = cleaned.split("```")[1].split("```")[0].strip()
-            
-            # Remove any trailing commas or stray text before parsing
-            # (Basic cleaning, can be expanded if needed)
-            return json.loads(cleaned)
-        except Exception as e:
-            print(f"JSON Parsing Error: {e}")
+    def _parse_json(self, method: str, text: str, schema: Dict[str, Any], fallback: Any) -> Any:
+        """The schema-valid JSON value in a model answer, repaired if needed; `fallback` if there is none."""
+        if text == AI_UNAVAILABLE_MESSAGE:
+            json_output_service.record(method, "unavailable")
             return fallback
+        return json_output_service.load(method, text, schema, fallback)
 
     async def generate_study_plan(self, student_profile: dict, courses: List[dict], completed_topics: List[str] = None) -> str:
         """Generates a detailed weekly study plan based on student profile and progress."""
-        resources_text = json.dumps(self.dataset.get('study_resources', {}))
+        plan_query = " ".join(
+            [str(c.get('name') or c.get('course_name') or '') for c in courses]
+            + [str(s) for s in (student_profile.get('weak_subjects') or [])]
+        )
+        resources = retrieval_service.search(plan_query, sources=["study_resources", "courses"])
+        resources_text = retrieval_service.format_snippets(resources) or "(none)"
         
         prompt = f"""
         Act as an expert academic counselor for Computer Science. 
@@ -297,8 +484,8 @@ class AIService:
             "learning_gems": ["...", "..."]
         }}
         """
-        response_text = await self._call_ollama(prompt, system="You are an expert technical architect. Output only JSON.")
-        return self._clean_json(response_text, {
+        response_text = await self._call_ollama(prompt, system="You are an expert technical architect. Output only JSON.", json_schema=PROJECT_DETAILS_SCHEMA)
+        return self._parse_json("generate_project_details", response_text, PROJECT_DETAILS_SCHEMA, {
             "roadmap": [{"phase": "Generic", "tasks": ["Research foundations", "Define scope"]}],
             "tech_stack": {"Tools": "Python, Mobile Framework, Cloud"},
             "key_features": ["User Auth", "Main Engine"],
@@ -331,8 +518,28 @@ class AIService:
         }}
         """
         
-        response_text = await self._call_ollama(prompt, system="You are a professional academic evaluator. Output only JSON.")
-        return self._clean_json(response_text, {"verified": True, "score": 80, "feedback": "Manual backup verification applied due to service glitch."})
+        response_text = await self._call_ollama(prompt, system="You are a professional academic evaluator. Output only JSON.", json_schema=VERIFICATION_SCHEMA)
+        return self._parse_json("verify_submission", response_text, VERIFICATION_SCHEMA, {"verified": False, "score": 0, "feedback": "The grader is unavailable, so this submission could not be checked.", "fallback": True})
+
+    async def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """Folds older chat turns into a compact running summary of the conversation."""
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+        )
+        prompt = f"""
+        You maintain the memory of a tutoring conversation between a Computer Science student and a study assistant.
+
+        Current summary (may be empty):
+        {previous_summary or "(none)"}
+
+        New messages to add:
+        {transcript}
+
+        Write the updated summary in at most 200 words. Keep: topics covered, what the student
+        understood or struggled with, tasks or plans agreed on, and open questions. Drop greetings
+        and small talk. Return only the summary text.
+        """
+        return await self._call_ollama(prompt, system="You summarize conversations accurately and concisely.")
 
     async def summarize_progress(self, student_profile: dict, progress_list: List[dict]) -> str:
         """Generates a encouraging and analytical summary of student progress."""
@@ -348,8 +555,22 @@ class AIService:
         """
         return await self._call_ollama(prompt)
 
-    async def generate_personalized_task(self, student_profile: dict, course_name: str, topic: str) -> Dict:
-        """Use AI to generate a specific task for a topic based on student learning style."""
+    async def generate_personalized_task(self, student_profile: dict, course_name: str, topic: str, include_tests: bool = False) -> Dict:
+        """
+        Use AI to generate a specific task for a topic based on student learning style.
+        With `include_tests`, coding tasks come with hidden test cases so they can be graded locally.
+        """
+        tests_instructions = ""
+        tests_field = ""
+        if include_tests:
+            tests_instructions = """
+        4. If the type is "coding", write the task as a Python 3 program that reads from standard input and
+           prints to standard output, state the exact input and output format in the description, and add
+           3 to 6 "test_cases" covering normal and edge cases. Omit "test_cases" for other types.
+        """
+            tests_field = """,
+            "test_cases": [{"input": "exact stdin", "output": "exact expected stdout"}]"""
+
         prompt = f"""
         Act as an expert CS educator. Generate a personalized learning task for a student.
         
@@ -370,7 +591,7 @@ class AIService:
            - If style is 'Practice', make it a specific coding challenge.
            - If style is 'Reading', make it a deep-dive research question.
         3. Assign a "type" (theory, coding, or mcq).
-        
+        {tests_instructions}
         Guidelines:
         - Ensure the task can be fully completed using ONLY text input in a chat box.
         - Do not ask for files, uploads, or actual drawings.
@@ -379,15 +600,16 @@ class AIService:
         {{
             "title": "Clear Task Title",
             "description": "Specific detailed instruction/question",
-            "type": "coding/theory/mcq"
+            "type": "coding/theory/mcq"{tests_field}
         }}
         """
         
-        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.")
-        return self._clean_json(response_text, {
+        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.", json_schema=TASK_SCHEMA)
+        return self._parse_json("generate_personalized_task", response_text, TASK_SCHEMA, {
             "title": f"Study {topic}",
             "description": f"Review and master {topic} for the {course_name} course.",
-            "type": "theory"
+            "type": "theory",
+            "fallback": True
         })
 
     async def generate_interest_roadmap(self, student_profile: dict, interest: str) -> Dict:
@@ -426,8 +648,8 @@ class AIService:
         }}
         """
         
-        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.")
-        return self._clean_json(response_text, {
+        response_text = await self._call_ollama(prompt, system="You are a JSON assistant. Output only JSON.", json_schema=ROADMAP_SCHEMA)
+        return self._parse_json("generate_interest_roadmap", response_text, ROADMAP_SCHEMA, {
             "interest": interest,
             "phases": [
                 {
@@ -0,0 +1,206 @@
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+from services.retrieval_service import retrieval_service
+from utils.csv_manager import csv_manager
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(3 * 24 * 3600)))
+# Cosine similarity of the TF-IDF vectors above which two questions share an answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9"))
+ANSWER_CACHE_MAX_QUESTION_CHARS = 200
+
+# Words that tie a question to the student or the conversation; such questions are never cached
+_PERSONAL = {
+    "i", "im", "ive", "me", "my", "mine", "myself", "we", "our", "us",
+    "it", "this", "that", "these", "those", "above", "previous", "earlier", "again", "continue", "more",
+    "task", "tasks", "progress", "grade", "grades", "score", "scores", "roadmap", "plan", "submission",
+    "deadline", "exam", "semester", "enrolled", "recommend", "suggest", "should"
+}
+# Question scaffolding: "explain X", "what is X" and "tell me about X" ask the same thing
+_SCAFFOLDING = {
+    "explain", "describe", "define", "definition", "tell", "about", "please", "could", "would",
+    "give", "between", "briefly", "simple", "simply", "terms", "meant", "mean", "means", "concept", "are", "does", "work", "works"
+}
+_SYNONYMS = {"vs": "difference", "versus": "difference", "compare": "difference", "comparison": "difference",
+             "differences": "difference", "differ": "difference"}
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+class AnswerCacheService:
+    """
+    Opt-in (ANSWER_CACHE_ENABLED) cache of chat answers to general conceptual questions, shared
+    by all students.
+
+    A question is only eligible when nothing in it refers to the student or the conversation
+    (see _PERSONAL); eligible questions are answered from a prompt without the student's
+    profile, tasks, roadmap or conversation, and only such answers are cached. It is keyed by
+    its catalog course and normalized terms; a new question reuses an answer when its TF-IDF
+    vector (IDF from the retrieval index) is within ANSWER_CACHE_SIMILARITY of a cached question
+    of the same course. Entries are evicted least-recently-used beyond ANSWER_CACHE_MAX_ENTRIES
+    and expire after ANSWER_CACHE_TTL_SECONDS. The cache is per process.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_term: Dict[str, Set[str]] = {}
+        self._courses = None
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.skipped = 0
+        self.lookup_seconds = 0.0
+        self.hit_age_seconds = 0.0
+        self.max_hit_age_seconds = 0.0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    @staticmethod
+    def _terms(message: str) -> Optional[List[str]]:
+        words = [w.replace("'", "") for w in _WORD_RE.findall(message.lower())]
+        if any(w in _PERSONAL for w in words):
+            return None
+        terms = []
+        for term in retrieval_service.tokenize(" ".join(_SYNONYMS.get(w, w) for w in words)):
+            if term in _SCAFFOLDING:
+                continue
+            # Crude plural folding so "binary trees" and "binary tree" share a key
+            if len(term) > 4 and term.endswith("s") and not term.endswith("ss"):
+                term = term[:-1]
+            terms.append(term)
+        return terms or None
+
+    def _course_of(self, message: str) -> str:
+        # Only a course named in the question counts; matching by topic would split identical questions
+        if self._courses is None:
+            # Longest name first, so "Deep Learning" is found before a shorter name inside it
+            self._courses = sorted(
+                ((re.sub(r"[^a-z0-9]", "", c["name"].lower()), str(c["id"])) for c in csv_manager.get_courses()),
+                key=lambda c: -len(c[0])
+            )
+        squashed = re.sub(r"[^a-z0-9]", "", message.lower())
+        return next((course_id for name, course_id in self._courses if name and name in squashed), "")
+
+    def prepare(self, message: str) -> Optional[Dict[str, Any]]:
+        """The cache key and vector of a question, or None if it isn't eligible for the shared cache."""
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        if len(message) > ANSWER_CACHE_MAX_QUESTION_CHARS:
+            self.skipped += 1
+            return None
+        terms = self._terms(message)
+        if not terms:
+            self.skipped += 1
+            return None
+        course_id = self._course_of(message)
+        vector: Dict[str, float] = {}
+        for term in terms:
+            vector[term] = vector.get(term, 0.0) + retrieval_service.idf(term)
+        return {
+            "key": f"{course_id}|{' '.join(sorted(set(terms)))}",
+            "course_id": course_id,
+            "vector": vector,
+            "norm": math.sqrt(sum(w * w for w in vector.values()))
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for term in entry["vector"]:
+                keys = self._by_term.get(term)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_term[term]
+
+    def _similar(self, query: Dict[str, Any]) -> Optional[str]:
+        candidates: Set[str] = set()
+        for term in query["vector"]:
+            candidates |= self._by_term.get(term, set())
+        best_key, best = None, ANSWER_CACHE_SIMILARITY
+        for key in candidates:
+            entry = self._entries[key]
+            if entry["course_id"] != query["course_id"]:
+                continue
+            dot = sum(w * entry["vector"].get(t, 0.0) for t, w in query["vector"].items())
+            similarity = dot / (query["norm"] * entry["norm"]) if query["norm"] and entry["norm"] else 0.0
+            if similarity >= best:
+                best_key, best = key, similarity
+        return best_key
+
+    def lookup(self, query: Optional[Dict[str, Any]]) -> Optional[str]:
+        """The cached answer for a prepared question, if there is a fresh one."""
+        if query is None:
+            return None
+        start = time.perf_counter()
+        self.lookups += 1
+        now = time.monotonic()
+        key = query["key"] if query["key"] in self._entries else self._similar(query)
+        answer = None
+        if key is not None:
+            entry = self._entries[key]
+            age = now - entry["stored_at"]
+            if age > ANSWER_CACHE_TTL_SECONDS:
+                self._remove(key)
+                self.evicted_ttl += 1
+            else:
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                if key == query["key"]:
+                    self.exact_hits += 1
+                else:
+                    self.similar_hits += 1
+                self.hit_age_seconds += age
+                self.max_hit_age_seconds = max(self.max_hit_age_seconds, age)
+                answer = entry["answer"]
+        self.lookup_seconds += time.perf_counter() - start
+        return answer
+
+    def store(self, query: Optional[Dict[str, Any]], answer: str, student_name: Optional[str] = None):
+        if query is None or not answer:
+            return
+        # The model sometimes addresses the student by name; such an answer can't be shown to others
+        name_words = [w for w in _WORD_RE.findall((student_name or "").lower()) if len(w) > 2]
+        if name_words and any(w in name_words for w in _WORD_RE.findall(answer.lower())):
+            return
+        self._remove(query["key"])
+        self._entries[query["key"]] = {
+            "course_id": query["course_id"],
+            "vector": query["vector"],
+            "norm": query["norm"],
+            "answer": answer,
+            "stored_at": time.monotonic(),
+            "hits": 0
+        }
+        for term in query["vector"]:
+            self._by_term.setdefault(term, set()).add(query["key"])
+        while len(self._entries) > ANSWER_CACHE_MAX_ENTRIES:
+            self._remove(next(iter(self._entries)))
+            self.evicted_lru += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.similar_hits
+        now = time.monotonic()
+        ages = [now - e["stored_at"] for e in self._entries.values()]
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else None,
+            "skipped_personal": self.skipped,
+            "avg_lookup_us": round(self.lookup_seconds / self.lookups * 1e6, 1) if self.lookups else None,
+            # Staleness: how old the answers served were, and how old the cached ones are
+            "avg_hit_age_seconds": round(self.hit_age_seconds / hits, 1) if hits else None,
+            "max_hit_age_seconds": round(self.max_hit_age_seconds, 1),
+            "oldest_entry_age_seconds": round(max(ages), 1) if ages else None,
+            "ttl_seconds": ANSWER_CACHE_TTL_SECONDS,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl
+        }
+
+answer_cache_service = AnswerCacheService()
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from services.query_service import query_service
+
+CHAT_CONTEXT_TTL_SECONDS = float(os.getenv("CHAT_CONTEXT_TTL_SECONDS", "120"))
+CHAT_CONTEXT_CACHE_MAX_STUDENTS = int(os.getenv("CHAT_CONTEXT_CACHE_MAX_STUDENTS", "5000"))
+
+
+class PhaseTimer:
+    """Collects wall-clock durations of the phases of one request."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def report(self) -> Dict[str, float]:
+        return {**self.phases, "total": round((time.perf_counter() - self.started_at) * 1000, 1)}
+
+    def log(self, label: str):
+        print(f"TIMING: {label} " + " ".join(f"{name}={ms}ms" for name, ms in self.report().items()))
+
+
+class ChatContextService:
+    """
+    Builds the prompt context for /chat.
+
+    The slowly-changing parts (profile, course progress, roadmap) are cached per student for
+    CHAT_CONTEXT_TTL_SECONDS and dropped by invalidate() whenever tasks, progress, the profile or
+    the roadmap change. The cache is per process, so with several workers a change made through
+    another worker shows up here after the TTL at the latest.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, student_id: str):
+        self._cache.pop(str(student_id), None)
+
+    def invalidate_many(self, student_ids: List[str]):
+        for student_id in student_ids:
+            self.invalidate(student_id)
+
+    async def _load_static(self, student_id: str) -> Optional[Dict[str, Any]]:
+        student = await query_service.get_student_profile(student_id)
+        if not student:
+            return None
+
+        async def roadmap():
+            # Active roadmap for the primary interest
+            if not student.interests:
+                return None
+            return await query_service.get_roadmap_context(student_id, student.interests[0])
+
+        progress_records, roadmap_context = await asyncio.gather(
+            query_service.get_progress_summaries(student_id),
+            roadmap()
+        )
+        courses_context = [
+            {
+                "course_name": p.course_name,
+                "progress": f"{p.tasks_completed}/{p.total_tasks}",
+                "grade": p.grade
+            }
+            for p in progress_records
+        ]
+        return {
+            "student": student,
+            "courses_context": courses_context,
+            "progress_records": progress_records,
+            "roadmap_context": roadmap_context
+        }
+
+    async def get_static(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """Profile, course progress and roadmap for the student (None if the student doesn't exist)."""
+        cached = self._cache.get(student_id)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        context = await self._load_static(student_id)
+        if context is not None:
+            if len(self._cache) >= CHAT_CONTEXT_CACHE_MAX_STUDENTS:
+                # Drop the entry closest to expiry to bound memory
+                self._cache.pop(min(self._cache, key=lambda k: self._cache[k][0]), None)
+            self._cache[student_id] = (now + CHAT_CONTEXT_TTL_SECONDS, context)
+        return context
+
+    @staticmethod
+    async def get_tasks_context(student_id: str) -> List[Dict[str, Any]]:
+        # Recent tasks change with every submission, so they are always read fresh (only recent 5 for token limit)
+        tasks = await query_service.get_recent_tasks(student_id, limit=5)
+        return [
+            {
+                "title": t.title,
+                "status": t.status,
+                "verified": t.verified,
+                "feedback": t.ai_feedback,
+                "submission": t.submission
+            }
+            for t in tasks
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": CHAT_CONTEXT_TTL_SECONDS,
+            "students_cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+chat_context_service = ChatContextService()
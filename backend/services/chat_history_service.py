@@ -0,0 +1,263 @@
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from models import ChatSession, ChatMessage, ChatMessageBucket
+
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "50"))
+CHAT_TITLE_CHARS = 60
+CHAT_PREVIEW_CHARS = 120
+
+class SessionNotFoundError(Exception):
+    pass
+
+class InvalidCursorError(ValueError):
+    pass
+
+def _snippet(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+class ChatHistoryService:
+    """
+    Append-only chat storage in fixed-size buckets.
+
+    A student has any number of sessions (threads). The session document only holds metadata
+    and a message counter. Appending reserves seq numbers with one
+    $inc and $pushes the messages into the bucket(s) they belong to, so writing a message costs the
+    same at message 10 as at message 10,000, and reading context touches at most two buckets.
+    """
+
+    @staticmethod
+    def _bucket_of(seq: int) -> int:
+        return seq // CHAT_BUCKET_SIZE
+
+    @staticmethod
+    async def _migrate_embedded(session_id, student_id: str) -> int:
+        """Moves the messages of a pre-bucket session into buckets. Safe to run concurrently."""
+        sessions = ChatSession.get_motor_collection()
+        legacy = await sessions.find_one({"_id": session_id}, {"messages": 1})
+        messages = (legacy or {}).get("messages") or []
+
+        # $setOnInsert keyed on (session, bucket): a concurrent migration writes the same buckets, not duplicates
+        now = datetime.now()
+        ops = []
+        for start in range(0, len(messages), CHAT_BUCKET_SIZE):
+            chunk = [{**m, "seq": start + i} for i, m in enumerate(messages[start:start + CHAT_BUCKET_SIZE])]
+            ops.append(UpdateOne(
+                {"session_id": str(session_id), "bucket": ChatHistoryService._bucket_of(start)},
+                {"$setOnInsert": {
+                    "student_id": student_id,
+                    "messages": chunk,
+                    "size": len(chunk),
+                    "first_at": chunk[0].get("timestamp") or now,
+                    "last_at": chunk[-1].get("timestamp") or now
+                }},
+                upsert=True
+            ))
+        if ops:
+            try:
+                await ChatMessageBucket.get_motor_collection().bulk_write(ops, ordered=False)
+            except BulkWriteError:
+                pass  # Duplicate keys: another request migrated these buckets first
+
+        await sessions.update_one(
+            {"_id": session_id, "message_count": {"$exists": False}},
+            {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+        )
+        print(f"DEBUG: Moved {len(messages)} embedded chat messages of session {session_id} into buckets")
+        return len(messages)
+
+    @staticmethod
+    async def get_session(student_id: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns a session of the student (without messages): the one with `session_id`, else the
+        most recently used one, which is created if the student has none.
+        """
+        sessions = ChatSession.get_motor_collection()
+        if session_id:
+            try:
+                oid = ObjectId(session_id)
+            except (InvalidId, TypeError):
+                raise SessionNotFoundError(session_id)
+            session = await sessions.find_one({"_id": oid, "student_id": student_id}, {"messages": 0})
+            if session is None:
+                raise SessionNotFoundError(session_id)
+        else:
+            now = datetime.now()
+            for attempt in range(2):
+                try:
+                    session = await sessions.find_one_and_update(
+                        {"student_id": student_id},
+                        {"$setOnInsert": {"student_id": student_id, "is_default": True, "message_count": 0, "created_at": now, "updated_at": now}},
+                        upsert=True,
+                        sort=[("updated_at", -1), ("_id", -1)],
+                        projection={"messages": 0},
+                        return_document=ReturnDocument.AFTER
+                    )
+                    break
+                except DuplicateKeyError:
+                    # A concurrent first request created the default session; the retry finds it
+                    if attempt:
+                        raise
+        if "message_count" not in session:
+            session["message_count"] = await ChatHistoryService._migrate_embedded(session["_id"], student_id)
+        return session
+
+    @staticmethod
+    async def create_session(student_id: str, title: Optional[str] = None, course_id: Optional[str] = None) -> Dict[str, Any]:
+        now = datetime.now()
+        session = {
+            "student_id": student_id,
+            "title": _snippet(title, CHAT_TITLE_CHARS) if title else None,
+            "course_id": course_id,
+            "message_count": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        result = await ChatSession.get_motor_collection().insert_one(session)
+        session["_id"] = result.inserted_id
+        return session
+
+    @staticmethod
+    async def list_sessions(student_id: str, cursor: Optional[str] = None,
+                            limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        The student's sessions, most recently used first, as metadata only (no messages or summary).
+        Keyset-paginated on (updated_at, _id); returns the page and the next page's cursor.
+        """
+        query: Dict[str, Any] = {"student_id": student_id}
+        if cursor:
+            try:
+                stamp, _, last_id = cursor.rpartition("_")
+                last_oid = ObjectId(last_id)
+                last_at = datetime.fromisoformat(stamp) if stamp else None
+            except (InvalidId, TypeError, ValueError):
+                raise InvalidCursorError("Invalid cursor")
+            if last_at is None:
+                # Sessions that predate updated_at sort last
+                query.update({"updated_at": None, "_id": {"$lt": last_oid}})
+            else:
+                query["$or"] = [
+                    {"updated_at": {"$lt": last_at}},
+                    {"updated_at": last_at, "_id": {"$lt": last_oid}},
+                    {"updated_at": None}
+                ]
+        docs = await ChatSession.get_motor_collection().find(
+            query, {"messages": 0, "summary": 0, "summarized_through": 0, "summary_updated_at": 0}
+        ).sort([("updated_at", -1), ("_id", -1)]).limit(limit + 1).to_list(None)
+        next_cursor = None
+        if len(docs) > limit:
+            last = docs[limit - 1]
+            next_cursor = f"{last['updated_at'].isoformat() if last.get('updated_at') else ''}_{last['_id']}"
+        return docs[:limit], next_cursor
+
+    @staticmethod
+    async def append(session: Dict[str, Any], messages: List[ChatMessage]) -> List[int]:
+        """Appends messages in order and returns their seq numbers."""
+        if not messages:
+            return []
+        sessions = ChatSession.get_motor_collection()
+        counter = await sessions.find_one_and_update(
+            {"_id": session["_id"]},
+            {
+                "$inc": {"message_count": len(messages)},
+                "$set": {"updated_at": messages[-1].timestamp, "last_message_preview": _snippet(messages[-1].content, CHAT_PREVIEW_CHARS)}
+            },
+            projection={"message_count": 1, "title": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        first_seq = counter["message_count"] - len(messages)
+        session["message_count"] = counter["message_count"]
+        if not counter.get("title"):
+            # An untitled thread is named after its first question
+            first_user = next((m for m in messages if m.role == "user"), None)
+            if first_user:
+                await sessions.update_one(
+                    {"_id": session["_id"], "title": None},
+                    {"$set": {"title": _snippet(first_user.content, CHAT_TITLE_CHARS)}}
+                )
+
+        by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for offset, message in enumerate(messages):
+            seq = first_seq + offset
+            message.seq = seq
+            by_bucket.setdefault(ChatHistoryService._bucket_of(seq), []).append(message.dict())
+
+        buckets = ChatMessageBucket.get_motor_collection()
+        for bucket, docs in by_bucket.items():
+            update = {
+                # $sort keeps seq order even if concurrent appends land out of order
+                "$push": {"messages": {"$each": docs, "$sort": {"seq": 1}}},
+                "$inc": {"size": len(docs)},
+                "$min": {"first_at": docs[0]["timestamp"]},
+                "$max": {"last_at": docs[-1]["timestamp"]},
+                "$setOnInsert": {"student_id": session["student_id"]}
+            }
+            key = {"session_id": str(session["_id"]), "bucket": bucket}
+            try:
+                await buckets.update_one(key, update, upsert=True)
+            except DuplicateKeyError:
+                # Lost the race to create the bucket; it exists now
+                await buckets.update_one(key, update)
+        return [m.seq for m in messages]
+
+    @staticmethod
+    async def between(session: Dict[str, Any], first_seq: int, last_seq: int) -> List[Dict[str, Any]]:
+        """Messages with first_seq <= seq <= last_seq, oldest first."""
+        if last_seq < first_seq:
+            return []
+        docs = await ChatMessageBucket.get_motor_collection().find(
+            {
+                "session_id": str(session["_id"]),
+                "bucket": {"$gte": ChatHistoryService._bucket_of(first_seq), "$lte": ChatHistoryService._bucket_of(last_seq)}
+            },
+            {"messages": 1}
+        ).sort("bucket", 1).to_list(None)
+        return [m for d in docs for m in d.get("messages", []) if first_seq <= m.get("seq", 0) <= last_seq]
+
+    @staticmethod
+    async def recent(session: Dict[str, Any], limit: int = 10) -> List[Dict[str, Any]]:
+        """The last `limit` messages of the session, oldest first."""
+        total = session.get("message_count", 0)
+        if total == 0 or limit <= 0:
+            return []
+        return await ChatHistoryService.between(session, max(0, total - limit), total - 1)
+
+    @staticmethod
+    async def page(session: Dict[str, Any], before: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        One page of history, oldest first: the `limit` messages before seq `before` (default: the
+        newest ones). Returns the messages and the `before` of the next (older) page, None at the start.
+        """
+        total = session.get("message_count", 0)
+        end = total if before is None else max(0, min(before, total))
+        start = max(0, end - limit)
+        messages = await ChatHistoryService.between(session, start, end - 1)
+        return messages, (start if start > 0 else None)
+
+    @staticmethod
+    async def archive(older_than: datetime, archive_collection: str = "chat_message_archive") -> int:
+        """
+        Moves buckets not written since `older_than` to an archive collection. The two newest
+        buckets of a session are kept, so the chat context of a returning student is intact.
+        """
+        buckets = ChatMessageBucket.get_motor_collection()
+        archive = buckets.database[archive_collection]
+        sessions = ChatSession.get_motor_collection()
+        moved = 0
+        async for bucket in buckets.find({"last_at": {"$lt": older_than}}):
+            session = await sessions.find_one({"_id": ObjectId(bucket["session_id"])}, {"message_count": 1})
+            newest = ChatHistoryService._bucket_of(max(0, (session or {}).get("message_count", 1) - 1))
+            if session and bucket["bucket"] >= newest - 1:
+                continue
+            # Copy first, then delete: an interrupted run leaves a bucket in both places, never in neither
+            await archive.replace_one({"_id": bucket["_id"]}, bucket, upsert=True)
+            await buckets.delete_one({"_id": bucket["_id"]})
+            moved += 1
+        return moved
+
+chat_history_service = ChatHistoryService()
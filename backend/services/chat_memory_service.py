@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+from typing import Dict, Any
+from bson import ObjectId
+from models import ChatSession
+from services.ai_service import ai_service, AI_UNAVAILABLE_MESSAGE
+from services.chat_history_service import chat_history_service
+from services.job_service import job_service
+
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "8"))  # Sent verbatim with every prompt
+CHAT_SUMMARY_TRIGGER = int(os.getenv("CHAT_SUMMARY_TRIGGER", "12"))  # Unsummarized older messages that trigger a summary
+CHAT_SUMMARY_BATCH = 40  # Messages folded into the summary per model call
+
+class ChatMemoryService:
+    """
+    Rolling conversation memory: the prompt gets a stored summary of everything older than the
+    last CHAT_RECENT_MESSAGES messages, plus those messages verbatim, so the prompt size stays
+    constant however long the thread runs. Summaries are updated by a background job.
+    """
+
+    @staticmethod
+    def _unsummarized(session: Dict[str, Any]) -> int:
+        # Messages that have left the recent window but aren't in the summary yet
+        window_start = session.get("message_count", 0) - CHAT_RECENT_MESSAGES
+        return window_start - (session.get("summarized_through", -1) + 1)
+
+    @staticmethod
+    async def maybe_schedule(session: Dict[str, Any]):
+        if ChatMemoryService._unsummarized(session) >= CHAT_SUMMARY_TRIGGER:
+            await job_service.enqueue(
+                "chat_summarize",
+                {"session_id": str(session["_id"])},
+                dedupe_key=f"chat_summary:{session['_id']}"
+            )
+
+    @staticmethod
+    async def summarize(session_id: str) -> int:
+        """Folds every message older than the recent window into the summary. Returns how many were added."""
+        sessions = ChatSession.get_motor_collection()
+        folded = 0
+        while True:
+            session = await sessions.find_one({"_id": ObjectId(session_id)}, {"messages": 0})
+            if not session or ChatMemoryService._unsummarized(session) <= 0:
+                return folded
+
+            first_seq = session.get("summarized_through", -1) + 1
+            last_seq = min(session["message_count"] - CHAT_RECENT_MESSAGES - 1, first_seq + CHAT_SUMMARY_BATCH - 1)
+            messages = await chat_history_service.between(session, first_seq, last_seq)
+            summary = await ai_service.summarize_conversation(session.get("summary"), messages)
+            if not summary or summary == AI_UNAVAILABLE_MESSAGE:
+                # Raising lets the job runner retry with backoff
+                raise RuntimeError("Model unavailable, conversation summary not updated")
+
+            # Only advance from the state we read, in case another worker got here first
+            result = await sessions.update_one(
+                # (None also matches sessions that have never been summarized)
+                {"_id": session["_id"], "summarized_through": session.get("summarized_through")},
+                {"$set": {"summary": summary.strip(), "summarized_through": last_seq, "summary_updated_at": datetime.now()}}
+            )
+            if result.modified_count == 0:
+                return folded
+            folded += last_seq - first_seq + 1
+            print(f"DEBUG: Chat session {session_id} summary now covers messages 0-{last_seq}")
+
+
+@job_service.handler("chat_summarize", concurrency=2)
+async def _chat_summarize_job(payload: Dict[str, Any]):
+    return {"folded": await ChatMemoryService.summarize(payload["session_id"])}
+
+chat_memory_service = ChatMemoryService()
@@ -0,0 +1,204 @@
+import asyncio
+import builtins
+import os
+import pwd
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Any, Optional
+
+CODE_RUNNER_WORKERS = int(os.getenv("CODE_RUNNER_WORKERS", str(os.cpu_count() or 2)))
+CODE_RUNNER_TIMEOUT_SECONDS = float(os.getenv("CODE_RUNNER_TIMEOUT_SECONDS", "3"))
+CODE_RUNNER_CPU_SECONDS = int(os.getenv("CODE_RUNNER_CPU_SECONDS", "2"))
+CODE_RUNNER_MEMORY_MB = int(os.getenv("CODE_RUNNER_MEMORY_MB", "256"))
+# Unprivileged account the submissions run as when the server runs as root
+CODE_RUNNER_USER = os.getenv("CODE_RUNNER_USER", "nobody")
+# "unshare" runs submissions in namespaces (see utils/sandbox_exec.py); "off" leaves all grading to the model
+CODE_RUNNER_SANDBOX = os.getenv("CODE_RUNNER_SANDBOX", "unshare")
+CODE_RUNNER_MAX_OUTPUT_BYTES = 64 * 1024
+CODE_RUNNER_MAX_TESTS = 20
+CODE_PASS_SCORE = 50  # Same threshold the model grader uses for `verified`
+
+_FENCE = re.compile(r"```[a-zA-Z0-9_+-]*\n(.*?)```", re.DOTALL)
+_EXCEPTION_LINE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)(?::|$)")
+_SANDBOX_EXEC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "sandbox_exec.py")
+
+class CodeRunnerService:
+    """
+    Grades Python coding tasks locally by running the submission against the task's hidden
+    stdin/stdout test cases.
+
+    Each test runs in a fresh interpreter inside its own mount, network, PID and IPC namespaces,
+    pivoted into a read-only tree holding only the Python runtime, without any capability, as
+    CODE_RUNNER_USER (or, when the server is not root, as the root of a user namespace), with
+    CPU, memory, process, file-size and wall-clock limits (utils/sandbox_exec.py); at most
+    CODE_RUNNER_WORKERS run at once. The score is the share of passing tests, so the same code always gets the same
+    grade. If the sandbox can't be set up on this host, coding tasks are graded by the model.
+    """
+
+    def __init__(self):
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._available: Optional[bool] = None
+
+    @staticmethod
+    def _sandbox_command(workdir: str) -> List[str]:
+        if os.geteuid() == 0:
+            account = pwd.getpwnam(CODE_RUNNER_USER)
+            uid, gid, namespaces = account.pw_uid, account.pw_gid, []
+        else:
+            # Without root, a user namespace grants the mounts. The code runs as that namespace's root
+            # (the server's uid outside it), so sandbox_exec.py must strip every capability before exec
+            uid, gid, namespaces = -1, -1, ["--user", "--map-root-user"]
+        runtime = os.path.dirname(os.path.dirname(os.path.realpath(sys.executable)))
+        runtime_dirs = sorted({runtime, sys.base_prefix} - {"/", "/usr"})
+        return [
+            "unshare", *namespaces, "--mount", "--net", "--pid", "--ipc", "--uts", "--fork", "--kill-child",
+            sys.executable, "-I", "-S", "-B", _SANDBOX_EXEC, workdir, str(uid), str(gid),
+            str(CODE_RUNNER_CPU_SECONDS), str(CODE_RUNNER_MEMORY_MB), *runtime_dirs
+        ]
+
+    @staticmethod
+    def _prepare_workdir(code: str) -> str:
+        workdir = tempfile.mkdtemp(prefix="grader-")
+        os.chmod(workdir, 0o755)
+        os.makedirs(os.path.join(workdir, "root"))
+        code_dir = os.path.join(workdir, "code")
+        os.makedirs(code_dir, mode=0o755)
+        os.chmod(code_dir, 0o755)
+        with open(os.path.join(code_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write(code)
+        os.chmod(os.path.join(code_dir, "main.py"), 0o644)
+        return workdir
+
+    def available(self) -> bool:
+        """Whether submissions can be run in the sandbox here. Probed once, with a trivial program."""
+        if self._available is None:
+            self._available = False
+            if CODE_RUNNER_SANDBOX == "unshare" and shutil.which("unshare"):
+                workdir = self._prepare_workdir("print(6 * 7)")
+                try:
+                    probe = subprocess.run(self._sandbox_command(workdir), capture_output=True, timeout=10)
+                    self._available = probe.returncode == 0 and probe.stdout.strip() == b"42"
+                    if not self._available:
+                        print(f"Code runner: sandbox unavailable ({probe.stderr.decode('utf-8', 'replace').strip()[-300:]})")
+                except (OSError, KeyError, subprocess.SubprocessError) as e:
+                    print(f"Code runner: sandbox unavailable ({e})")
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+            if not self._available:
+                print("Code runner: coding tasks will be graded by the model")
+        return self._available
+
+    def can_grade(self, task_type: str, test_cases: Optional[List[Dict[str, Any]]]) -> bool:
+        return task_type == "coding" and bool(test_cases) and self.available()
+
+    @staticmethod
+    def clean_test_cases(ai_task: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        """Validates the test cases of a generated task. None unless it's a coding task with usable tests."""
+        if ai_task.get("type") != "coding" or not isinstance(ai_task.get("test_cases"), list):
+            return None
+        cases = [
+            {"input": str(case.get("input", "")), "output": str(case["output"])}
+            for case in ai_task["test_cases"]
+            if isinstance(case, dict) and "output" in case
+        ]
+        return cases[:CODE_RUNNER_MAX_TESTS] or None
+
+    @staticmethod
+    def extract_code(submission: str) -> str:
+        """Students often paste the code inside a markdown fence; run only the fenced part."""
+        blocks = _FENCE.findall(submission or "")
+        return "\n".join(blocks) if blocks else (submission or "")
+
+    @staticmethod
+    def _same_output(actual: str, expected: str) -> bool:
+        normalize = lambda text: [line.rstrip() for line in text.strip().splitlines()]
+        return normalize(actual) == normalize(expected)
+
+    @staticmethod
+    def _error_class(stderr: bytes) -> str:
+        """
+        The built-in exception the program died with, e.g. "ZeroDivisionError". Only the class
+        name is reported: the message and traceback could carry anything the program printed.
+        """
+        lines = stderr[-CODE_RUNNER_MAX_OUTPUT_BYTES:].decode("utf-8", "replace").strip().splitlines()
+        match = _EXCEPTION_LINE.match(lines[-1]) if lines else None
+        name = match.group(1) if match else None
+        builtin = getattr(builtins, name, None) if name else None
+        if isinstance(builtin, type) and issubclass(builtin, BaseException):
+            return name
+        return "an error"
+
+    async def _run_one(self, workdir: str, stdin: str) -> Dict[str, Any]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(CODE_RUNNER_WORKERS)
+        async with self._slots:
+            proc = await asyncio.create_subprocess_exec(
+                *self._sandbox_command(workdir),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env={"PATH": os.environ.get("PATH", "/usr/bin:/bin")},
+                # Own process group, so the whole sandbox can be killed at once
+                start_new_session=True
+            )
+            timed_out = False
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    proc.communicate((stdin or "").encode("utf-8")), timeout=CODE_RUNNER_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                timed_out = True
+            finally:
+                # Kill the whole session, including any background processes the submission started
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            if timed_out:
+                await proc.wait()
+                return {"status": "timeout"}
+
+        if proc.returncode != 0:
+            # SIGXCPU/SIGKILL mean the CPU limit was hit (sandbox_exec reports a signal as 128 + its number)
+            if proc.returncode in (128 + signal.SIGXCPU, 128 + signal.SIGKILL):
+                return {"status": "timeout"}
+            return {"status": "error", "error": self._error_class(stderr)}
+        return {"status": "ok", "stdout": stdout[:CODE_RUNNER_MAX_OUTPUT_BYTES].decode("utf-8", "replace")}
+
+    async def grade(self, submission: str, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Returns a verdict in the same shape as ai_service.verify_submission."""
+        cases = test_cases[:CODE_RUNNER_MAX_TESTS]
+        workdir = self._prepare_workdir(self.extract_code(submission))
+        try:
+            results = await asyncio.gather(*[
+                self._run_one(workdir, str(case.get("input", ""))) for case in cases
+            ])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        passed = 0
+        first_failure = None
+        for number, (case, result) in enumerate(zip(cases, results), start=1):
+            if result["status"] == "ok" and self._same_output(result["stdout"], str(case.get("output", ""))):
+                passed += 1
+            elif first_failure is None:
+                # Hidden tests: say which one failed and how, never the expected output
+                if result["status"] == "timeout":
+                    first_failure = f"Test {number} exceeded the time limit."
+                elif result["status"] == "error":
+                    first_failure = f"Test {number} raised {result['error']}."
+                else:
+                    first_failure = f"Test {number} produced the wrong output."
+
+        score = round(100 * passed / len(cases)) if cases else 0
+        feedback = f"Passed {passed}/{len(cases)} hidden tests."
+        if first_failure:
+            feedback += f" {first_failure}"
+        print(f"DEBUG: Code runner passed {passed}/{len(cases)} tests")
+        return {"verified": score >= CODE_PASS_SCORE, "score": score, "feedback": feedback}
+
+code_runner_service = CodeRunnerService()
@@ -0,0 +1,134 @@
+import os
+from datetime import datetime
+from typing import List, Dict, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models import Task, Progress
+from utils.csv_manager import csv_manager
+from services.chat_context_service import chat_context_service
+
+ENROLL_CHUNK_SIZE = int(os.getenv("ENROLL_CHUNK_SIZE", "500"))  # students per round of bulk writes
+BULK_WRITE_BATCH = 1000
+DUPLICATE_KEY = 11000
+
+class EnrollmentService:
+    """
+    Enrolls students in courses with bulk upserts instead of per-course round trips.
+
+    The missing Progress and Task documents are computed in memory and written with
+    $setOnInsert upserts keyed on unique indexes, so repeated or concurrent enrollments
+    never create duplicates.
+    """
+
+    @staticmethod
+    def resolve_courses(course_ids: List[str]) -> Tuple[List[Dict], List[str]]:
+        courses, unknown = [], []
+        for course_id in dict.fromkeys(str(c) for c in course_ids):
+            course = csv_manager.get_course_by_id(course_id)
+            if course:
+                courses.append(course)
+            else:
+                unknown.append(course_id)
+        return courses, unknown
+
+    @staticmethod
+    async def _bulk_upsert(collection, ops: List[UpdateOne]) -> int:
+        """Runs upserts in batches and returns how many documents were inserted.
+        Duplicate-key errors mean a concurrent writer got there first and are not failures."""
+        inserted = 0
+        for i in range(0, len(ops), BULK_WRITE_BATCH):
+            try:
+                result = await collection.bulk_write(ops[i:i + BULK_WRITE_BATCH], ordered=False)
+                inserted += result.upserted_count
+            except BulkWriteError as e:
+                inserted += e.details.get("nUpserted", 0)
+                other_errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+                if other_errors:
+                    raise
+        return inserted
+
+    @staticmethod
+    def _task_upsert(student_id: str, course: Dict, topic: str, now: datetime) -> UpdateOne:
+        course_id = str(course['id'])
+        task = Task(
+            student_id=student_id,
+            course_id=course_id,
+            topic=topic,
+            title=topic,
+            description=f"Learn and master the concepts of {topic} in {course['name']}.",
+            type="theory",
+            difficulty="medium",
+            created_at=now
+        )
+        return UpdateOne(
+            {"student_id": student_id, "course_id": course_id, "topic": topic},
+            {"$setOnInsert": task.dict(exclude={"id", "revision_id"})},
+            upsert=True
+        )
+
+    @staticmethod
+    def _progress_upsert(student_id: str, course: Dict) -> UpdateOne:
+        course_id = str(course['id'])
+        progress = Progress(
+            student_id=student_id,
+            course_id=course_id,
+            course_name=course['name'],
+            total_tasks=len(course.get('topics', []))  # Use CSV topics
+        )
+        return UpdateOne(
+            {"student_id": student_id, "course_id": course_id},
+            {"$setOnInsert": progress.dict(exclude={"id", "revision_id"})},
+            upsert=True
+        )
+
+    @staticmethod
+    async def _enroll_chunk(student_ids: List[str], courses: List[Dict], stats: Dict):
+        course_ids = [str(c['id']) for c in courses]
+        existing = await Progress.get_motor_collection().find(
+            {"student_id": {"$in": student_ids}, "course_id": {"$in": course_ids}},
+            {"_id": 0, "student_id": 1, "course_id": 1}
+        ).to_list(None)
+        enrolled = {(d["student_id"], d["course_id"]) for d in existing}
+
+        missing = [(s, c) for s in student_ids for c in courses if (s, str(c['id'])) not in enrolled]
+        stats["already_enrolled"] += len(student_ids) * len(courses) - len(missing)
+        if not missing:
+            return
+
+        # Tasks are written before Progress: Progress marks the enrollment as done, so a run
+        # interrupted between the two writes is completed by simply retrying it.
+        now = datetime.now()
+        task_ops = [
+            EnrollmentService._task_upsert(student_id, course, topic, now)
+            for student_id, course in missing
+            for topic in course.get('topics', [])
+        ]
+        progress_ops = [EnrollmentService._progress_upsert(student_id, course) for student_id, course in missing]
+
+        stats["tasks_created"] += await EnrollmentService._bulk_upsert(Task.get_motor_collection(), task_ops)
+        stats["progress_created"] += await EnrollmentService._bulk_upsert(Progress.get_motor_collection(), progress_ops)
+
+    @staticmethod
+    async def enroll(student_ids: List[str], course_ids: List[str]) -> Dict:
+        """Enrolls every student in every course. Returns counts of the documents written."""
+        courses, unknown = EnrollmentService.resolve_courses(course_ids)
+        student_ids = list(dict.fromkeys(student_ids))
+        stats = {
+            "students": len(student_ids),
+            "courses": len(courses),
+            "unknown_courses": unknown,
+            "already_enrolled": 0,
+            "progress_created": 0,
+            "tasks_created": 0
+        }
+        if not courses:
+            return stats
+
+        for i in range(0, len(student_ids), ENROLL_CHUNK_SIZE):
+            await EnrollmentService._enroll_chunk(student_ids[i:i + ENROLL_CHUNK_SIZE], courses, stats)
+        chat_context_service.invalidate_many(student_ids)
+
+        print(f"DEBUG: Enrollment wrote {stats['progress_created']} progress and {stats['tasks_created']} task documents")
+        return stats
+
+enrollment_service = EnrollmentService()
@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+from models import Task, Progress, StudyPlan
+from services.ai_service import ai_service, AI_UNAVAILABLE_MESSAGE
+from services.ml_service import ml_service
+from services.query_service import query_service
+from services.progress_service import progress_service
+from services.job_service import job_service
+from services.code_runner_service import code_runner_service
+
+class ModelUnavailableError(Exception):
+    """The model answered with its offline placeholder; nothing was stored, so the job is retried."""
+    pass
+
+class FollowUpService:
+    """
+    Slow follow-up work triggered by grading (remedial tasks, study-plan refresh).
+    It runs as background jobs so the grading response returns as soon as the grade is known.
+    """
+
+    @staticmethod
+    async def schedule_after_verification(student_id: str):
+        # Dedupe per student: a burst of verifications results in one job of each kind
+        await job_service.enqueue("remedial_tasks", {"student_id": student_id}, dedupe_key=f"remedial:{student_id}")
+        await job_service.enqueue("study_plan_refresh", {"student_id": student_id}, dedupe_key=f"study_plan:{student_id}")
+
+    @staticmethod
+    async def check_and_generate_remedial_tasks(student_id: str) -> Optional[str]:
+        """
+        Checks if the student has completed all tasks.
+        If so, generates remedial tasks for weak areas. Returns the new task id, if any.
+        Raises ModelUnavailableError, creating nothing, if the model is down.
+        """
+        # 1. Check for any pending tasks
+        pending_count = await Task.find(
+            Task.student_id == student_id,
+            Task.status == "pending"
+        ).count()
+
+        if pending_count > 0:
+            return None # Still has work to do
+
+        print(f"DEBUG: Student {student_id} has 0 pending tasks. Checking for weak areas...")
+
+        # 2. Identify weak areas (Low accuracy or failed tasks)
+        weak_areas = await ml_service.identify_weak_areas(student_id)
+
+        if not weak_areas:
+            print("DEBUG: No weak areas found. Good job!")
+            return None
+
+        # 3. Generate 1 remedial task for the top weak area
+        # We explicitly take only the first one to avoid overwhelming them
+        target = weak_areas[0]
+        course_name = target['course_name']
+
+        # Needs course_id for the task
+        # Find progress record to get course_id
+        progress = await Progress.find_one(
+            Progress.student_id == student_id,
+            Progress.course_name == course_name
+        )
+
+        if not progress:
+            return None
+
+        student = await query_service.get_student_profile(student_id)
+        if not student:
+            return None
+
+        # Generate Task
+        print(f"DEBUG: Generating remedial task for {course_name} (Accuracy: {target['accuracy']})")
+
+        ai_task = await ai_service.generate_personalized_task(
+            student.dict(),
+            course_name,
+            f"Remedial Practice for {course_name}", # Using course name as topic proxy for now, ideally we need granular topics
+            include_tests=True
+        )
+        if ai_task.get("fallback"):
+            # A placeholder must never become the student's remedial task
+            raise ModelUnavailableError(f"Remedial task for {course_name} could not be generated")
+
+        new_task = Task(
+            student_id=student_id,
+            course_id=progress.course_id,
+            title=ai_task.get("title", f"Review {course_name}"),
+            description=ai_task.get("description", "A personalized practice task to improve your score."),
+            type=ai_task.get("type", "theory"),
+            difficulty="medium",
+            status="pending",
+            created_at=datetime.now(),
+            test_cases=code_runner_service.clean_test_cases(ai_task)
+        )
+        await new_task.insert()
+
+        # Update Progress Stats (reopens the course if it was completed, now they have more work!)
+        await progress_service.add_tasks(student_id, progress.course_id)
+
+        print(f"DEBUG: Remedial task created: {new_task.title}. Progress updated.")
+        return str(new_task.id)
+
+    @staticmethod
+    async def refresh_study_plan(student_id: str) -> Optional[str]:
+        """
+        Generates a fresh study plan and stores it as the student's current plan.
+        Raises ModelUnavailableError, leaving the stored plan as it was, if the model is down.
+        """
+        student = await query_service.get_student_profile(student_id)
+        if not student:
+            return None
+
+        # Get enrolled courses
+        progress_records = await query_service.get_progress_summaries(student_id)
+        courses = [{"id": pr.course_id, "name": pr.course_name} for pr in progress_records]
+
+        # Get completed topics from completed tasks
+        completed_topics = await query_service.get_completed_topics(student_id)
+
+        plan = await ai_service.generate_study_plan(student.dict(), courses, completed_topics)
+        if plan == AI_UNAVAILABLE_MESSAGE:
+            # Keep the last good plan
+            raise ModelUnavailableError("Study plan could not be generated")
+        await StudyPlan.get_motor_collection().update_one(
+            {"student_id": student_id},
+            {"$set": {"plan": plan, "generated_at": datetime.now()}},
+            upsert=True
+        )
+        return plan
+
+
+# --- Job handlers ---
+# LLM-bound kinds get a per-worker concurrency limit so follow-ups can't starve interactive requests
+
+@job_service.handler("remedial_tasks", concurrency=2)
+async def _remedial_tasks_job(payload: Dict[str, Any]):
+    return await FollowUpService.check_and_generate_remedial_tasks(payload["student_id"])
+
+@job_service.handler("study_plan_refresh", concurrency=2)
+async def _study_plan_refresh_job(payload: Dict[str, Any]):
+    plan = await FollowUpService.refresh_study_plan(payload["student_id"])
+    return {"generated": plan is not None}
+
+followup_service = FollowUpService()
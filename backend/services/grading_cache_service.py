@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Any
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import GradingCacheEntry
+from services.ai_service import ai_service
+
+GRADING_CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "true").lower() == "true"
+GRADING_CACHE_TTL_SECONDS = int(os.getenv("GRADING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+_CACHE_VERSION = "v1"  # Bump when the grading prompt changes, so old verdicts are not reused
+
+_INNER_WHITESPACE = re.compile(r"(?<=\S)[ \t]+")
+
+class GradingCacheService:
+    """
+    Content-addressed cache in front of ai_service.verify_submission.
+
+    The key is a hash of the normalized task title, task description and submission, so a
+    resubmission that only differs in whitespace reuses the stored verdict, and a task whose
+    description was regenerated (ai-generate) can never match an entry made for the old text.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # Keeps indentation (it matters in code answers); drops trailing spaces, blank edges and repeated inner spaces
+        lines = [_INNER_WHITESPACE.sub(" ", line.rstrip()) for line in (text or "").replace("\r\n", "\n").split("\n")]
+        return "\n".join(lines).strip("\n")
+
+    @staticmethod
+    def make_key(task_title: str, task_description: str, submission: str) -> str:
+        parts = [_CACHE_VERSION] + [GradingCacheService.normalize(p) for p in (task_title, task_description, submission)]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    async def verify(self, task_title: str, task_description: str, submission: str) -> Dict[str, Any]:
+        """Same contract as ai_service.verify_submission, answered from the cache when possible."""
+        if not GRADING_CACHE_ENABLED:
+            return await ai_service.verify_submission(task_title, task_description, submission)
+
+        key = self.make_key(task_title, task_description, submission)
+        now = datetime.now()
+        entry = await GradingCacheEntry.get_motor_collection().find_one_and_update(
+            {"key": key, "expires_at": {"$gt": now}},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": now}},
+            projection={"result": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if entry is not None:
+            self.hits += 1
+            print(f"DEBUG: Grading cache hit {key[:12]}")
+            return dict(entry["result"])
+
+        self.misses += 1
+        result = await ai_service.verify_submission(task_title, task_description, submission)
+        if result.get("fallback"):
+            # The model call failed and a placeholder verdict was returned; don't pin it
+            return result
+
+        try:
+            await GradingCacheEntry.get_motor_collection().update_one(
+                {"key": key},
+                {"$set": {
+                    "result": result,
+                    "hits": 0,
+                    "created_at": now,
+                    "last_hit_at": None,
+                    "expires_at": now + timedelta(seconds=GRADING_CACHE_TTL_SECONDS)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # A concurrent request stored the same key first
+        return result
+
+    async def stats(self) -> Dict[str, Any]:
+        totals = await GradingCacheEntry.get_motor_collection().aggregate([
+            {"$group": {"_id": None, "entries": {"$sum": 1}, "hits": {"$sum": "$hits"}}}
+        ]).to_list(None)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": GRADING_CACHE_ENABLED,
+            "ttl_seconds": GRADING_CACHE_TTL_SECONDS,
+            "entries": totals[0]["entries"] if totals else 0,
+            "stored_hits": totals[0]["hits"] if totals else 0,
+            # Counters of this process since startup
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+grading_cache_service = GradingCacheService()
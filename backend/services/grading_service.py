@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Callable, Awaitable
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import Task, GradingResult
+from services.grading_cache_service import grading_cache_service
+from services.code_runner_service import code_runner_service
+from services.progress_service import progress_service
+
+# A "pending" claim older than this is assumed to belong to a crashed worker and can be taken over
+GRADING_CLAIM_TIMEOUT_SECONDS = int(os.getenv("GRADING_CLAIM_TIMEOUT_SECONDS", "180"))
+# How long a duplicate request waits for an in-flight original before giving up
+GRADING_DUPLICATE_WAIT_SECONDS = float(os.getenv("GRADING_DUPLICATE_WAIT_SECONDS", "20"))
+
+class TaskNotFoundError(LookupError):
+    pass
+
+class IdempotencyConflictError(Exception):
+    """The idempotency key was already used for a different request."""
+    pass
+
+class GradingInProgressError(Exception):
+    """A request with the same idempotency key is still being graded."""
+    pass
+
+class GraderUnavailableError(Exception):
+    """The model could not grade the submission; nothing was stored."""
+    pass
+
+class GradingService:
+    """
+    Single grading pipeline behind /tasks/submit and /tasks/{task_id}/verify.
+
+    When the client sends an idempotency key, the first request claims the key and stores its
+    response; retries with the same key get the stored response back without calling the model
+    or touching Progress again.
+    """
+
+    @staticmethod
+    def _request_hash(mode: str, task_id: str, submission_content: str) -> str:
+        raw = f"{mode}\x00{task_id}\x00{submission_content}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    async def _claim(key: str, request_hash: str, task_id: str) -> Optional[Dict]:
+        """Claims the key for this request. Returns the stored response if the request was already handled."""
+        deadline = asyncio.get_running_loop().time() + GRADING_DUPLICATE_WAIT_SECONDS
+        while True:
+            try:
+                await GradingResult(idempotency_key=key, request_hash=request_hash, task_id=task_id).insert()
+                return None
+            except DuplicateKeyError:
+                pass
+
+            existing = await GradingResult.find_one(GradingResult.idempotency_key == key)
+            if existing is None:
+                continue  # Released between our insert and read; try to claim again
+            if existing.request_hash != request_hash:
+                raise IdempotencyConflictError(key)
+            if existing.status == "done":
+                print(f"DEBUG: Idempotent replay for key {key}")
+                return existing.response
+
+            # Take over claims abandoned by a crashed request
+            stale_before = datetime.now() - timedelta(seconds=GRADING_CLAIM_TIMEOUT_SECONDS)
+            if existing.created_at < stale_before:
+                await GradingResult.find_one(
+                    GradingResult.id == existing.id,
+                    GradingResult.status == "pending"
+                ).delete()
+                continue
+
+            if asyncio.get_running_loop().time() >= deadline:
+                raise GradingInProgressError(key)
+            await asyncio.sleep(0.5)
+
+    @staticmethod
+    async def _release(key: str):
+        await GradingResult.find_one(GradingResult.idempotency_key == key, GradingResult.status == "pending").delete()
+
+    @staticmethod
+    async def _store(key: str, response: Dict):
+        await GradingResult.find_one(GradingResult.idempotency_key == key).update(
+            {"$set": {"status": "done", "response": response}}
+        )
+
+    @staticmethod
+    async def _load_task(task_id: str) -> Task:
+        try:
+            task = await Task.get(PydanticObjectId(task_id))
+        except Exception:
+            task = None
+        if not task:
+            raise TaskNotFoundError(task_id)
+        return task
+
+    @staticmethod
+    async def _grade(task: Task, submission_content: str) -> Dict:
+        """
+        Calls the grader, applies the result to the task and progress. Raises if the model call fails.
+        Sets `newly_completed` when this request is the one that moved the task to completed.
+        """
+        if code_runner_service.can_grade(task.type, task.test_cases):
+            verification = await code_runner_service.grade(submission_content, task.test_cases)
+        else:
+            verification = await grading_cache_service.verify(task.title, task.description, submission_content)
+        if verification.get("fallback"):
+            # A placeholder verdict must never complete a task or credit progress
+            raise GraderUnavailableError(f"Grader unavailable for task {task.id}")
+
+        score = verification.get("score", 0)
+        verified = verification.get("verified", score >= 50)
+        feedback = verification.get("feedback", "No feedback provided.")
+
+        # Ensure a non-zero score if verified but AI returned 0 or missing score
+        if verified and score == 0:
+            score = 70
+
+        print(f"DEBUG: Task {task.id} score: {score}, verified: {verified}")
+
+        update = {"submission": submission_content, "score": score, "verified": verified, "ai_feedback": feedback}
+        if verified:
+            update["status"] = "completed"
+            update["completed_at"] = datetime.now()
+        else:
+            print(f"DEBUG: Task NOT verified. Feedback: {feedback}")
+
+        # The document as it was just before this write tells us exactly what changed, even when
+        # several gradings of the same task race: each sees the state the previous one left behind.
+        # A pipeline so a failed regrade of a completed task cannot un-verify it in the same write.
+        set_stage = {field: {"$literal": value} for field, value in update.items()}
+        if not verified:
+            set_stage["verified"] = {"$eq": ["$status", "completed"]}
+        before = await Task.get_motor_collection().find_one_and_update(
+            {"_id": task.id},
+            [{"$set": set_stage}],
+            projection={"status": 1, "score": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            raise TaskNotFoundError(str(task.id))
+        for field, value in update.items():
+            setattr(task, field, value)
+
+        was_completed = before.get("status") == "completed"
+        if was_completed:
+            # A regraded completed task stays completed and verified; only the score changes, it is
+            # not counted again
+            task.status = "completed"
+            task.verified = True
+
+        if task.course_id and (verified or was_completed):
+            try:
+                progress = await progress_service.record_completion(
+                    task.student_id, task.course_id, score,
+                    previous_score=before.get("score", 0) if was_completed else None
+                )
+                if progress:
+                    print(f"DEBUG: New progress: {progress['tasks_completed']}/{progress['total_tasks']} (Avg Score: {progress['grade']}%)")
+            except Exception as e:
+                # We don't return error here because task was already verified and saved
+                print(f"Error updating progress: {e}")
+
+        return {
+            "verified": verified,
+            "score": score,
+            "feedback": feedback,
+            "newly_completed": verified and not was_completed
+        }
+
+    @staticmethod
+    async def _run(key: Optional[str], mode: str, task_id: str, submission_content: str,
+                   handler: Callable[[], Awaitable[Dict]]) -> Dict:
+        if not key:
+            return await handler()
+
+        cached = await GradingService._claim(key, GradingService._request_hash(mode, task_id, submission_content), task_id)
+        if cached is not None:
+            return cached
+        try:
+            response = await handler()
+        except BaseException:
+            await GradingService._release(key)
+            raise
+        if response.get("status") == "error":
+            # Transient failures are not remembered, so the client can retry with the same key
+            await GradingService._release(key)
+        else:
+            await GradingService._store(key, response)
+        return response
+
+    @staticmethod
+    async def submit(task_id: str, submission_content: str, idempotency_key: Optional[str] = None) -> Dict:
+        """Grades a submission; completed tasks may be resubmitted to improve the score."""
+        async def handler():
+            task = await GradingService._load_task(task_id)
+            try:
+                result = await GradingService._grade(task, submission_content)
+            except Exception as e:
+                print(f"Error during AI verification: {e}")
+                await task.set({Task.submission: submission_content})
+                return {
+                    "status": "error",
+                    "message": "AI Verification service is temporarily unavailable. Your work is saved, please try verifying again later.",
+                    "verified": False,
+                    "feedback": "Connectivity error."
+                }
+            result.pop("newly_completed")
+            return {
+                "status": "success" if result["verified"] else "failed",
+                **result,
+                "message": "Task submitted and graded by AI"
+            }
+
+        return await GradingService._run(idempotency_key, "submit", task_id, submission_content, handler)
+
+    @staticmethod
+    async def verify(task_id: str, submission_content: str, idempotency_key: Optional[str] = None,
+                     on_verified: Optional[Callable[[Task], Awaitable]] = None, task: Optional[Task] = None) -> Dict:
+        """
+        Grades a pending task. `on_verified` runs once when the task is newly completed.
+        Batch callers pass the already loaded `task` to skip the lookup.
+        """
+        preloaded = task
+
+        async def handler():
+            task = preloaded or await GradingService._load_task(task_id)
+            if task.status == "completed":
+                return {"status": "success", "verified": True, "message": "Task already completed"}
+
+            try:
+                result = await GradingService._grade(task, submission_content)
+            except Exception as e:
+                print(f"Error during AI verification: {e}")
+                return {
+                    "status": "error",
+                    "verified": False,
+                    "message": "Something went wrong with AI verification. Please try again later."
+                }
+
+            newly_completed = result.pop("newly_completed")
+            if not result["verified"]:
+                return {"status": "success", **result, "message": "Submission needs improvement."}
+
+            if on_verified and newly_completed:
+                try:
+                    await on_verified(task)
+                except Exception as e:
+                    print(f"Error in post-verification step: {e}")
+            return {"status": "success", **result, "message": f"Great job! Your submission scored {task.score}%."}
+
+        return await GradingService._run(idempotency_key, "verify", task_id, submission_content, handler)
+
+grading_service = GradingService()
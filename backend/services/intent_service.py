@@ -0,0 +1,145 @@
+import re
+from typing import Dict, Any, List, Optional
+from utils.csv_manager import csv_manager
+
+# "give me a task", "generate 2 practice questions", "quiz me", "test me", "i want to practice", ...
+_REQUEST_RE = re.compile(
+    r"\b(?:"
+    r"(?:give|get|send|assign|generate|create|make|set|prepare|write)\s+(?:me\s+)?(?:a|an|one|some|another|\d+|few|a\s+few)?\s*"
+    r"(?:new\s+|quick\s+|short\s+|small\s+|practice\s+|coding\s+|programming\s+|challenging\s+|hard\s+|easy\s+)*"
+    r"(?:task|question|exercise|problem|quiz|challenge|assignment)s?"
+    r"|(?:test|quiz|drill|challenge|examine)\s+me"
+    r"|(?:i\s+(?:want|need|would\s+like)|let\s+me|help\s+me)\s+(?:to\s+)?(?:practi[cs]e|get\s+some\s+practi[cs]e)"
+    r"|(?:i\s+(?:want|need|would\s+like))\s+(?:a|an|some|another)\s+(?:practice\s+)?(?:task|question|exercise|problem|quiz)s?"
+    r")"
+)
+# Questions *about* tasks rather than requests for one
+_NOT_A_REQUEST_RE = re.compile(
+    r"\b(?:how\s+(?:do|can|should)\s+i\s+(?:submit|solve|finish|complete|start)"
+    r"|what\s+(?:is|was|are)\s+(?:my|the|this|that)\s+(?:task|question|exercise|problem)"
+    r"|(?:explain|check|grade|review|verify)\s+(?:my|the|this|that)\s+(?:task|question|exercise|problem|submission|answer)"
+    r"|(?:don'?t|do\s+not|no)\s+(?:give|generate|create|make|test|quiz)"
+    r"|(?:finished|completed|submitted|did)\s+(?:my|the|this|that)\s+(?:task|question|exercise|problem|quiz))"
+)
+# The topic follows "on/about/..." after the request. Each of these starts a candidate phrase and
+# the last acceptable one wins: "a quiz for my friends about python" -> "python"
+_TOPIC_RE = re.compile(r"\b(?:on|about|for|regarding|covering|related\s+to)\s+(?:the\s+topic\s+(?:of\s+)?)?")
+# "in"/"from" only introduce a topic right after the request ("a task in Python on loops"); later
+# they qualify it ("transformers in deep learning")
+_LEADING_TOPIC_RE = re.compile(r"^\s*(?:in|from)\s+")
+_TRAILING_RE = re.compile(
+    r"(?:\s+(?:please|pls|thanks|thank\s+you|now|today|for\s+me|if\s+possible|so\s+i\s+can\s+.*|to\s+(?:practice|revise|prepare).*))+$"
+)
+
+def _norm(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+# Words that make a phrase about the student rather than a subject ("my grades", "my friends")
+_NOT_A_TOPIC_WORDS = {
+    "i", "me", "my", "mine", "we", "us", "our", "you", "your", "he", "him", "his", "she", "her",
+    "they", "them", "their", "friend", "friends", "classmate", "classmates"
+}
+_NOT_A_TOPIC = {
+    "it", "this", "that", "them", "something", "anything", "me", "today", "tomorrow", "tonight",
+    "later", "practice", "revision", "homework", "fun"
+}
+
+
+class IntentService:
+    """
+    Rule-based detection of "give me a task on X" requests in chat.
+
+    A recognised request is answered by generating the task directly, without the extra model
+    call that would otherwise only produce a create_task tool command. Anything ambiguous
+    (no topic, or a question about a task) returns None and goes to the model as before.
+    Accuracy is measured with scripts/eval_intent.py on data/intent_fixtures.jsonl.
+    """
+
+    @staticmethod
+    def _clean_topic(raw: str) -> Optional[str]:
+        # Only the first clause: "binary trees, I have an exam tomorrow" -> "binary trees"
+        topic = re.split(r"[.?!,;:\n]|\s+(?:because|since|as\s+i|so\s+that|and\s+then)\s+", raw, maxsplit=1)[0]
+        topic = _TRAILING_RE.sub("", topic.strip())
+        topic = re.sub(r"^(?:the|a|an|some)\s+", "", topic).strip(" '\"`")
+        if not topic or len(topic) > 60 or _norm(topic) in _NOT_A_TOPIC:
+            return None
+        # Possessives and pronouns mean the parse is unsure; the model handles those
+        words = re.findall(r"[a-z0-9']+", topic)
+        if any(w in _NOT_A_TOPIC_WORDS or w.endswith("'s") for w in words):
+            return None
+        return topic
+
+    @staticmethod
+    def _find_topic(rest: str) -> Optional[str]:
+        """The last candidate phrase after the request that reads as a topic, else None."""
+        starts = [(m.start(), m.end()) for m in _TOPIC_RE.finditer(rest)]
+        leading = _LEADING_TOPIC_RE.match(rest)
+        if leading and (not starts or starts[0][0] >= leading.end()):
+            starts.insert(0, (leading.start(), leading.end()))
+        for i in range(len(starts) - 1, -1, -1):
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(rest)
+            topic = IntentService._clean_topic(rest[starts[i][1]:end])
+            if topic:
+                return topic
+        return None
+
+    @staticmethod
+    def _match_course(text: str, topic: str, courses: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        """Finds the course the request is about: a course named in the message, else one whose topics match."""
+        normalized_text = _norm(text)
+        normalized_topic = _norm(topic)
+        # Every run of consecutive words, squashed like the catalog topics ("dynamic programming" -> "dynamicprogramming")
+        words = re.findall(r"[a-z0-9]+", topic.lower())
+        phrases = {"".join(words[i:j]) for i in range(len(words)) for j in range(i + 1, len(words) + 1)}
+        # Longest name first, so "Deep Learning" wins over "Learning"-like partial names
+        for course in sorted(courses, key=lambda c: -len(c["name"])):
+            name = _norm(course["name"])
+            if name and (name in normalized_text or name == normalized_topic):
+                return course
+        for course in courses:
+            catalog = csv_manager.get_course_by_id(course.get("id")) or {}
+            for course_topic in catalog.get("topics", []):
+                t = _norm(course_topic)
+                if t and (t in phrases or (len(normalized_topic) > 3 and normalized_topic in t)):
+                    return course
+        return None
+
+    @staticmethod
+    def detect_task_request(message: str, courses: Optional[List[Dict[str, str]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"topic", "course_id", "course_name"} when the message asks for a practice task on a
+        specific topic, else None. `courses` are the student's enrolled courses ({"id", "name"});
+        course_id/course_name are None when none of them match.
+        """
+        text = " ".join(message.lower().split())
+        if _NOT_A_REQUEST_RE.search(text):
+            return None
+        request = _REQUEST_RE.search(text)
+        if not request:
+            return None
+
+        rest = text[request.end():]
+        if _TOPIC_RE.search(rest) or _LEADING_TOPIC_RE.match(rest):
+            topic = IntentService._find_topic(rest)
+        elif "practi" in request.group(0):
+            # "I want to practice recursion": the topic follows the verb directly
+            topic = IntentService._clean_topic(rest)
+        else:
+            topic = None
+        if not topic:
+            return None
+
+        # Keep the student's own casing of the topic
+        start = message.lower().find(topic)
+        if start >= 0:
+            topic = message[start:start + len(topic)]
+
+        course = IntentService._match_course(text, topic, courses or [])
+        return {
+            "topic": topic,
+            "course_id": course["id"] if course else None,
+            "course_name": course["name"] if course else None
+        }
+
+intent_service = IntentService()
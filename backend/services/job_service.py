@@ -0,0 +1,221 @@
+import asyncio
+import os
+import socket
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import Job
+from services.usage_service import current_student
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+# A running job whose lease is older than this is assumed lost (worker crashed) and is requeued
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+class JobService:
+    """
+    Durable, Mongo-backed background job runner.
+
+    Jobs survive restarts (they live in the `jobs` collection), are retried with exponential
+    backoff, can be deduplicated with a key (e.g. one pending remedial job per student), and
+    run on a fixed number of worker coroutines with optional per-kind concurrency limits.
+    A dedupe key only covers queued jobs: it is released when a worker claims the job, so work
+    enqueued while the job runs (e.g. after newer data arrived) is queued again, not dropped.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, JobHandler] = {}
+        self.kind_limits: Dict[str, int] = {}
+        self.kind_running: Dict[str, int] = {}
+        self.completion_hooks: List[Callable[[Dict[str, Any], str, Any], Awaitable]] = []
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def handler(self, kind: str, concurrency: Optional[int] = None):
+        """Registers the coroutine that executes jobs of `kind`."""
+        def decorator(func: JobHandler):
+            self.handlers[kind] = func
+            if concurrency:
+                self.kind_limits[kind] = concurrency
+            return func
+        return decorator
+
+    def on_complete(self, hook: Callable[[Dict[str, Any], str, Any], Awaitable]):
+        """Registers a hook called as hook(job, status, result) when a job finishes or fails for good."""
+        self.completion_hooks.append(hook)
+        return hook
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None,
+                      max_attempts: int = JOB_MAX_ATTEMPTS, delay_seconds: float = 0) -> Optional[Job]:
+        """
+        Queues a job. With a `dedupe_key`, a job that is already queued (not yet running) for the
+        same key absorbs this one and None is returned.
+        """
+        job = Job(
+            kind=kind,
+            payload=payload,
+            dedupe_key=dedupe_key,
+            active_key=dedupe_key,
+            max_attempts=max_attempts,
+            run_at=datetime.now() + timedelta(seconds=delay_seconds)
+        )
+        try:
+            await job.insert()
+        except DuplicateKeyError:
+            print(f"DEBUG: Job {kind} already pending for {dedupe_key}, skipping duplicate")
+            return None
+
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        # Per-kind limits are checked before claiming, so they are soft: concurrent claims can overshoot by a job or two
+        saturated = [k for k, limit in self.kind_limits.items() if self.kind_running.get(k, 0) >= limit]
+        query: Dict[str, Any] = {"status": "queued", "run_at": {"$lte": datetime.now()}}
+        if saturated:
+            query["kind"] = {"$nin": saturated}
+
+        return await Job.get_motor_collection().find_one_and_update(
+            query,
+            {
+                "$set": {"status": "running", "locked_at": datetime.now(), "locked_by": self.worker_id},
+                # A running job may already be working on stale input, so the key is free for a follow-up
+                "$unset": {"active_key": ""},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Any = None, error: Optional[str] = None):
+        update: Dict[str, Any] = {"status": status, "finished_at": datetime.now(), "locked_at": None}
+        if error:
+            update["last_error"] = error
+        await Job.get_motor_collection().update_one(
+            {"_id": job["_id"]},
+            {"$set": update}
+        )
+        for hook in self.completion_hooks:
+            try:
+                await hook(job, status, result)
+            except Exception as e:
+                print(f"Job completion hook error: {e}")
+
+    async def _retry(self, job: Dict[str, Any], error: str):
+        backoff = JOB_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1))
+        update = {
+            "status": "queued",
+            "run_at": datetime.now() + timedelta(seconds=backoff),
+            "locked_at": None,
+            "last_error": error
+        }
+        collection = Job.get_motor_collection()
+        if job.get("dedupe_key"):
+            try:
+                # Queued again, so it takes its dedupe key back
+                await collection.update_one({"_id": job["_id"]}, {"$set": {**update, "active_key": job["dedupe_key"]}})
+                return
+            except DuplicateKeyError:
+                # A follow-up was enqueued while this attempt ran; both stay queued
+                pass
+        await collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+    async def _execute(self, job: Dict[str, Any]):
+        kind = job["kind"]
+        handler = self.handlers.get(kind)
+        if handler is None:
+            await self._finish(job, "failed", error=f"No handler registered for job kind '{kind}'")
+            return
+
+        self.kind_running[kind] = self.kind_running.get(kind, 0) + 1
+        # Model calls of a student's job count towards that student's token usage
+        usage_token = current_student.set(job.get("payload", {}).get("student_id"))
+        try:
+            result = await handler(job.get("payload", {}))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Job {kind} ({job['_id']}) attempt {job['attempts']} failed: {error}")
+            traceback.print_exc()
+            if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+                await self._finish(job, "failed", error=error)
+            else:
+                await self._retry(job, error)
+        else:
+            await self._finish(job, "done", result=result)
+        finally:
+            current_student.reset(usage_token)
+            self.kind_running[kind] -= 1
+
+    async def requeue_stale(self) -> int:
+        """Puts back jobs whose worker died mid-run."""
+        result = await Job.get_motor_collection().update_many(
+            {"status": "running", "locked_at": {"$lt": datetime.now() - timedelta(seconds=JOB_LEASE_SECONDS)}},
+            {"$set": {"status": "queued", "run_at": datetime.now(), "locked_at": None}}
+        )
+        if result.modified_count:
+            print(f"DEBUG: Requeued {result.modified_count} stale jobs")
+        return result.modified_count
+
+    async def _worker_loop(self, index: int):
+        polls = 0
+        while True:
+            try:
+                # One worker periodically reclaims abandoned jobs
+                if index == 0 and polls % 30 == 0:
+                    await self.requeue_stale()
+                polls += 1
+
+                job = await self._claim()
+                if job is not None:
+                    await self._execute(job)
+                    continue
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker {index} error: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+    def start(self, workers: int = JOB_WORKERS):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker_loop(i)) for i in range(workers)]
+        print(f"Job runner started with {workers} workers ({self.worker_id}). Handlers: {sorted(self.handlers)}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            # Jobs interrupted here stay 'running' and are requeued once their lease expires
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = await Job.get_motor_collection().aggregate([
+            {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        by_kind: Dict[str, Dict[str, int]] = {}
+        for row in counts:
+            by_kind.setdefault(row["_id"]["kind"], {})[row["_id"]["status"]] = row["count"]
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._workers),
+            "running_in_process": {k: v for k, v in self.kind_running.items() if v},
+            "jobs": by_kind
+        }
+
+job_service = JobService()
@@ -0,0 +1,217 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+class SchemaError(ValueError):
+    pass
+
+class JsonOutputService:
+    """
+    Turns a model's JSON answer into a value that matches the caller's schema.
+
+    Parsing is tolerant: markdown fences and text around the JSON are skipped, trailing commas,
+    Python literals and curly quotes are fixed, and an answer cut off mid-object is closed by
+    scanning it once and completing the open strings and brackets. The value is then checked
+    against a small JSON-schema subset (type, properties, required, items, enum, minimum,
+    maximum, default), converting what can be converted ("85" -> 85, "yes" -> true, a lone
+    string -> [string]) and dropping invalid array items. Only when that fails does the caller's
+    fallback apply. Outcomes are counted per method for /health/json-output.
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _candidate(text: str) -> str:
+        fenced = _FENCE_RE.search(text)
+        if fenced and fenced.group(1).strip():
+            text = fenced.group(1)
+        starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+        return text[min(starts):] if starts else text.strip()
+
+    @staticmethod
+    def _close(text: str) -> str:
+        """Completes JSON that was cut off: closes an open string and every open bracket, in order."""
+        # One entry per open bracket: [closer, "key" or "value" (objects: which half of the member), member start]
+        stack: List[list] = []
+        in_string = escaped = False
+        for i, ch in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "{[":
+                stack.append(["}" if ch == "{" else "]", "key", i + 1])
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+            elif stack and stack[-1][0] == "}":
+                if ch == ",":
+                    stack[-1][1:] = ["key", i]
+                elif ch == ":":
+                    stack[-1][1] = "value"
+
+        if stack and stack[-1][0] == "}":
+            _, part, start = stack[-1]
+            if part == "key" or text.rstrip().endswith(":"):
+                # Cut off inside or right after a member name: drop the member
+                text, in_string = text[:start], False
+        if in_string:
+            text += '\\"' if escaped else '"'
+        text = text.rstrip()
+        if text.endswith(","):
+            text = text[:-1].rstrip()
+        return text + "".join(closer for closer, _, _ in reversed(stack))
+
+    @staticmethod
+    def parse(text: str) -> Tuple[Any, bool]:
+        """Returns (value, repaired). Raises ValueError if nothing parseable is found."""
+        candidate = JsonOutputService._candidate(text or "")
+        decoder = json.JSONDecoder()
+        try:
+            # raw_decode ignores whatever follows the JSON value
+            return decoder.raw_decode(candidate)[0], False
+        except ValueError:
+            pass
+        repaired = candidate.translate(_SMART_QUOTES)
+        repaired = re.sub(r"\b(True|False|None)\b", lambda m: _PY_LITERALS[m.group(1)], repaired)
+        repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired)
+        for attempt in (repaired, JsonOutputService._close(repaired)):
+            try:
+                return decoder.raw_decode(_TRAILING_COMMA_RE.sub(r"\1", attempt))[0], True
+            except ValueError:
+                continue
+        raise ValueError("No JSON value in model output")
+
+    @staticmethod
+    def _coerce(value: Any, schema: Dict[str, Any], path: str) -> Any:
+        kind = schema.get("type")
+        if kind == "object":
+            if not isinstance(value, dict):
+                raise SchemaError(f"{path}: expected an object")
+            out = dict(value)
+            properties = schema.get("properties", {})
+            for key, sub in properties.items():
+                if key in out and out[key] is not None:
+                    try:
+                        out[key] = JsonOutputService._coerce(out[key], sub, f"{path}.{key}")
+                        continue
+                    except SchemaError:
+                        if key in schema.get("required", []) and "default" not in sub:
+                            raise
+                        out.pop(key)
+                if key not in out or out[key] is None:
+                    if "default" in sub:
+                        out[key] = sub["default"]
+                    elif key in schema.get("required", []):
+                        raise SchemaError(f"{path}.{key}: missing")
+                    else:
+                        out.pop(key, None)
+            extra = schema.get("additionalProperties")
+            if isinstance(extra, dict):
+                for key in [k for k in out if k not in properties]:
+                    try:
+                        out[key] = JsonOutputService._coerce(out[key], extra, f"{path}.{key}")
+                    except SchemaError:
+                        out.pop(key)
+            return out
+        if kind == "array":
+            if value is None:
+                raise SchemaError(f"{path}: expected an array")
+            items = value if isinstance(value, list) else [value]
+            item_schema = schema.get("items")
+            if item_schema:
+                kept = []
+                for i, item in enumerate(items):
+                    try:
+                        kept.append(JsonOutputService._coerce(item, item_schema, f"{path}[{i}]"))
+                    except SchemaError:
+                        continue  # One malformed item doesn't spoil the rest
+                items = kept
+            if len(items) < schema.get("minItems", 0):
+                raise SchemaError(f"{path}: expected at least {schema['minItems']} items")
+            return items
+        if kind == "string":
+            if isinstance(value, dict):
+                value = value.get("title") or value.get("name")
+            elif isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+                value = ", ".join(str(v) for v in value)
+            if isinstance(value, bool) or value is None or isinstance(value, (dict, list)):
+                raise SchemaError(f"{path}: expected a string")
+            value = str(value)
+            if "enum" in schema:
+                match = next((e for e in schema["enum"] if e.lower() == value.strip().lower()), None)
+                if match is None:
+                    if "default" in schema:
+                        return schema["default"]
+                    raise SchemaError(f"{path}: {value!r} is not one of {schema['enum']}")
+                value = match
+            return value
+        if kind in ("integer", "number"):
+            if isinstance(value, bool):
+                raise SchemaError(f"{path}: expected a number")
+            if isinstance(value, str):
+                found = _NUMBER_RE.search(value)  # "85", "85%", "85/100"
+                if not found:
+                    raise SchemaError(f"{path}: expected a number")
+                value = float(found.group(0))
+            if not isinstance(value, (int, float)):
+                raise SchemaError(f"{path}: expected a number")
+            if "minimum" in schema:
+                value = max(schema["minimum"], value)
+            if "maximum" in schema:
+                value = min(schema["maximum"], value)
+            return int(round(value)) if kind == "integer" else value
+        if kind == "boolean":
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+                return value.strip().lower() in ("true", "yes")
+            if isinstance(value, (int, float)) and value in (0, 1):
+                return bool(value)
+            raise SchemaError(f"{path}: expected a boolean")
+        return value
+
+    def record(self, method: str, outcome: str):
+        counts = self.counts.setdefault(method, {"calls": 0, "ok": 0, "repaired": 0, "failed": 0, "unavailable": 0})
+        counts["calls"] += 1
+        counts[outcome] += 1
+
+    def load(self, method: str, text: str, schema: Dict[str, Any], fallback: Any) -> Any:
+        """The schema-valid value in `text`, else `fallback`."""
+        try:
+            value, repaired = self.parse(text)
+            coerced = self._coerce(value, schema, "$")
+        except (ValueError, SchemaError) as e:
+            print(f"JSON Parsing Error ({method}): {e}")
+            self.record(method, "failed")
+            return fallback
+        if isinstance(coerced, dict) and coerced.get("fallback"):
+            # The model backend was down and _call_ollama answered with its offline placeholder
+            self.record(method, "unavailable")
+        else:
+            self.record(method, "repaired" if repaired or coerced != value else "ok")
+        return coerced
+
+    def stats(self, json_mode: Optional[bool] = None) -> Dict[str, Any]:
+        methods = {}
+        for method, counts in self.counts.items():
+            answered = counts["calls"] - counts["unavailable"]
+            methods[method] = {
+                **counts,
+                "failure_rate": round(counts["failed"] / answered, 3) if answered else None
+            }
+        return {"json_mode": json_mode, "methods": methods}
+
+json_output_service = JsonOutputService()
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+from beanie import Document, PydanticObjectId
+from bson.errors import InvalidId
+
+# Page size when a cursor is given without a limit; without either the whole list is returned
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "200"))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "100"))
+
+class InvalidListingParams(ValueError):
+    pass
+
+class ListingService:
+    """
+    Keyset-paginated and streamed listings of a student's documents.
+
+    Pages are ordered by _id; the cursor is the _id of the last document of the previous page,
+    so each page is an index range scan no matter how deep into the history it is. Pagination is
+    opt-in: a request without `limit` or `cursor` gets every document, as clients always have.
+    """
+
+    @staticmethod
+    def parse_fields(model: Type[Document], fields: Optional[str]) -> Optional[Dict[str, int]]:
+        """Turns "title,status" into a projection. No fields means all fields clients may see."""
+        hidden = {name for name, field in model.model_fields.items() if field.exclude}
+        if not fields:
+            return {name: 0 for name in hidden} or None
+        allowed = set(model.model_fields) - {"id", "revision_id"} - hidden
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in allowed]
+        if unknown:
+            raise InvalidListingParams(f"Unknown fields: {', '.join(unknown)}")
+        return {f: 1 for f in requested}  # _id is always included
+
+    @staticmethod
+    def build_query(filters: Dict[str, Any], cursor: Optional[str] = None) -> Dict[str, Any]:
+        query = {k: v for k, v in filters.items() if v is not None}
+        if cursor:
+            try:
+                query["_id"] = {"$gt": PydanticObjectId(cursor)}
+            except (InvalidId, TypeError, ValueError):
+                raise InvalidListingParams("Invalid cursor")
+        return query
+
+    @staticmethod
+    def clamp_limit(limit: Optional[int], cursor: Optional[str] = None) -> Optional[int]:
+        """The page size, or None for an unpaginated request (neither limit nor cursor)."""
+        if limit is None:
+            return LIST_DEFAULT_LIMIT if cursor else None
+        return max(1, min(limit, LIST_MAX_LIMIT))
+
+    @staticmethod
+    def to_json(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Same shape the Beanie models serialize to: string _id, ISO datetimes."""
+        out = {}
+        for key, value in doc.items():
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif key == "_id":
+                value = str(value)
+            out[key] = value
+        return out
+
+    @staticmethod
+    async def fetch_page(model: Type[Document], query: Dict[str, Any], projection: Optional[Dict[str, int]],
+                         limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page and the cursor of the next one (None on the last page). No limit: everything."""
+        cursor = model.get_motor_collection().find(query, projection).sort("_id", 1)
+        if limit is None:
+            return [ListingService.to_json(d) for d in await cursor.to_list(None)], None
+        # One extra document tells us whether another page exists without a count()
+        docs = await cursor.limit(limit + 1).to_list(None)
+        next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+        return [ListingService.to_json(d) for d in docs[:limit]], next_cursor
+
+    @staticmethod
+    async def stream_ndjson(model: Type[Document], query: Dict[str, Any], projection: Optional[Dict[str, int]],
+                            limit: Optional[int] = None) -> AsyncIterator[str]:
+        """Yields one JSON line per document as the cursor delivers its batches."""
+        cursor = model.get_motor_collection().find(query, projection).sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        try:
+            async for doc in cursor:
+                yield json.dumps(ListingService.to_json(doc), default=str) + "\n"
+        finally:
+            # The client may disconnect mid-stream; free the server-side cursor
+            await cursor.close()
+
+listing_service = ListingService()
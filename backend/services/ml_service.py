@@ -1,6 +1,7 @@
 from typing import List, Dict, Optional
 from beanie import PydanticObjectId
-from models import Student, Progress, Task, FYPProject, Course
+from models import Student, Progress, FYPProject, Course, ProgressSummaryView
+from services.query_service import query_service
 import numpy as np
 
 class MLService:
@@ -8,10 +9,7 @@ class MLService:
     @staticmethod
     async def calculate_skill_matrix(student_id: str) -> Dict:
         """Calculate student's skill levels across courses based on Progress"""
-        completed_progress = await Progress.find(
-            Progress.student_id == student_id,
-            Progress.status == "completed"
-        ).to_list()
+        completed_progress = await query_service.get_progress_summaries(student_id, status="completed")
         
         skill_matrix = {}
         for p in completed_progress:
@@ -31,17 +29,11 @@ class MLService:
     @staticmethod
     async def identify_weak_areas(student_id: str) -> List[Dict]:
         """Identify topics where student is struggling (low accuracy/failures)"""
-        # In MongoDB version, we look at failed tasks
-        failed_tasks = await Task.find(
-            Task.student_id == student_id,
-            Task.status == "failed"
-        ).to_list()
-        
-        # Or look at Progress with low accuracy
+        # Progress with low accuracy; only the fields reported below are read
         low_progress = await Progress.find(
             Progress.student_id == student_id,
             Progress.accuracy < 0.6
-        ).to_list()
+        ).project(ProgressSummaryView).to_list()
 
         weak_areas = []
         for p in low_progress:
@@ -55,7 +47,7 @@ class MLService:
     @staticmethod
     async def recommend_fyp_projects(student_id: str) -> List[Dict]:
         """Recommend FYP projects using weighted scoring algorithm"""
-        student = await Student.get(PydanticObjectId(student_id))
+        student = await query_service.get_student_profile(student_id)
         if not student:
             return []
             
@@ -0,0 +1,68 @@
+from typing import Optional, Dict
+from pymongo import ReturnDocument
+from models import Progress
+from services.chat_context_service import chat_context_service
+
+class ProgressService:
+    """
+    Keeps Progress aggregates up to date with single atomic updates.
+
+    Progress stores running sums (score_sum, tasks_completed, total_tasks); grade, accuracy and
+    status are derived from them inside the same update, so grading cost does not depend on how
+    many tasks a course has and concurrent events never overwrite each other.
+    """
+
+    @staticmethod
+    def derived_fields() -> Dict:
+        # Second pipeline stage: recompute the derived fields from the updated sums
+        return {"$set": {
+            "accuracy": {"$cond": [
+                {"$gt": ["$total_tasks", 0]},
+                {"$divide": ["$tasks_completed", "$total_tasks"]},
+                0
+            ]},
+            "grade": {"$cond": [
+                {"$gt": ["$tasks_completed", 0]},
+                {"$divide": ["$score_sum", "$tasks_completed"]},
+                None
+            ]},
+            "status": {"$cond": [
+                {"$and": [{"$gt": ["$total_tasks", 0]}, {"$gte": ["$tasks_completed", "$total_tasks"]}]},
+                "completed",
+                "ongoing"
+            ]}
+        }}
+
+    @staticmethod
+    async def _apply(student_id: str, course_id: str, increments: Dict[str, float]) -> Optional[Dict]:
+        inc_stage = {"$set": {
+            field: {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}
+            for field, amount in increments.items()
+        }}
+        progress = await Progress.get_motor_collection().find_one_and_update(
+            {"student_id": student_id, "course_id": course_id},
+            [inc_stage, ProgressService.derived_fields()],
+            return_document=ReturnDocument.AFTER
+        )
+        chat_context_service.invalidate(student_id)
+        return progress
+
+    @staticmethod
+    async def record_completion(student_id: str, course_id: str, score: int, previous_score: Optional[int] = None) -> Optional[Dict]:
+        """
+        Records a verified task. If the task had already been completed (`previous_score` given),
+        only the score difference is applied so the task is not counted twice.
+        Returns the updated progress document, or None if the student isn't enrolled.
+        """
+        if previous_score is None:
+            increments = {"tasks_completed": 1, "score_sum": score}
+        else:
+            increments = {"tasks_completed": 0, "score_sum": score - previous_score}
+        return await ProgressService._apply(student_id, course_id, increments)
+
+    @staticmethod
+    async def add_tasks(student_id: str, course_id: str, count: int = 1) -> Optional[Dict]:
+        """Grows the course's task total (remedial or chat-generated tasks). Reopens completed courses."""
+        return await ProgressService._apply(student_id, course_id, {"total_tasks": count})
+
+progress_service = ProgressService()
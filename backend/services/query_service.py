@@ -0,0 +1,88 @@
+import os
+from typing import List, Optional, Dict
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from models import (
+    Student, Task, Progress, StudentRoadmap,
+    StudentProfileView, TaskContextView, TaskTitleView, ProgressSummaryView, RoadmapContextView
+)
+
+# Characters of a task's submission and feedback sent with chat context; the rest is never read
+CHAT_TASK_TEXT_CHARS = int(os.getenv("CHAT_TASK_TEXT_CHARS", "400"))
+
+
+def _truncated(field: str, length: int) -> Dict:
+    # $substrCP counts code points, so a cut never splits a multi-byte character; a missing value stays null
+    return {"$cond": [
+        {"$ifNull": [f"${field}", False]},
+        {"$substrCP": [f"${field}", 0, length]},
+        None
+    ]}
+
+
+class QueryService:
+    """Read-side queries that fetch only the fields each call site needs."""
+
+    @staticmethod
+    async def get_student_profile(student_id: str) -> Optional[StudentProfileView]:
+        """Student fields used in prompts and scoring (never includes the password)."""
+        try:
+            oid = PydanticObjectId(student_id)
+        except (InvalidId, TypeError, ValueError):
+            return None
+        return await Student.find_one(Student.id == oid).project(StudentProfileView)
+
+    @staticmethod
+    async def get_recent_tasks(student_id: str, limit: int = 5) -> List[TaskContextView]:
+        """Most recent tasks for chat context, oldest first. Submission and feedback are cut to CHAT_TASK_TEXT_CHARS by the server."""
+        # Served by the (student_id, _id) index
+        docs = await Task.get_motor_collection().aggregate([
+            {"$match": {"student_id": student_id}},
+            {"$sort": {"_id": -1}},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                "title": 1,
+                "status": 1,
+                "verified": 1,
+                "ai_feedback": _truncated("ai_feedback", CHAT_TASK_TEXT_CHARS),
+                "submission": _truncated("submission", CHAT_TASK_TEXT_CHARS)
+            }}
+        ]).to_list(None)
+        return [TaskContextView(**d) for d in reversed(docs)]
+
+    @staticmethod
+    async def get_completed_topics(student_id: str) -> List[str]:
+        tasks = await Task.find(
+            Task.student_id == student_id,
+            Task.status == "completed"
+        ).project(TaskTitleView).to_list()
+        return [t.title for t in tasks]
+
+    @staticmethod
+    async def get_progress_summaries(student_id: str, status: Optional[str] = None) -> List[ProgressSummaryView]:
+        query = Progress.find(Progress.student_id == student_id)
+        if status:
+            query = query.find(Progress.status == status)
+        return await query.project(ProgressSummaryView).to_list()
+
+    @staticmethod
+    async def get_roadmap_context(student_id: str, interest: str) -> Optional[Dict]:
+        """Summary of the student's current roadmap phase for chat prompts."""
+        roadmap = await StudentRoadmap.find_one(
+            StudentRoadmap.student_id == student_id,
+            StudentRoadmap.interest == interest
+        ).project(RoadmapContextView)
+        if not roadmap or not roadmap.phases:
+            return None
+
+        current_phase = roadmap.phases[min(roadmap.current_phase_index, len(roadmap.phases) - 1)]
+        return {
+            "interest": roadmap.interest,
+            "current_phase": current_phase.title,
+            "project_goal": current_phase.project,
+            "pending_topics": [t.title for t in current_phase.topics if t.status != "completed"],
+            "completed_phases": roadmap.current_phase_index
+        }
+
+query_service = QueryService()
@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from models import Task
+from services.usage_service import usage_service
+
+# Requests per minute per student (also the burst size), by endpoint class
+RATE_LIMITS = {
+    "chat": int(os.getenv("RATE_LIMIT_CHAT_PER_MINUTE", "12")),
+    "generate": int(os.getenv("RATE_LIMIT_GENERATE_PER_MINUTE", "6")),
+    "grade": int(os.getenv("RATE_LIMIT_GRADE_PER_MINUTE", "20")),
+    "fyp": int(os.getenv("RATE_LIMIT_FYP_PER_MINUTE", "10")),
+    # Study plan, progress summary and roadmap: usually served stored, generated on a miss or refresh
+    "plan": int(os.getenv("RATE_LIMIT_PLAN_PER_MINUTE", "10")),
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+
+# (method, path pattern, endpoint class, where the student id comes from)
+#   body: "student_id" in the JSON body     path: the student_id path parameter
+#   task / body_task: owner of the task in the task_id path parameter / JSON body
+#   None: not tied to one student; limited per client IP
+# The batch endpoints are limited per item, by the owner of each task (services/task_batch_service.py).
+_ROUTES: List[Tuple[str, re.Pattern, str, Optional[str]]] = [
+    ("POST", re.compile(r"^/chat$"), "chat", "body"),
+    ("POST", re.compile(r"^/chat/generate-task$"), "generate", "body"),
+    ("POST", re.compile(r"^/tasks/(?P<task_id>[^/]+)/ai-generate$"), "generate", "task"),
+    ("POST", re.compile(r"^/tasks/(?P<task_id>[^/]+)/verify$"), "grade", "task"),
+    ("POST", re.compile(r"^/tasks/submit$"), "grade", "body_task"),
+    ("GET", re.compile(r"^/fyp/details/[^/]+$"), "fyp", None),
+    ("GET", re.compile(r"^/fyp/suggestions/(?P<student_id>[^/]+)$"), "fyp", "path"),
+    ("GET", re.compile(r"^/students/(?P<student_id>[^/]+)/study-plan$"), "plan", "path"),
+    ("GET", re.compile(r"^/students/(?P<student_id>[^/]+)/progress-summary$"), "plan", "path"),
+    ("GET", re.compile(r"^/students/(?P<student_id>[^/]+)/roadmap$"), "plan", "path"),
+]
+
+class RateLimitService:
+    """
+    Token-bucket rate limits per student and endpoint class, plus the daily LLM token budget.
+
+    Only the model-backed endpoints are limited. Buckets live in process memory, so with several
+    worker processes a student gets up to the limit on each; the token budget is shared through
+    the token_usage collection.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+        self.rejected: Dict[str, int] = {}
+
+    @staticmethod
+    def _match(request: Request):
+        for method, pattern, limit_class, source in _ROUTES:
+            if request.method == method:
+                match = pattern.match(request.url.path)
+                if match:
+                    return limit_class, source, match
+        return None
+
+    @staticmethod
+    async def _task_owner(task_id: Any) -> Optional[str]:
+        try:
+            task = await Task.get_motor_collection().find_one({"_id": ObjectId(str(task_id))}, {"student_id": 1})
+        except (InvalidId, TypeError):
+            return None
+        return task.get("student_id") if task else None
+
+    @staticmethod
+    async def _student_of(request: Request, source: Optional[str], match) -> Optional[str]:
+        if source == "path":
+            return match.group("student_id")
+        if source == "task":
+            return await RateLimitService._task_owner(match.group("task_id"))
+        if source in ("body", "body_task"):
+            try:
+                body = json.loads(await request.body() or b"{}")
+            except ValueError:
+                return None  # The endpoint itself rejects the malformed body
+            if not isinstance(body, dict):
+                return None
+            if source == "body":
+                return str(body["student_id"]) if body.get("student_id") else None
+            return await RateLimitService._task_owner(body.get("task_id"))
+        return None
+
+    def _take(self, key: str, per_minute: int) -> float:
+        """Takes one token from the bucket. Returns 0 if allowed, else the seconds until a token is available."""
+        now = time.monotonic()
+        rate = per_minute / 60.0
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= RATE_LIMIT_MAX_KEYS:
+                # Buckets idle for a minute have refilled completely; dropping them changes nothing
+                self._buckets = {k: b for k, b in self._buckets.items() if now - b[1] < 60}
+            bucket = self._buckets[key] = [float(per_minute), now]
+        tokens = min(float(per_minute), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    async def check_student(self, limit_class: str, key: str, student_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Counts one request of `limit_class`. Returns the error body if it is over a limit, else None."""
+        per_minute = RATE_LIMITS.get(limit_class, 0)
+        if per_minute > 0:
+            wait = self._take(f"{limit_class}:{key}", per_minute)
+            if wait:
+                self.rejected[limit_class] = self.rejected.get(limit_class, 0) + 1
+                retry_after = max(1, math.ceil(wait))
+                return {
+                    "status": "error",
+                    "message": f"Too many {limit_class} requests. Please wait {retry_after} seconds and try again.",
+                    "limit": limit_class,
+                    "retry_after": retry_after
+                }
+
+        if student_id and await usage_service.budget_exhausted(student_id):
+            self.rejected["budget"] = self.rejected.get("budget", 0) + 1
+            return {
+                "status": "error",
+                "message": "You have used today's AI allowance. It resets at midnight.",
+                "limit": "budget",
+                "retry_after": usage_service.seconds_until_tomorrow()
+            }
+        return None
+
+    async def check(self, request: Request) -> Tuple[Optional[JSONResponse], Optional[str]]:
+        """
+        For a rate-limited endpoint: (429 response or None, student the request is for).
+        Other endpoints return (None, None).
+        """
+        route = self._match(request)
+        if route is None:
+            return None, None
+        limit_class, source, match = route
+        student_id = await self._student_of(request, source, match)
+        # Never a header: the client could pick a fresh bucket with every request
+        client = request.client.host if request.client else "unknown"
+        error = await self.check_student(limit_class, student_id or f"client:{client}", student_id)
+        if error is None:
+            return None, student_id
+        return JSONResponse(status_code=429, content=error, headers={"Retry-After": str(error["retry_after"])}), student_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limits_per_minute": RATE_LIMITS, "tracked_buckets": len(self._buckets), "rejected": self.rejected}
+
+rate_limit_service = RateLimitService()
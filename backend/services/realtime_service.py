@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from fastapi import WebSocket
+from models import Notification
+from services.job_service import job_service
+
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+# A connection that sent nothing (not even a pong) for this long is considered dead
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "75"))
+# Outgoing messages buffered per connection before a slow client starts losing notifications
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_RELAY_INTERVAL_SECONDS = float(os.getenv("WS_RELAY_INTERVAL_SECONDS", "1"))
+# Each relay pass re-reads this much before the previous one: events are stamped by the publishing
+# process's clock and become visible to readers in insertion order, not timestamp order
+WS_RELAY_LOOKBACK_SECONDS = float(os.getenv("WS_RELAY_LOOKBACK_SECONDS", "10"))
+
+class Connection:
+    """One open WebSocket. Everything sent to it goes through a bounded queue drained by one sender task."""
+
+    def __init__(self, websocket: WebSocket, student_id: str, on_broken: Optional[Callable[["Connection"], Awaitable]] = None):
+        self.websocket = websocket
+        self.student_id = student_id
+        self.on_broken = on_broken
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.sender: Optional[asyncio.Task] = None
+
+    async def _send_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"DEBUG: WebSocket send to student {self.student_id} failed: {e}")
+            # Nothing can be sent any more: unregister instead of queueing into a dead connection
+            self.sender = None
+            if self.on_broken:
+                await self.on_broken(self)
+
+    def start(self):
+        self.sender = asyncio.create_task(self._send_loop())
+
+    async def send(self, event: Dict[str, Any]):
+        """Queues a message, waiting while the queue is full (slows down a chat stream to the client's pace)."""
+        await self.queue.put(json.dumps(event, default=str))
+
+    def push(self, event: Dict[str, Any]):
+        """Queues a notification without waiting. When the client can't keep up, the oldest queued message is dropped."""
+        message = json.dumps(event, default=str)
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+    async def close(self, code: int = 1000):
+        if self.sender:
+            self.sender.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
+
+
+class RealtimeService:
+    """
+    WebSocket connections per student, and delivery of server-side events to them.
+
+    publish() delivers an event to the connections held by this process right away and records it
+    in the `notifications` collection; every process relays events published elsewhere to its own
+    connections once per WS_RELAY_INTERVAL_SECONDS, so a job finishing on another worker still
+    reaches the student. Relaying reads by `created_at` with a WS_RELAY_LOOKBACK_SECONDS overlap and
+    skips the ids it already relayed, so late inserts and clock skew between hosts lose nothing.
+    An idle connection costs one sleeping sender task; heartbeats for all connections are sent
+    from a single loop.
+    """
+
+    def __init__(self):
+        self.connections: Dict[str, Set[Connection]] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.published = 0
+        self.relayed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._relay_since: Optional[datetime] = None
+        self._relayed_ids: Dict[Any, datetime] = {}  # Relayed within the lookback window, by created_at
+
+    async def connect(self, websocket: WebSocket, student_id: str) -> Connection:
+        await websocket.accept()
+        connection = Connection(websocket, student_id, on_broken=self.disconnect)
+        connection.start()
+        self.connections.setdefault(student_id, set()).add(connection)
+        return connection
+
+    async def disconnect(self, connection: Connection):
+        conns = self.connections.get(connection.student_id)
+        if conns is not None:
+            conns.discard(connection)
+            if not conns:
+                del self.connections[connection.student_id]
+        await connection.close()
+
+    def _deliver(self, student_id: str, event: Dict[str, Any]) -> int:
+        conns = self.connections.get(student_id, ())
+        for connection in conns:
+            connection.push(event)
+        return len(conns)
+
+    async def publish(self, student_id: str, event: Dict[str, Any]):
+        """Sends an event to every open connection of the student, on any process."""
+        self.published += 1
+        self._deliver(student_id, event)
+        try:
+            await Notification.get_motor_collection().insert_one({
+                "student_id": student_id, "event": event, "origin": self.worker_id, "created_at": datetime.now()
+            })
+        except Exception as e:
+            print(f"Realtime: could not record notification for relay: {e}")
+
+    async def _relay_once(self):
+        now = datetime.now()
+        since, self._relay_since = self._relay_since, now
+        # First pass: anything older was published before this process was listening
+        if since is None:
+            return
+        docs = []
+        if self.connections:
+            docs = await Notification.get_motor_collection().find({
+                "created_at": {"$gte": since - timedelta(seconds=WS_RELAY_LOOKBACK_SECONDS)},
+                "origin": {"$ne": self.worker_id},
+                "student_id": {"$in": list(self.connections)}
+            }).sort("created_at", 1).to_list(None)
+        for doc in docs:
+            if doc["_id"] in self._relayed_ids:
+                continue
+            self._relayed_ids[doc["_id"]] = doc["created_at"]
+            self.relayed += self._deliver(doc["student_id"], doc["event"])
+        # Ids older than the next pass's window can't be read again
+        horizon = now - timedelta(seconds=WS_RELAY_LOOKBACK_SECONDS)
+        self._relayed_ids = {i: at for i, at in self._relayed_ids.items() if at >= horizon}
+
+    async def _relay_loop(self):
+        while True:
+            try:
+                await self._relay_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Realtime relay error: {e}")
+            await asyncio.sleep(WS_RELAY_INTERVAL_SECONDS)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            now = time.monotonic()
+            for conns in list(self.connections.values()):
+                for connection in list(conns):
+                    if now - connection.last_seen > WS_IDLE_TIMEOUT_SECONDS:
+                        print(f"DEBUG: Closing unresponsive WebSocket of student {connection.student_id}")
+                        await self.disconnect(connection)
+                    else:
+                        connection.push({"type": "ping", "ts": time.time()})
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._relay_loop()), asyncio.create_task(self._heartbeat_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for conns in list(self.connections.values()):
+            for connection in list(conns):
+                await self.disconnect(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        conns = [c for cs in self.connections.values() for c in cs]
+        return {
+            "worker_id": self.worker_id,
+            "students": len(self.connections),
+            "connections": len(conns),
+            "published": self.published,
+            "relayed": self.relayed,
+            "dropped": sum(c.dropped for c in conns),
+            "queued": sum(c.queue.qsize() for c in conns)
+        }
+
+
+realtime_service = RealtimeService()
+
+
+@job_service.on_complete
+async def _notify_job_finished(job: Dict[str, Any], status: str, result: Any):
+    # Student-scoped background work (remedial tasks, study plan refresh, ...) is announced to the student
+    student_id = (job.get("payload") or {}).get("student_id")
+    if student_id:
+        await realtime_service.publish(student_id, {
+            "type": "job.finished",
+            "kind": job["kind"],
+            "status": status,
+            "result": result
+        })
@@ -0,0 +1,217 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from utils.csv_manager import csv_manager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RETRIEVAL_INDEX_PATH = os.getenv("RETRIEVAL_INDEX_PATH", os.path.join(BASE_DIR, "data", "retrieval_index.json"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+INDEX_VERSION = 1
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "what", "with", "you"
+}
+
+class RetrievalService:
+    """
+    BM25 index over the local knowledge base: study resources and FYP ideas from dataset.json,
+    courses and their topics from courses.csv, and projects from fyp_data.csv.
+
+    Prompts get the top-k snippets for the question instead of the whole knowledge base. The
+    index is built once and persisted to RETRIEVAL_INDEX_PATH; it is rebuilt when a source file
+    changes. Searching is plain CPU work on a small in-memory inverted index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Any]] = None
+        self.queries = 0
+        self.hits = 0
+        self.snippets_returned = 0
+        self.total_latency_ms = 0.0
+        self.build_ms: Optional[float] = None
+        self.loaded_from_disk = False
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+    @staticmethod
+    def _sources() -> List[str]:
+        return [
+            os.path.join(BASE_DIR, "dataset.json"),
+            os.path.join(csv_manager.data_dir, "courses.csv"),
+            os.path.join(csv_manager.data_dir, "fyp_data.csv")
+        ]
+
+    @staticmethod
+    def _fingerprint() -> Dict[str, Any]:
+        stamp = {"version": INDEX_VERSION}
+        for path in RetrievalService._sources():
+            if os.path.exists(path):
+                st = os.stat(path)
+                stamp[os.path.basename(path)] = [st.st_size, int(st.st_mtime)]
+        return stamp
+
+    @staticmethod
+    def _documents() -> List[Dict[str, str]]:
+        docs = []
+        dataset_path = os.path.join(BASE_DIR, "dataset.json")
+        dataset = {}
+        if os.path.exists(dataset_path):
+            with open(dataset_path, "r", encoding="utf-8") as f:
+                dataset = json.load(f)
+
+        for subject, resources in dataset.get("study_resources", {}).items():
+            docs.append({
+                "source": "study_resources",
+                "title": subject,
+                "text": f"Recommended resources for {subject}: {', '.join(resources)}"
+            })
+        for idea in dataset.get("fyp_ideas", []):
+            docs.append({
+                "source": "fyp_ideas",
+                "title": idea.get("title", ""),
+                "text": f"{idea.get('title', '')} ({idea.get('category', '')}, {idea.get('difficulty', '')}): {idea.get('description', '')}"
+            })
+
+        for course in csv_manager.get_courses():
+            docs.append({
+                "source": "courses",
+                "title": f"{course.get('code', '')} {course.get('name', '')}".strip(),
+                "text": f"{course.get('code', '')} {course.get('name', '')} (semester {course.get('semester', '')}) covers: {', '.join(course.get('topics', []))}"
+            })
+        for project in csv_manager.get_fyp_projects():
+            docs.append({
+                "source": "fyp_projects",
+                "title": project.get("title", ""),
+                "text": f"{project.get('title', '')} ({project.get('category', '')}, {project.get('complexity', '')}): "
+                        f"{project.get('description', '')} Skills: {', '.join(project.get('required_skills', []))}"
+            })
+        return docs
+
+    @staticmethod
+    def _build(fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+        docs = RetrievalService._documents()
+        postings: Dict[str, List[List[int]]] = {}
+        doc_lengths = []
+        for doc_id, doc in enumerate(docs):
+            # Titles are counted twice so a direct match on the name outranks a passing mention
+            terms = Counter(RetrievalService.tokenize(f"{doc['title']} {doc['title']} {doc['text']}"))
+            doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append([doc_id, tf])
+        return {
+            "fingerprint": fingerprint,
+            "docs": docs,
+            "doc_lengths": doc_lengths,
+            "avg_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+            "postings": postings
+        }
+
+    def _load_or_build(self) -> Dict[str, Any]:
+        fingerprint = self._fingerprint()
+        if os.path.exists(RETRIEVAL_INDEX_PATH):
+            try:
+                with open(RETRIEVAL_INDEX_PATH, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("fingerprint") == fingerprint:
+                    self.loaded_from_disk = True
+                    print(f"Retrieval: Loaded index of {len(index['docs'])} documents from {RETRIEVAL_INDEX_PATH}")
+                    return index
+            except (OSError, ValueError) as e:
+                print(f"Retrieval: Could not read index ({e}), rebuilding")
+
+        start = time.perf_counter()
+        index = self._build(fingerprint)
+        self.build_ms = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            # Write-then-rename so a concurrent reader never sees a half-written file
+            tmp_path = f"{RETRIEVAL_INDEX_PATH}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, RETRIEVAL_INDEX_PATH)
+        except OSError as e:
+            print(f"Retrieval: Could not persist index ({e}); using it in memory only")
+        print(f"Retrieval: Built index of {len(index['docs'])} documents in {self.build_ms} ms")
+        return index
+
+    def index(self) -> Dict[str, Any]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._load_or_build()
+        return self._index
+
+    def rebuild(self) -> int:
+        """Rebuilds the index from the source files. Returns the number of documents."""
+        with self._lock:
+            if os.path.exists(RETRIEVAL_INDEX_PATH):
+                os.remove(RETRIEVAL_INDEX_PATH)
+            self._index = self._load_or_build()
+        return len(self._index["docs"])
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency of a term in the knowledge base (high for unseen terms)."""
+        index = self.index()
+        df = len(index["postings"].get(term, ()))
+        return math.log(1 + (len(index["docs"]) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, sources: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Top-k documents for the query by BM25 score, optionally restricted to some sources."""
+        index = self.index()
+        start = time.perf_counter()
+        docs = index["docs"]
+        lengths = index["doc_lengths"]
+        avg_length = index["avg_length"] or 1.0
+
+        scores: Dict[int, float] = {}
+        for term in set(self.tokenize(query)):
+            postings = index["postings"].get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                if sources and docs[doc_id]["source"] not in sources:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        results = [{**docs[doc_id], "score": round(score, 3)} for doc_id, score in ranked]
+
+        self.queries += 1
+        self.hits += 1 if results else 0
+        self.snippets_returned += len(results)
+        self.total_latency_ms += (time.perf_counter() - start) * 1000
+        return results
+
+    @staticmethod
+    def format_snippets(results: List[Dict[str, Any]]) -> str:
+        return "\n".join(f"- [{r['source']}] {r['text']}" for r in results)
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "documents": len(index["docs"]) if index else None,
+            "terms": len(index["postings"]) if index else None,
+            "loaded_from_disk": self.loaded_from_disk,
+            "build_ms": self.build_ms,
+            "queries": self.queries,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.queries, 3) if self.queries else None,
+            "avg_snippets": round(self.snippets_returned / self.queries, 2) if self.queries else None,
+            "avg_latency_ms": round(self.total_latency_ms / self.queries, 3) if self.queries else None
+        }
+
+retrieval_service = RetrievalService()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from beanie import PydanticObjectId
+from beanie.operators import In
+from bson.errors import InvalidId
+from models import Task, Student
+from services.grading_service import grading_service, TaskNotFoundError, IdempotencyConflictError, GradingInProgressError
+from services.task_pool_service import task_pool_service
+from services.rate_limit_service import rate_limit_service
+from services.usage_service import current_student
+
+TASK_BATCH_MAX_ITEMS = int(os.getenv("TASK_BATCH_MAX_ITEMS", "50"))
+# Model calls of one batch that may run at once, so a large batch can't monopolise the LLM backend
+TASK_BATCH_CONCURRENCY = int(os.getenv("TASK_BATCH_CONCURRENCY", "4"))
+
+class BatchTooLargeError(ValueError):
+    pass
+
+class TaskBatchService:
+    """
+    Verify or generate many tasks in one request.
+
+    All tasks (and their students) are loaded with a single query each, then the per-item LLM work
+    runs concurrently under a small semaphore. Every item gets its own result entry, so one failing
+    item never fails the batch. Each item counts against its task owner's rate limit and token
+    budget, exactly like the single-task endpoint, and its model usage is charged to that student.
+    """
+
+    @staticmethod
+    def _error(task_id: str, status_code: int, message: str) -> Dict[str, Any]:
+        return {"task_id": task_id, "ok": False, "status_code": status_code, "error": message}
+
+    @staticmethod
+    async def _admit(limit_class: str, task: Task) -> Optional[Dict[str, Any]]:
+        """Charges one request to the task's owner. Returns the item's 429 result if over a limit."""
+        error = await rate_limit_service.check_student(limit_class, task.student_id, task.student_id)
+        if error:
+            return {**TaskBatchService._error(str(task.id), 429, error["message"]), "retry_after": error["retry_after"]}
+        # Each item runs in its own asyncio task, so this only applies to this item's model calls
+        current_student.set(task.student_id)
+        return None
+
+    @staticmethod
+    def _canonical(task_id: str) -> str:
+        try:
+            return str(PydanticObjectId(task_id))
+        except (InvalidId, TypeError, ValueError):
+            return task_id
+
+    @staticmethod
+    async def _load(task_ids: List[str]) -> Tuple[Dict[str, Task], Dict[str, Dict[str, Any]]]:
+        """Loads the tasks in one query. Returns the found tasks and per-id errors for the rest."""
+        if len(task_ids) > TASK_BATCH_MAX_ITEMS:
+            raise BatchTooLargeError(f"A batch can contain at most {TASK_BATCH_MAX_ITEMS} items")
+
+        errors: Dict[str, Dict[str, Any]] = {}
+        oids = []
+        for task_id in dict.fromkeys(task_ids):
+            try:
+                oids.append(PydanticObjectId(task_id))
+            except (InvalidId, TypeError, ValueError):
+                errors[task_id] = TaskBatchService._error(task_id, 400, "Invalid task id")
+
+        tasks = {str(t.id): t for t in await Task.find(In(Task.id, oids)).to_list()}
+        for oid in oids:
+            if str(oid) not in tasks:
+                errors[str(oid)] = TaskBatchService._error(str(oid), 404, "Task not found")
+        return tasks, errors
+
+    @staticmethod
+    async def _gather_limited(calls: List[Callable[[], Awaitable[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        slots = asyncio.Semaphore(TASK_BATCH_CONCURRENCY)
+
+        async def run(call):
+            async with slots:
+                return await call()
+
+        return await asyncio.gather(*[run(call) for call in calls])
+
+    @staticmethod
+    async def verify_many(items: List[Dict[str, Any]],
+                          on_verified: Optional[Callable[[Task], Awaitable]] = None) -> List[Dict[str, Any]]:
+        """Grades each {task_id, submission_content, idempotency_key?}. Results keep the order of `items`."""
+        items = [{**item, "task_id": TaskBatchService._canonical(item["task_id"])} for item in items]
+        tasks, errors = await TaskBatchService._load([item["task_id"] for item in items])
+
+        async def verify_one(item: Dict[str, Any]) -> Dict[str, Any]:
+            task_id = item["task_id"]
+            rejected = await TaskBatchService._admit("grade", tasks[task_id])
+            if rejected:
+                return rejected
+            try:
+                result = await grading_service.verify(
+                    task_id, item["submission_content"], item.get("idempotency_key"),
+                    on_verified=on_verified, task=tasks[task_id]
+                )
+            except TaskNotFoundError:
+                return TaskBatchService._error(task_id, 404, "Task not found")
+            except IdempotencyConflictError:
+                return TaskBatchService._error(task_id, 422, "Idempotency-Key was already used for a different submission")
+            except GradingInProgressError:
+                return TaskBatchService._error(task_id, 409, "This submission is still being graded. Please retry shortly.")
+            except Exception as e:
+                print(f"Batch verification error for task {task_id}: {e}")
+                return TaskBatchService._error(task_id, 500, "Verification failed")
+            if result.get("status") == "error":
+                return {"task_id": task_id, "ok": False, "status_code": 503, "error": result.get("message"), "result": result}
+            return {"task_id": task_id, "ok": True, "status_code": 200, "result": result}
+
+        seen = set()
+        calls = []
+        results: List[Optional[Dict[str, Any]]] = []
+        for item in items:
+            task_id = item["task_id"]
+            if task_id in errors:
+                results.append(errors[task_id])
+            elif task_id in seen:
+                # Two gradings of one task in the same batch would race each other; keep the first
+                results.append(TaskBatchService._error(task_id, 400, "Duplicate task_id in batch"))
+            else:
+                seen.add(task_id)
+                calls.append((len(results), lambda item=item: verify_one(item)))
+                results.append(None)
+
+        for (index, _), result in zip(calls, await TaskBatchService._gather_limited([c for _, c in calls])):
+            results[index] = result
+        return results
+
+    @staticmethod
+    async def generate_many(task_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fills in the content of each placeholder task, like /tasks/{task_id}/ai-generate."""
+        task_ids = [TaskBatchService._canonical(task_id) for task_id in task_ids]
+        tasks, errors = await TaskBatchService._load(task_ids)
+
+        student_oids = []
+        for task in tasks.values():
+            try:
+                student_oids.append(PydanticObjectId(task.student_id))
+            except (InvalidId, TypeError, ValueError):
+                pass
+        students = {str(s.id): s for s in await Student.find(In(Student.id, list(set(student_oids)))).to_list()}
+
+        async def generate_one(task: Task) -> Dict[str, Any]:
+            task_id = str(task.id)
+            if task_pool_service.has_content(task):
+                return {"task_id": task_id, "ok": True, "status_code": 200, "task": task}
+            student = students.get(task.student_id)
+            if not student:
+                return TaskBatchService._error(task_id, 404, "Student not found")
+            rejected = await TaskBatchService._admit("generate", task)
+            if rejected:
+                return rejected
+            try:
+                content = await task_pool_service.generate_for_task(task, student)
+                await task.set({getattr(Task, field): value for field, value in content.items()})
+            except Exception as e:
+                print(f"Batch generation error for task {task_id}: {e}")
+                return TaskBatchService._error(task_id, 500, f"AI content generation failed: {e}")
+            return {"task_id": task_id, "ok": True, "status_code": 200, "task": task}
+
+        unique_ids = list(dict.fromkeys(task_ids))
+        pending = [task_id for task_id in unique_ids if task_id in tasks]
+        generated = dict(zip(pending, await TaskBatchService._gather_limited(
+            [lambda task=tasks[task_id]: generate_one(task) for task_id in pending]
+        )))
+        # Repeated ids were generated once and share the result
+        return [generated.get(task_id) or errors[task_id] for task_id in task_ids]
+
+task_batch_service = TaskBatchService()
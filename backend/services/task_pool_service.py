@@ -0,0 +1,164 @@
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from pymongo import ReturnDocument
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from models import Student, Task, TaskVariant, Progress
+from services.ai_service import ai_service
+from services.code_runner_service import code_runner_service
+from services.job_service import job_service
+from utils.csv_manager import csv_manager
+
+TASK_POOL_SIZE = int(os.getenv("TASK_POOL_SIZE", "3"))  # Variants kept per (course, topic, learning style, pace)
+
+class TaskPoolService:
+    """
+    Shared pool of generated task contents.
+
+    Enrollment tasks only differ by (course, topic, learning_style, study_pace), so instead of one
+    LLM call per student, a few variants per key are generated in the background and handed out
+    least-served first. The LLM is called inline only when a key's pool is still empty.
+    """
+
+    @staticmethod
+    def pool_key(course_id: str, topic: str, learning_style: str, study_pace: str) -> Dict[str, str]:
+        return {"course_id": str(course_id), "topic": topic, "learning_style": learning_style, "study_pace": study_pace}
+
+    @staticmethod
+    def _fill_dedupe_key(key: Dict[str, str]) -> str:
+        return "task_pool:" + "|".join(key[f] for f in ("course_id", "topic", "learning_style", "study_pace"))
+
+    @staticmethod
+    async def resolve_course_name(course_id: Optional[str], student_id: str) -> str:
+        # Resilience: Try to find course by ID in CSV, or fallback to Progress record
+        matched_course = csv_manager.get_course_by_id(course_id)
+        if matched_course:
+            return matched_course['name']
+
+        print(f"DEBUG Warning: course_id {course_id} wasn't found in CSV. Checking Progress...")
+        progress = await Progress.find_one(Progress.student_id == student_id, Progress.course_id == course_id)
+        if progress and progress.course_name:
+            print(f"DEBUG: Found course name '{progress.course_name}' from Progress record.")
+            return progress.course_name
+        print(f"DEBUG Error: Could not determine course name for course {course_id}.")
+        return "General Academic Subject"
+
+    @staticmethod
+    async def _generate_variant(key: Dict[str, str], served: int = 0) -> Dict[str, Any]:
+        course = csv_manager.get_course_by_id(key["course_id"])
+        course_name = course['name'] if course else "General Academic Subject"
+        # Pool content must not depend on a particular student, so only the key goes into the prompt
+        profile = {"name": "the student", "learning_style": key["learning_style"], "study_pace": key["study_pace"], "interests": []}
+        ai_task = await ai_service.generate_personalized_task(profile, course_name, key["topic"], include_tests=True)
+        variant = {
+            **key,
+            "title": ai_task.get("title", key["topic"]),
+            "description": ai_task.get("description", f"Review and master {key['topic']} for the {course_name} course."),
+            "type": ai_task.get("type", "theory"),
+            "test_cases": code_runner_service.clean_test_cases(ai_task),
+            "served": served,
+            "created_at": datetime.now()
+        }
+        if ai_task.get("fallback"):
+            # The model call failed; the placeholder content is returned but never pooled
+            return variant
+        result = await TaskVariant.get_motor_collection().insert_one(variant)
+        variant["_id"] = result.inserted_id
+        return variant
+
+    @staticmethod
+    async def schedule_fill(key: Dict[str, str]):
+        await job_service.enqueue("task_pool_fill", key, dedupe_key=TaskPoolService._fill_dedupe_key(key))
+
+    @staticmethod
+    async def fill(key: Dict[str, str]) -> int:
+        """Tops the pool for `key` up to TASK_POOL_SIZE variants. Returns how many were generated."""
+        existing = await TaskVariant.get_motor_collection().count_documents(key)
+        for _ in range(TASK_POOL_SIZE - existing):
+            variant = await TaskPoolService._generate_variant(key)
+            if "_id" not in variant:
+                raise RuntimeError("Task generation failed, pool fill will be retried")
+        return max(0, TASK_POOL_SIZE - existing)
+
+    @staticmethod
+    async def take(key: Dict[str, str]) -> Dict[str, Any]:
+        """Hands out the least-served variant for `key` (round-robin), generating one if the pool is empty."""
+        variant = await TaskVariant.get_motor_collection().find_one_and_update(
+            key,
+            {"$inc": {"served": 1}},
+            sort=[("served", 1), ("_id", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if variant is not None:
+            return variant
+
+        print(f"DEBUG: Task pool empty for {key}, generating inline")
+        variant = await TaskPoolService._generate_variant(key, served=1)
+        await TaskPoolService.schedule_fill(key)
+        return variant
+
+    @staticmethod
+    async def schedule_fill_for_enrollment(student_ids: List[str], course_ids: List[str]):
+        """Queues pool fills for every topic of the courses, for the learning styles and paces of the students."""
+        oids = []
+        for sid in student_ids:
+            try:
+                oids.append(PydanticObjectId(sid))
+            except (InvalidId, TypeError, ValueError):
+                pass
+        profiles = await Student.get_motor_collection().aggregate([
+            {"$match": {"_id": {"$in": oids}}},
+            {"$group": {"_id": {"learning_style": "$learning_style", "study_pace": "$study_pace"}}}
+        ]).to_list(None)
+
+        scheduled = 0
+        for course_id in course_ids:
+            course = csv_manager.get_course_by_id(course_id)
+            if not course:
+                continue
+            for topic in course.get('topics', []):
+                for profile in profiles:
+                    key = TaskPoolService.pool_key(course_id, topic, profile["_id"]["learning_style"], profile["_id"]["study_pace"])
+                    await TaskPoolService.schedule_fill(key)
+                    scheduled += 1
+        print(f"DEBUG: Scheduled {scheduled} task pool fills")
+
+    @staticmethod
+    def has_content(task: Task) -> bool:
+        """Whether the task's content was already generated (placeholders only have the topic as title)."""
+        return bool(task.variant_id or (task.description and "Practice:" in task.title))
+
+    @staticmethod
+    async def generate_for_task(task: Task, student) -> Dict[str, Any]:
+        """
+        Content for a placeholder task. Enrollment tasks (with a topic) come from the shared pool;
+        other tasks are generated for the student directly.
+        """
+        if task.topic:
+            key = TaskPoolService.pool_key(task.course_id, task.topic, student.learning_style, student.study_pace)
+            variant = await TaskPoolService.take(key)
+            return {
+                "title": variant["title"],
+                "description": variant["description"],
+                "type": variant["type"],
+                "test_cases": variant.get("test_cases"),
+                "variant_id": str(variant["_id"]) if "_id" in variant else None
+            }
+
+        course_name = await TaskPoolService.resolve_course_name(task.course_id, task.student_id)
+        print(f"DEBUG: Calling AI to generate task content for topic: {task.title} in course: {course_name}")
+        ai_task = await ai_service.generate_personalized_task(student.dict(), course_name, task.title, include_tests=True)
+        return {
+            "title": ai_task.get("title", task.title),
+            "description": ai_task.get("description", task.description),
+            "type": ai_task.get("type", task.type),
+            "test_cases": code_runner_service.clean_test_cases(ai_task)
+        }
+
+
+@job_service.handler("task_pool_fill", concurrency=2)
+async def _task_pool_fill_job(payload: Dict[str, Any]):
+    return {"generated": await TaskPoolService.fill(payload)}
+
+task_pool_service = TaskPoolService()
@@ -0,0 +1,98 @@
+import contextvars
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from models import TokenUsage
+
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "200000"))  # Per student; 0 disables the budget
+SYSTEM_USAGE_KEY = "_system"
+
+# Student on whose behalf the current request / job calls the model. Set by the rate-limit
+# middleware, the WebSocket chat and the job runner; inherited by tasks spawned from there.
+current_student: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_student", default=None)
+
+class UsageService:
+    """
+    LLM token accounting.
+
+    Every successful model call reports the token counts from the backend's response
+    (Ollama prompt_eval_count/eval_count, OpenAI usage) and they are added with one $inc to a
+    per-student, per-day counter. The daily budget is checked against that counter.
+    """
+
+    @staticmethod
+    def today() -> str:
+        return datetime.now().strftime("%Y-%m-%d")
+
+    @staticmethod
+    def seconds_until_tomorrow() -> int:
+        now = datetime.now()
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return int((tomorrow - now).total_seconds()) + 1
+
+    @staticmethod
+    def extract(response: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """(prompt_tokens, completion_tokens) from a backend response, or None if it reports no usage."""
+        if not isinstance(response, dict):
+            return None
+        if "prompt_eval_count" in response or "eval_count" in response:
+            return int(response.get("prompt_eval_count") or 0), int(response.get("eval_count") or 0)
+        usage = response.get("usage")
+        if isinstance(usage, dict):
+            return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+        return None
+
+    @staticmethod
+    async def record(response: Dict[str, Any]):
+        """Adds the usage reported in `response` to the current student's counter for today."""
+        counts = UsageService.extract(response)
+        if counts is None:
+            return
+        prompt_tokens, completion_tokens = counts
+        try:
+            await TokenUsage.get_motor_collection().update_one(
+                {"student_id": current_student.get() or SYSTEM_USAGE_KEY, "day": UsageService.today()},
+                {
+                    "$inc": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "calls": 1},
+                    "$set": {"updated_at": datetime.now()}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # Accounting must never fail the model call it accounts for
+            print(f"Usage: could not record token usage: {e}")
+
+    @staticmethod
+    async def tokens_today(student_id: str) -> int:
+        doc = await TokenUsage.get_motor_collection().find_one(
+            {"student_id": student_id, "day": UsageService.today()},
+            {"prompt_tokens": 1, "completion_tokens": 1}
+        )
+        return (doc or {}).get("prompt_tokens", 0) + (doc or {}).get("completion_tokens", 0)
+
+    @staticmethod
+    async def budget_exhausted(student_id: str) -> bool:
+        if LLM_DAILY_TOKEN_BUDGET <= 0 or not student_id:
+            return False
+        return await UsageService.tokens_today(student_id) >= LLM_DAILY_TOKEN_BUDGET
+
+    @staticmethod
+    async def stats(student_id: Optional[str] = None) -> Dict[str, Any]:
+        match = {"day": UsageService.today()}
+        if student_id:
+            match["student_id"] = student_id
+        totals = await TokenUsage.get_motor_collection().aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": None,
+                "students": {"$sum": 1},
+                "calls": {"$sum": "$calls"},
+                "prompt_tokens": {"$sum": "$prompt_tokens"},
+                "completion_tokens": {"$sum": "$completion_tokens"}
+            }}
+        ]).to_list(None)
+        row = totals[0] if totals else {"students": 0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        row.pop("_id", None)
+        return {"day": match["day"], "daily_budget": LLM_DAILY_TOKEN_BUDGET, **row}
+
+usage_service = UsageService()
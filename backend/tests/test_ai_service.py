@@ -0,0 +1,36 @@
+import httpx
+import pytest
+from services import ai_service as ai_module
+from services.ai_service import ai_service
+from services.usage_service import usage_service
+
+pytestmark = pytest.mark.anyio
+
+SCHEMA = {"type": "object", "properties": {"a": {"type": "integer"}}}
+
+
+async def test_rejected_json_mode_is_retried_without_it_for_that_request_only(monkeypatch):
+    sent = []
+
+    def handler(request):
+        body = request.read().decode()
+        sent.append('"format"' in body)
+        if '"format"' in body and len(sent) == 1:
+            return httpx.Response(400, text="unsupported format")
+        return httpx.Response(200, json={"message": {"content": '{"a": 1}'}})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(ai_module.httpx, "AsyncClient", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs))
+    monkeypatch.setattr(ai_service, "api_url", "http://model/api/chat")
+    monkeypatch.setattr(ai_service, "json_mode", True)
+
+    async def no_usage(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(usage_service, "record", no_usage)
+
+    assert await ai_service._call_ollama("q", json_schema=SCHEMA) == '{"a": 1}'
+    assert await ai_service._call_ollama("q", json_schema=SCHEMA) == '{"a": 1}'
+    # First request: rejected with the schema, retried without it; the next one sends it again
+    assert sent == [True, False, True]
+    assert ai_service.json_mode is True
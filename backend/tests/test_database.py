@@ -0,0 +1,35 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from database import dedupe_unique_keys
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rows_of_dropped_students_move_to_the_kept_one():
+    # No init_beanie: the unique indexes must not exist yet
+    db = AsyncMongoMockClient().dedupe_db
+    kept = (await db.students.insert_one({"roll_number": "21F-0001", "name": "Ali"})).inserted_id
+    dropped = (await db.students.insert_one({"roll_number": "21F-0001", "name": "Ali"})).inserted_id
+    keep_id, drop_id = str(kept), str(dropped)
+    await db.tasks.insert_many([
+        {"student_id": keep_id, "course_id": "c1", "topic": "Loops", "status": "pending"},
+        {"student_id": drop_id, "course_id": "c1", "topic": "Loops", "status": "completed"},
+        {"student_id": drop_id, "course_id": "c1", "topic": "Arrays", "status": "pending"},
+    ])
+    await db.progress.insert_many([
+        {"student_id": keep_id, "course_id": "c1", "tasks_completed": 0},
+        {"student_id": drop_id, "course_id": "c1", "tasks_completed": 1},
+    ])
+    await db.chat_sessions.insert_one({"student_id": drop_id, "is_default": True})
+
+    result = await dedupe_unique_keys(db)
+
+    assert result["students"] == 1
+    assert await db.students.count_documents({}) == 1
+    assert await db.tasks.count_documents({"student_id": drop_id}) == 0
+    assert await db.tasks.count_documents({"student_id": keep_id}) == 3
+    # The clashing enrollment task keeps its work but no longer claims the topic
+    assert await db.tasks.count_documents({"student_id": keep_id, "topic": "Loops"}) == 1
+    assert await db.progress.count_documents({"student_id": keep_id}) == 1
+    assert await db.progress_duplicates.count_documents({"student_id": drop_id}) == 1
+    assert await db.chat_sessions.count_documents({"student_id": keep_id}) == 1
@@ -0,0 +1,42 @@
+import pytest
+from models import Progress, Student, StudyPlan, Task
+from services.ai_service import ai_service, AI_UNAVAILABLE_MESSAGE
+from services.followup_service import followup_service, ModelUnavailableError
+
+pytestmark = pytest.mark.anyio
+
+
+async def _student() -> str:
+    student = Student(roll_number="21F-0001", password="x", name="Ali", uni_name="FAST", current_semester=3,
+                      study_pace="Moderate", learning_style="Practice")
+    await student.insert()
+    return str(student.id)
+
+
+async def test_unavailable_model_keeps_the_last_study_plan(db, monkeypatch):
+    student_id = await _student()
+    await StudyPlan(student_id=student_id, plan="Week 1: loops").insert()
+
+    async def offline(*args, **kwargs):
+        return AI_UNAVAILABLE_MESSAGE
+
+    monkeypatch.setattr(ai_service, "generate_study_plan", offline)
+    with pytest.raises(ModelUnavailableError):
+        await followup_service.refresh_study_plan(student_id)
+
+    assert (await StudyPlan.find_one(StudyPlan.student_id == student_id)).plan == "Week 1: loops"
+
+
+async def test_placeholder_remedial_task_is_not_created(db, monkeypatch):
+    student_id = await _student()
+    await Progress(student_id=student_id, course_id="c1", course_name="Programming", total_tasks=2, tasks_completed=2, accuracy=0.4).insert()
+
+    async def offline(*args, **kwargs):
+        return {"title": "Practice", "description": "Placeholder", "type": "theory", "fallback": True}
+
+    monkeypatch.setattr(ai_service, "generate_personalized_task", offline)
+    with pytest.raises(ModelUnavailableError):
+        await followup_service.check_and_generate_remedial_tasks(student_id)
+
+    assert await Task.find(Task.student_id == student_id).count() == 0
+    assert (await Progress.find_one(Progress.student_id == student_id)).total_tasks == 2
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from models import GradingResult, Progress, Task
+from services.ai_service import ai_service
+from services.grading_service import grading_service, IdempotencyConflictError
+
+pytestmark = pytest.mark.anyio
+
+PASS = {"verified": True, "score": 90, "feedback": "Good."}
+UNAVAILABLE = {"verified": False, "score": 0, "feedback": "The grader is unavailable.", "fallback": True}
+
+
+@pytest.fixture
+def grader(monkeypatch):
+    """Replaces the model call; `grader.calls` counts it and `grader.result` is what it answers."""
+    class Grader:
+        calls = 0
+        result = PASS
+        delay = 0.0
+
+        async def verify_submission(self, task_title, task_description, submission):
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            return dict(self.result)
+
+    fake = Grader()
+    monkeypatch.setattr(ai_service, "verify_submission", fake.verify_submission)
+    return fake
+
+
+async def _enrolled_task() -> Task:
+    await Progress(student_id="s1", course_id="c1", total_tasks=1).insert()
+    task = Task(title="Loops", description="Write a loop", student_id="s1", course_id="c1", type="theory", difficulty="easy", topic="Loops")
+    await task.insert()
+    return task
+
+
+async def test_replay_returns_stored_response_without_regrading(db, grader):
+    task = await _enrolled_task()
+
+    first = await grading_service.submit(str(task.id), "for i in range(3): print(i)", idempotency_key="k1")
+    replay = await grading_service.submit(str(task.id), "for i in range(3): print(i)", idempotency_key="k1")
+
+    assert first["status"] == "success"
+    assert replay == first
+    assert grader.calls == 1
+    progress = await Progress.find_one(Progress.student_id == "s1")
+    assert progress.tasks_completed == 1
+    assert progress.score_sum == 90
+
+
+async def test_key_reused_for_another_submission_is_rejected(db, grader):
+    task = await _enrolled_task()
+    await grading_service.submit(str(task.id), "answer", idempotency_key="k1")
+
+    with pytest.raises(IdempotencyConflictError):
+        await grading_service.submit(str(task.id), "another answer", idempotency_key="k1")
+
+
+async def test_concurrent_duplicates_are_graded_once(db, grader):
+    task = await _enrolled_task()
+    grader.delay = 0.2
+
+    responses = await asyncio.gather(*[
+        grading_service.verify(str(task.id), "answer", idempotency_key="k1") for _ in range(3)
+    ])
+
+    assert grader.calls == 1
+    assert all(r == responses[0] for r in responses)
+    progress = await Progress.find_one(Progress.student_id == "s1")
+    assert progress.tasks_completed == 1
+
+
+async def test_unavailable_grader_completes_nothing_and_frees_the_key(db, grader):
+    task = await _enrolled_task()
+    grader.result = UNAVAILABLE
+
+    failed = await grading_service.verify(str(task.id), "answer", idempotency_key="k1")
+
+    assert failed["status"] == "error"
+    assert (await Task.get(task.id)).status == "pending"
+    assert await GradingResult.find_one(GradingResult.idempotency_key == "k1") is None
+
+    grader.result = PASS
+    retried = await grading_service.verify(str(task.id), "answer", idempotency_key="k1")
+
+    assert retried["status"] == "success" and retried["verified"]
+    assert (await Task.get(task.id)).status == "completed"
+    assert (await Progress.find_one(Progress.student_id == "s1")).tasks_completed == 1
+
+
+async def test_failed_regrade_keeps_a_completed_task_verified(db, grader):
+    task = await _enrolled_task()
+    await grading_service.submit(str(task.id), "$first answer")
+
+    grader.result = {"verified": False, "score": 20, "feedback": "Worse."}
+    await grading_service.submit(str(task.id), "$second answer")
+
+    stored = await Task.get(task.id)
+    assert (stored.status, stored.verified, stored.score) == ("completed", True, 20)
+    # Stored as sent, not read as a field path by the update pipeline
+    assert stored.submission == "$second answer"
+    progress = await Progress.find_one(Progress.student_id == "s1")
+    assert (progress.tasks_completed, progress.score_sum) == (1, 20)
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from models import Job
+from services import job_service as job_module
+from services.job_service import JobService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def jobs(db, monkeypatch):
+    # Retries become due at once instead of after the backoff
+    monkeypatch.setattr(job_module, "JOB_RETRY_BASE_SECONDS", 0)
+    return JobService()
+
+
+async def _run_next(jobs: JobService) -> dict:
+    job = await jobs._claim()
+    assert job is not None
+    await jobs._execute(job)
+    return await Job.get_motor_collection().find_one({"_id": job["_id"]})
+
+
+async def test_duplicate_of_a_queued_job_is_absorbed(jobs):
+    first = await jobs.enqueue("refresh", {"student_id": "s1"}, dedupe_key="refresh:s1")
+    second = await jobs.enqueue("refresh", {"student_id": "s1"}, dedupe_key="refresh:s1")
+    other = await jobs.enqueue("refresh", {"student_id": "s2"}, dedupe_key="refresh:s2")
+
+    assert first is not None and other is not None
+    assert second is None
+    assert await Job.get_motor_collection().count_documents({}) == 2
+
+
+async def test_job_enqueued_while_one_runs_is_kept(jobs):
+    started, release = asyncio.Event(), asyncio.Event()
+    runs = []
+
+    @jobs.handler("refresh")
+    async def refresh(payload):
+        runs.append(payload["n"])
+        started.set()
+        await release.wait()
+
+    await jobs.enqueue("refresh", {"n": 1}, dedupe_key="refresh:s1")
+    running = asyncio.create_task(_run_next(jobs))
+    await started.wait()
+
+    # The running job may have read stale data: this one must run after it
+    assert await jobs.enqueue("refresh", {"n": 2}, dedupe_key="refresh:s1") is not None
+    release.set()
+    assert (await running)["status"] == "done"
+    assert (await _run_next(jobs))["status"] == "done"
+    assert runs == [1, 2]
+
+
+async def test_failed_attempt_is_retried_under_its_key(jobs):
+    attempts = []
+
+    @jobs.handler("flaky")
+    async def flaky(payload):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("model timeout")
+        return "ok"
+
+    await jobs.enqueue("flaky", {}, dedupe_key="flaky:1")
+    retried = await _run_next(jobs)
+
+    assert retried["status"] == "queued"
+    assert retried["active_key"] == "flaky:1"
+    assert await jobs.enqueue("flaky", {}, dedupe_key="flaky:1") is None
+    assert (await _run_next(jobs))["status"] == "done"
+
+
+async def test_job_fails_for_good_after_max_attempts(jobs):
+    finished = []
+
+    @jobs.handler("broken")
+    async def broken(payload):
+        raise ValueError("bad payload")
+
+    @jobs.on_complete
+    async def record(job, status, result):
+        finished.append(status)
+
+    await jobs.enqueue("broken", {}, max_attempts=2)
+    assert (await _run_next(jobs))["status"] == "queued"
+    failed = await _run_next(jobs)
+
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 2
+    assert "ValueError: bad payload" in failed["last_error"]
+    assert finished == ["failed"]
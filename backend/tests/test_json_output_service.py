@@ -0,0 +1,99 @@
+import pytest
+from services.json_output_service import JsonOutputService
+
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verified": {"type": "boolean", "default": False},
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "feedback": {"type": "string", "default": ""}
+    },
+    "required": ["score", "feedback"]
+}
+FALLBACK = {"verified": False, "score": 0, "feedback": "fallback"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('Sure! Here it is:\n```json\n{"a": 1}\n```\nAnything else?', {"a": 1}),
+    ('{"a": 1} and some closing words {"b": 2}', {"a": 1}),
+    ('[1, 2, 3]', [1, 2, 3]),
+])
+def test_valid_json_is_found_without_repair(text, expected):
+    assert JsonOutputService.parse(text) == (expected, False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('{"ok": True, "missing": None}', {"ok": True, "missing": None}),
+    ('{“a”: “b”}', {"a": "b"}),
+])
+def test_common_model_mistakes_are_repaired(text, expected):
+    assert JsonOutputService.parse(text) == (expected, True)
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Cut off inside a string value: the value is kept up to the cut
+    ('{"feedback": "Good use of loo', {"feedback": "Good use of loo"}),
+    # Cut off in nested arrays and objects
+    ('{"roadmap": [{"phase": "Basics", "tasks": ["a", "b"', {"roadmap": [{"phase": "Basics", "tasks": ["a", "b"]}]}),
+    # Cut off in a member name or right after the colon: the unfinished member is dropped, not the others
+    ('{"score": 80, "feedb', {"score": 80}),
+    ('{"score": 80, "feedback":', {"score": 80}),
+    ('{"score": 80, "feedback": "x", ', {"score": 80, "feedback": "x"}),
+    # Brackets inside strings do not count
+    ('{"code": "if (a[0] == \'{\') {", "ok": true', {"code": "if (a[0] == '{') {", "ok": True}),
+    # Cut off right after a backslash: it is kept as a literal one
+    ('{"path": "C:\\', {"path": "C:\\"}),
+])
+def test_truncated_output_is_closed(text, expected):
+    assert JsonOutputService.parse(text) == (expected, True)
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        JsonOutputService.parse("I cannot grade this submission.")
+
+
+def test_values_are_coerced_to_the_schema():
+    service = JsonOutputService()
+
+    value = service.load("verify", '{"verified": "yes", "score": "85%", "feedback": ["Clear", "correct"]}', SCORE_SCHEMA, FALLBACK)
+
+    assert value == {"verified": True, "score": 85, "feedback": "Clear, correct"}
+    assert service.counts["verify"]["repaired"] == 1
+
+
+def test_numbers_are_clamped_and_defaults_filled():
+    value = JsonOutputService().load("verify", '{"score": 140, "feedback": null}', {
+        **SCORE_SCHEMA, "required": ["score"]
+    }, FALLBACK)
+
+    assert value == {"verified": False, "score": 100, "feedback": ""}
+
+
+def test_invalid_array_items_are_dropped():
+    schema = {"type": "array", "items": {"type": "object", "properties": {"title": {"type": "string"}}, "required": ["title"]}}
+
+    value = JsonOutputService().load("tasks", '[{"title": "A"}, {"description": "no title"}, {"title": "B"}]', schema, [])
+
+    assert value == [{"title": "A"}, {"title": "B"}]
+
+
+def test_fallback_when_the_schema_cannot_be_met():
+    service = JsonOutputService()
+
+    value = service.load("verify", '{"verified": true, "feedback": "no score given"}', SCORE_SCHEMA, FALLBACK)
+
+    assert value is FALLBACK
+    assert service.stats()["methods"]["verify"]["failure_rate"] == 1.0
+
+
+def test_placeholder_answers_count_as_unavailable_not_ok():
+    service = JsonOutputService()
+
+    service.load("verify", '{"score": 0, "feedback": "offline", "fallback": true}', SCORE_SCHEMA, FALLBACK)
+
+    counts = service.stats()["methods"]["verify"]
+    assert counts["unavailable"] == 1
+    assert counts["failure_rate"] is None
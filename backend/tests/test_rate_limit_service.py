@@ -0,0 +1,129 @@
+import inspect
+import math
+import re
+import pytest
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from models import TokenUsage
+from services import rate_limit_service as rate_module
+from services.rate_limit_service import RateLimitService, RATE_LIMITS
+from services import usage_service as usage_module
+from services.usage_service import usage_service
+
+pytestmark = pytest.mark.anyio
+
+# An endpoint whose code contains one of these reaches the model backend
+MODEL_CALLS = ("ai_service.", "grading_service.", "refresh_study_plan(", "generate_for_task(", "_chat(")
+# Limited per item by services/task_batch_service.py instead
+LIMITED_PER_ITEM = {"/tasks/verify/batch", "/tasks/ai-generate/batch"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(rate_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def limiter(db, clock):
+    return RateLimitService()
+
+
+def _request(path: str, client_ip: str, headers=(), method: str = "GET") -> Request:
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "client": (client_ip, 50000),
+    })
+
+
+async def test_burst_then_rejected_with_retry_after(limiter):
+    burst = RATE_LIMITS["grade"]
+    for _ in range(burst):
+        assert await limiter.check_student("grade", "s1", "s1") is None
+
+    error = await limiter.check_student("grade", "s1", "s1")
+
+    assert error["limit"] == "grade"
+    assert error["retry_after"] == math.ceil(60 / burst)
+    assert limiter.rejected == {"grade": 1}
+
+
+async def test_bucket_refills_over_time(limiter, clock):
+    per_minute = RATE_LIMITS["chat"]
+    for _ in range(per_minute):
+        await limiter.check_student("chat", "s1", "s1")
+    assert await limiter.check_student("chat", "s1", "s1") is not None
+
+    clock.now += 60 / per_minute
+    assert await limiter.check_student("chat", "s1", "s1") is None
+    assert await limiter.check_student("chat", "s1", "s1") is not None
+
+
+async def test_students_and_classes_have_separate_buckets(limiter):
+    for _ in range(RATE_LIMITS["generate"]):
+        await limiter.check_student("generate", "s1", "s1")
+
+    assert await limiter.check_student("generate", "s1", "s1") is not None
+    assert await limiter.check_student("generate", "s2", "s2") is None
+    assert await limiter.check_student("chat", "s1", "s1") is None
+
+
+async def test_exhausted_token_budget_is_rejected(limiter, monkeypatch):
+    monkeypatch.setattr(usage_module, "LLM_DAILY_TOKEN_BUDGET", 1000)
+    await TokenUsage(student_id="s1", day=usage_service.today(), prompt_tokens=600, completion_tokens=400).insert()
+
+    error = await limiter.check_student("chat", "s1", "s1")
+
+    assert error["limit"] == "budget"
+    assert await limiter.check_student("chat", "s2", "s2") is None
+
+
+async def test_anonymous_routes_are_keyed_by_ip_not_headers(limiter):
+    for i in range(RATE_LIMITS["fyp"]):
+        response, _ = await limiter.check(_request("/fyp/details/p1", "10.0.0.1", [("X-Forwarded-For", f"192.0.2.{i}")]))
+        assert response is None
+
+    # A new forwarded-for value does not buy a new bucket; another client does get its own
+    response, _ = await limiter.check(_request("/fyp/details/p1", "10.0.0.1", [("X-Forwarded-For", "198.51.100.7")]))
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    response, _ = await limiter.check(_request("/fyp/details/p1", "10.0.0.2"))
+    assert response is None
+
+
+async def test_unlimited_routes_are_not_counted(limiter):
+    response, student_id = await limiter.check(_request("/progress/s1", "10.0.0.1"))
+
+    assert response is None and student_id is None
+    assert limiter.stats()["tracked_buckets"] == 0
+
+
+def test_every_model_backed_route_is_rate_limited():
+    # auth and health never call the model (health only reads ai_service counters)
+    from routers import chat, courses, student
+
+    checked = []
+    for route in [r for module in (chat, courses, student) for r in module.router.routes]:
+        if not isinstance(route, APIRoute) or route.path in LIMITED_PER_ITEM:
+            continue
+        if not any(call in inspect.getsource(route.endpoint) for call in MODEL_CALLS):
+            continue
+        path = re.sub(r"\{[^}]+\}", "abc", route.path)
+        for method in route.methods:
+            assert RateLimitService._match(_request(path, "10.0.0.1", method=method)), f"{method} {route.path} is not rate-limited"
+            checked.append(route.path)
+
+    assert {"/chat", "/students/{student_id}/study-plan", "/students/{student_id}/roadmap"} <= set(checked)
@@ -1,6 +1,6 @@
 import csv
 import os
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator
 
 class CSVManager:
     _instance = None
@@ -21,6 +21,7 @@ class CSVManager:
         
         self.fyp_projects = []
         self.courses = []
+        self.courses_by_id = {}
         self.students = []
         
         self.load_all_data()
@@ -29,6 +30,7 @@ class CSVManager:
     def load_all_data(self):
         self.fyp_projects = self._read_csv("fyp_data.csv")
         self.courses = self._read_csv("courses.csv")
+        self.courses_by_id = {str(c['id']): c for c in self.courses}
         self.students = self._read_csv("students.csv")
         print(f"CSVManager: Loaded {len(self.fyp_projects)} FYPs, {len(self.courses)} Courses, {len(self.students)} Students.")
 
@@ -37,39 +39,43 @@ class CSVManager:
         if not os.path.exists(filepath):
             print(f"Warning: {filename} not found at {filepath}")
             return []
-            
-        data = []
+        return list(self.iter_csv(filepath))
+
+    def iter_csv(self, filepath: str) -> Iterator[Dict]:
+        """Streams cleaned rows from a CSV file without loading it into memory."""
         with open(filepath, mode='r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                # Basic cleaning
-                clean_row = {}
-                for k, v in row.items():
-                    # Handle lists (pipe separated or comma separated)
-                    if k in ['required_skills', 'interests', 'weak_subjects', 'topics']:
-                         # prioritized pipe if present, else comma
-                         if '|' in v:
-                             clean_row[k] = [x.strip() for x in v.split('|')]
-                         elif ',' in v:
-                             clean_row[k] = [x.strip() for x in v.split(',')]
-                         else:
-                             clean_row[k] = [v.strip()] if v.strip() else []
-                             
-                    # Handle booleans
-                    elif k == 'trending':
-                        clean_row[k] = v.lower() == 'true'
-                    
-                    # Handle numbers
-                    elif k in ['id', 'semester', 'credits', 'current_semester', 'preparation_months']:
-                        try:
-                            clean_row[k] = int(v)
-                        except ValueError:
-                             clean_row[k] = v
-                    else:
-                        clean_row[k] = v
-                
-                data.append(clean_row)
-        return data
+                yield self._clean_row(row)
+
+    @staticmethod
+    def _clean_row(row: Dict) -> Dict:
+        # Basic cleaning
+        clean_row = {}
+        for k, v in row.items():
+            # Handle lists (pipe separated or comma separated)
+            if k in ['required_skills', 'interests', 'weak_subjects', 'topics']:
+                 # prioritized pipe if present, else comma
+                 if '|' in v:
+                     clean_row[k] = [x.strip() for x in v.split('|')]
+                 elif ',' in v:
+                     clean_row[k] = [x.strip() for x in v.split(',')]
+                 else:
+                     clean_row[k] = [v.strip()] if v.strip() else []
+                     
+            # Handle booleans
+            elif k == 'trending':
+                clean_row[k] = v.lower() == 'true'
+            
+            # Handle numbers
+            elif k in ['id', 'semester', 'credits', 'current_semester', 'preparation_months']:
+                try:
+                    clean_row[k] = int(v)
+                except ValueError:
+                     clean_row[k] = v
+            else:
+                clean_row[k] = v
+        return clean_row
 
     # Accessors
     def get_fyp_projects(self) -> List[Dict]:
@@ -85,6 +91,9 @@ class CSVManager:
     def get_courses(self) -> List[Dict]:
         return self.courses
         
+    def get_course_by_id(self, course_id) -> Optional[Dict]:
+        return self.courses_by_id.get(str(course_id))
+        
     def get_course_by_code(self, code: str) -> Optional[Dict]:
         for c in self.courses:
             if c['code'] == code:
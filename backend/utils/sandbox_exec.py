@@ -0,0 +1,148 @@
+"""
+Entry point of a code-runner sandbox. Started by services/code_runner_service.py inside fresh
+mount, network, PID, IPC and UTS namespaces (`unshare`), never imported by the app.
+
+Usage:
+    python sandbox_exec.py <workdir> <uid> <gid> <cpu_seconds> <memory_mb> <runtime_dir>...
+
+Builds a read-only root holding only the system libraries and the Python runtime, with the
+submission at /sandbox and an empty /tmp, makes it the root with pivot_root and detaches the old
+one, so no path leads back to the host's files. Then drops to `uid`/`gid` (-1 keeps the mapped
+root of a user namespace, for servers that are not root), empties the capability bounding,
+ambient and process sets and sets no_new_privs, so the submission holds no capability in either
+mode, runs the interpreter on /sandbox/main.py under the resource limits (including a process
+count) and exits with its status (128 + signal number if it was killed). There is no network
+interface besides an unconfigured loopback. On an architecture missing from _SYSCALLS this
+fails, and the code runner's probe leaves coding tasks to the model.
+"""
+import ctypes
+import ctypes.util
+import os
+import platform
+import resource
+import sys
+
+MS_RDONLY = 1
+MS_NOSUID = 2
+MS_NODEV = 4
+MS_REMOUNT = 32
+MS_BIND = 4096
+MS_REC = 16384
+MS_PRIVATE = 1 << 18
+MNT_DETACH = 2
+
+PR_CAPBSET_DROP = 24
+PR_SET_NO_NEW_PRIVS = 38
+PR_CAP_AMBIENT = 47
+PR_CAP_AMBIENT_CLEAR_ALL = 4
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+
+# Neither has a glibc wrapper: (pivot_root, capset) syscall numbers per architecture
+_SYSCALLS = {"x86_64": (155, 126), "aarch64": (41, 91)}
+
+SYSTEM_DIRS = ["/usr", "/lib", "/lib64", "/lib32", "/bin"]
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+
+def _mount(source, target, fstype, flags, data=None):
+    if _libc.mount(
+        source.encode() if source else None, target.encode(),
+        fstype.encode() if fstype else None, flags, data.encode() if data else None
+    ) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"mount {source} -> {target}: {os.strerror(errno)}")
+
+
+def _bind_readonly(source, target):
+    os.makedirs(target, exist_ok=True)
+    _mount(source, target, None, MS_BIND | MS_REC)
+    _mount(None, target, None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+def _check(result, what):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def _pivot_root(root):
+    """Makes `root` the root directory and unmounts the old one (unlike chroot, nothing to escape through)."""
+    pivot_root, _ = _SYSCALLS[platform.machine()]
+    os.chdir(root)
+    # With new and old root the same, the old root ends up stacked on "." and is detached next
+    _check(_libc.syscall(pivot_root, b".", b"."), "pivot_root")
+    _check(_libc.umount2(b".", MNT_DETACH), "umount old root")
+    os.chdir("/")
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _drop_capabilities():
+    """Empties the ambient and process capability sets; the bounding set is dropped before."""
+    _, capset = _SYSCALLS[platform.machine()]
+    _check(_libc.prctl(PR_CAP_AMBIENT, PR_CAP_AMBIENT_CLEAR_ALL, 0, 0, 0), "clear ambient capabilities")
+    # Zero effective, permitted and inheritable sets; exec can't bring them back (bounding set empty)
+    data = (_CapData * 2)()
+    _check(_libc.syscall(capset, ctypes.byref(_CapHeader(LINUX_CAPABILITY_VERSION_3, 0)), data), "capset")
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+
+
+def main():
+    workdir, uid, gid, cpu_seconds, memory_mb = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+    runtime_dirs = sys.argv[6:]
+    interpreter = os.path.realpath(sys.executable)
+    with open("/proc/sys/kernel/cap_last_cap") as f:
+        last_cap = int(f.read())
+
+    # Nothing mounted here propagates back to the host
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)
+    root = os.path.join(workdir, "root")
+    _mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "size=1m,mode=755")
+    for path in SYSTEM_DIRS + runtime_dirs:
+        if os.path.isdir(path) and not os.path.islink(path):
+            _bind_readonly(path, root + path)
+        elif os.path.islink(path):
+            os.symlink(os.readlink(path), root + path)
+    _bind_readonly(os.path.join(workdir, "code"), root + "/sandbox")
+    os.makedirs(root + "/tmp")
+    _mount("tmpfs", root + "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, "size=16m,mode=1777")
+    _mount(None, root, None, MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV, "size=1m,mode=755")
+
+    _pivot_root(root)
+    os.chdir("/sandbox")
+    # Needs CAP_SETPCAP, so before anything else is given up
+    for cap in range(last_cap + 1):
+        _check(_libc.prctl(PR_CAPBSET_DROP, cap, 0, 0, 0), f"drop capability {cap}")
+    if uid >= 0:
+        os.setgroups([])
+        os.setgid(gid)
+        os.setuid(uid)
+    # In a user namespace the process is still root there: without capabilities that is just a uid
+    _drop_capabilities()
+
+    pid = os.fork()
+    if pid == 0:
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (32, 32))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        # Keeps a fork bomb from exhausting the host's process table (enforced: no CAP_SYS_RESOURCE)
+        resource.setrlimit(resource.RLIMIT_NPROC, (64, 64))
+        os.execve(interpreter, [interpreter, "-I", "-S", "-B", "main.py"], {"PYTHONIOENCODING": "utf-8", "HOME": "/tmp"})
+
+    # This process is PID 1 of the namespace: when it exits, everything the submission started dies with it
+    _, status = os.waitpid(pid, 0)
+    os._exit(128 + os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+
+class StartupTracker:
+    """Times each startup phase and tracks which components are ready to serve traffic."""
+
+    # Components that must be up before /health/ready reports 200.
+    # The LLM is reported but not required: every AI call already has a fallback.
+    REQUIRED_COMPONENTS = ("db", "catalog")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.components: Dict[str, bool] = {"db": False, "catalog": False, "llm": False}
+        self.first_request_ms: Optional[float] = None
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        """Context manager that records the duration and outcome of a startup phase."""
+        start = time.perf_counter()
+        self.phases[name] = {"status": "running", "started_at_ms": self._elapsed_ms(), "duration_ms": None}
+        try:
+            yield
+        except Exception as e:
+            self.phases[name]["status"] = "failed"
+            self.phases[name]["error"] = str(e)
+            raise
+        else:
+            self.phases[name]["status"] = "done"
+        finally:
+            duration = round((time.perf_counter() - start) * 1000, 1)
+            self.phases[name]["duration_ms"] = duration
+            print(f"STARTUP: phase '{name}' {self.phases[name]['status']} in {duration} ms")
+
+    def set_ready(self, component: str, ready: bool = True):
+        self.components[component] = ready
+
+    def is_ready(self) -> bool:
+        return all(self.components.get(c) for c in self.REQUIRED_COMPONENTS)
+
+    def run_in_background(self, name: str, func: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Runs `func` as a timed phase without blocking startup. Errors are logged, not raised."""
+        async def runner():
+            try:
+                async with self.phase(name):
+                    await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"STARTUP: background phase '{name}' failed: {e}")
+
+        task = asyncio.create_task(runner())
+        # Keep a strong reference so the task is not garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def cancel_background(self):
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    def mark_request_served(self):
+        if self.first_request_ms is None:
+            self.first_request_ms = self._elapsed_ms()
+            print(f"STARTUP: first request served {self.first_request_ms} ms after process start")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "components": dict(self.components),
+            "phases": {name: dict(info) for name, info in self.phases.items()},
+            "uptime_ms": self._elapsed_ms(),
+            "first_request_ms": self.first_request_ms,
+        }
+
+    def print_report(self):
+        print("STARTUP REPORT:")
+        for name, info in self.phases.items():
+            print(f"  - {name:<12} {info['status']:<8} {info['duration_ms']} ms")
+        print(f"  components: {self.components}")
+
+
+startup_tracker = StartupTracker()